@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class RetailOrdersConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'retail_orders'
+
+    def ready(self):
+        # Модели и админка приложения лежат в backends, autodiscover их не находит.
+        from .backends import admin, signals  # noqa: F401
@@ -1,12 +1,49 @@
 from django.contrib import admin
+from django.contrib.admin.checks import ModelAdminChecks
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from .forms import ProductAdminForm
 from .tasks import do_import
+from .importers import detect_format
+from .search import search_products
+from .pagination import approximate_count
+from .exporters import export_contacts, export_orders, export_products, export_response
 from django.urls import path
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.contrib import messages
-from .models import Store, Category, Product, Order, OrderItem, Contact
+from .models import (Store, Category, Product, Order, OrderItem, ArchivedOrder, Contact, SalesRollup,
+                     StockReservation)
+from django.db.models import Sum
 from django.http import HttpResponseRedirect
 import json
 
 
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator списка админки для больших таблиц: количество строк берется
+    из pagination.approximate_count (оценка планировщика PostgreSQL) вместо COUNT(*).
+    """
+    @cached_property
+    def count(self):
+        return approximate_count(self.object_list)
+
+
+def export_actions(exporter):
+    """
+    Действия потоковой выгрузки выбранных строк (или всех отфильтрованных) в CSV, сжатый CSV и NDJSON.
+    """
+    actions = []
+    for file_format, compress in [('csv', False), ('csv', True), ('ndjson', False)]:
+        def export(modeladmin, request, queryset, file_format=file_format, compress=compress):
+            return export_response(exporter(queryset, file_format), file_format,
+                                   modeladmin.model._meta.model_name, compress)
+        export.__name__ = f'export_{file_format}' + ('_gzip' if compress else '')
+        description = f'Выгрузить в {file_format.upper()}' + (' (gzip)' if compress else '')
+        actions.append(admin.action(export, description=description))
+    return actions
+
+
 @admin.register(Store)
 class StoreAdmin(admin.ModelAdmin):
     """
@@ -27,61 +64,176 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ('name',)
     ordering = ('name',)
 
+class ProductAdminChecks(ModelAdminChecks):
+    """
+    Разрешает в list_editable поля, объявленные в форме админки (stock хранится в Inventory).
+    """
+    def _check_list_editable_item(self, obj, field_name, label):
+        if field_name in obj.form.declared_fields:
+            return []
+        return super()._check_list_editable_item(obj, field_name, label)
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     """
     Админ класс для модели Product
     """
+    checks_class = ProductAdminChecks
+    form = ProductAdminForm
     change_list_template = 'admin/product_change_list.html'
     list_display = ('name', 'store', 'category', 'price', 'stock', 'created_at', 'updated_at')
+    list_select_related = ('store', 'category', 'inventory')
     search_fields = ('name',)
     list_filter = ('store', 'category')
     list_editable = ('price', 'stock')
     readonly_fields = ('created_at', 'updated_at')
     ordering = ('name',)
+    actions = export_actions(export_products)
+
+    def get_changelist_form(self, request, **kwargs):
+        kwargs.setdefault('form', self.form)
+        return super().get_changelist_form(request, **kwargs)
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Поиск по полнотекстовому индексу вместо LIKE по названию.
+        """
+        if not search_term.strip():
+            return queryset, False
+        return search_products(queryset, search_term, ranked=False), False
 
     def get_urls(self):
         urls = super().get_urls()
         custom_urls = [
-            path('run-import/', self.run_import_view, name='run_import'),
+            path('run-import/', self.admin_site.admin_view(self.run_import_view), name='run_import'),
         ]
         return custom_urls + urls
 
     def run_import_view(self, request):
+        """
+        Сохраняет загруженный файл (или JSON из текстового поля) и ставит задачу импорта в очередь.
+        """
         if request.method == 'POST':
-            data_str = request.POST.get('data', '[]')
+            upload = request.FILES.get('file')
             try:
-                data = json.loads(data_str)
-                do_import.delay(data)
+                if upload:
+                    file_format = detect_format(upload.name)
+                    content = upload
+                else:
+                    data_str = request.POST.get('data', '[]')
+                    json.loads(data_str)
+                    file_format = 'json'
+                    content = ContentFile(data_str.encode('utf-8'))
+                file_name = default_storage.save(f'imports/products.{file_format}', content)
+                do_import.delay(file_name, file_format)
                 messages.success(request, "Задача импорта запущена")
             except json.JSONDecodeError:
                 messages.error(request, "Ошибка: Неверный формат JSON в данных.")
+            except ValueError as e:
+                messages.error(request, f"Ошибка: {e}")
             return HttpResponseRedirect("../")
         else:
-            return
+            return HttpResponseRedirect("../")
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     """
     Админ класс для модели Order
     Позволяет фильтрацию по status и created_at, поиск по user__username, иерархическую навигацию по created_at.
+    Сумма и число позиций хранятся в заказе, пользователь присоединяется к списку,
+    количество строк приблизительное (EstimatedCountPaginator), поэтому страница
+    списка - несколько запросов при любом числе заказов.
     """
-    list_display = ('id', 'user', 'status', 'created_at', 'total_price')
+    list_display = ('id', 'user', 'status', 'created_at', 'items_count', 'total_price')
+    list_select_related = ('user',)
     list_filter = ('status', 'created_at')
     search_fields = ('user__username',)
-    readonly_fields = ('total_price',)
-    fields = ('user', 'status', 'created_at', 'updated_at', 'total_price')
+    readonly_fields = ('created_at', 'updated_at', 'completed_at', 'total_price', 'items_count')
+    fields = ('user', 'status', 'created_at', 'updated_at', 'completed_at', 'items_count', 'total_price')
+    raw_id_fields = ('user',)
     date_hierarchy = 'created_at'
-    ordering = ('-created_at',)
+    ordering = ('-created_at', '-id')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = export_actions(export_orders)
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     """
-    Админ класс для модели OrderItem
+    Админ класс для модели OrderItem. Заказ с пользователем и товар с магазином
+    (нужны их __str__) присоединяются к списку; фильтр по магазину и категории
+    товара вместо фильтра по товару, который выводил бы весь каталог.
     """
-    list_display = ('order', 'product', 'quantity')
-    list_filter = ('product',)
+    list_display = ('order', 'product', 'quantity', 'price')
+    list_select_related = ('order__user', 'product__store')
+    list_filter = ('product__store', 'product__category')
     search_fields = ('product__name',)
+    raw_id_fields = ('order', 'product')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """
+    Админ класс для модели ArchivedOrder (только просмотр: заказы переносятся задачей archive_orders)
+    """
+    list_display = ('id', 'user', 'status', 'created_at', 'completed_at', 'items_count', 'total_price', 'archived_at')
+    list_select_related = ('user',)
+    list_filter = ('status',)
+    search_fields = ('user__username',)
+    raw_id_fields = ('user',)
+    ordering = ('-created_at', '-id')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    """
+    Админ класс для модели StockReservation (только просмотр: резервы меняются через корзину)
+    """
+    list_display = ('owner', 'product', 'quantity', 'expires_at')
+    search_fields = ('owner', 'product__name')
+    list_select_related = ('product',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(SalesRollup)
+class SalesRollupAdmin(admin.ModelAdmin):
+    """
+    Админ класс для модели SalesRollup (только просмотр: итоги ведутся при оформлении заказов
+    и пересчитываются командой rebuild_sales_rollups). Над списком - суммы по отфильтрованным строкам.
+    """
+    change_list_template = 'admin/salesrollup_change_list.html'
+    list_display = ('day', 'store', 'category', 'units', 'revenue', 'orders')
+    list_filter = ('store', 'category')
+    list_select_related = ('store', 'category')
+    date_hierarchy = 'day'
+    ordering = ('-day', 'store', 'category')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        changelist = getattr(response, 'context_data', {}).get('cl')
+        if changelist is not None:
+            response.context_data['sales_totals'] = changelist.queryset.aggregate(
+                units=Sum('units'), revenue=Sum('revenue'), orders=Sum('orders'))
+        return response
 
 @admin.register(Contact)
 class ContactAdmin(admin.ModelAdmin):
@@ -94,4 +246,5 @@ class ContactAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at',)
     list_editable = ('phone',)
     ordering = ('-created_at',)
+    actions = export_actions(export_contacts)
 
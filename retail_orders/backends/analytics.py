@@ -0,0 +1,149 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import (Case, Count, DecimalField, Exists, F, IntegerField, OuterRef, Q, Subquery, Sum, Value,
+                              When)
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import OrderHistoryItem, SalesRollup
+
+
+# Группировки отчета: имя параметра group_by -> поле или выражение над строками SalesRollup.
+GROUPINGS = {
+    'day': 'day',
+    'week': TruncWeek('day'),
+    'month': TruncMonth('day'),
+    'store': 'store',
+    'category': 'category',
+}
+# Названия магазина и категории добавляются в отчет вместе с их id.
+GROUPING_NAMES = {
+    'store': ('store_name', F('store__name')),
+    'category': ('category_name', F('category__name')),
+}
+
+
+def sale_groups(lines):
+    """
+    Сводит строки заказа (store_id, category_id, штуки, сумма) в группы
+    {(store_id, category_id): (штуки, сумма)}.
+    """
+    groups = {}
+    for store_id, category_id, units, amount in lines:
+        total_units, total_amount = groups.get((store_id, category_id), (0, 0))
+        groups[store_id, category_id] = (total_units + units, total_amount + amount)
+    return groups
+
+
+def _group_filter(groups):
+    return Q(*[Q(store_id=store_id, category_id=category_id) for store_id, category_id in groups], _connector=Q.OR)
+
+
+def record_sales(day, groups):
+    """
+    Добавляет оформленный заказ к итогам дня day двумя запросами при любом
+    числе групп: недостающие строки создаются пустыми (INSERT с пропуском
+    конфликтов), затем все строки увеличиваются одним условным UPDATE.
+    Вызывается внутри транзакции оформления заказа, поэтому итоги меняются
+    вместе с ним.
+    """
+    if not groups:
+        return
+    SalesRollup.objects.bulk_create(
+        [SalesRollup(day=day, store_id=store_id, category_id=category_id) for store_id, category_id in groups],
+        ignore_conflicts=True,
+    )
+
+    def per_group(index, output_field):
+        return Case(
+            *[When(Q(store_id=store_id, category_id=category_id), then=Value(values[index]))
+              for (store_id, category_id), values in groups.items()],
+            output_field=output_field,
+        )
+
+    SalesRollup.objects.filter(_group_filter(groups), day=day).update(
+        units=F('units') + per_group(0, IntegerField()),
+        revenue=F('revenue') + per_group(1, DecimalField(max_digits=14, decimal_places=2)),
+        orders=F('orders') + 1,
+    )
+
+
+def merge_category_rollups(category_id):
+    """
+    Переносит итоги удаляемой категории в строки без категории тех же дней
+    и магазинов (товары категории остаются без нее).
+    """
+    rows = SalesRollup.objects.filter(category_id=category_id)
+    SalesRollup.objects.bulk_create(
+        [SalesRollup(day=day, store_id=store_id) for day, store_id in rows.values_list('day', 'store_id')],
+        ignore_conflicts=True,
+    )
+    same = rows.filter(day=OuterRef('day'), store_id=OuterRef('store_id'))
+    SalesRollup.objects.filter(Exists(same), category__isnull=True).update(
+        units=F('units') + Subquery(same.values('units')),
+        revenue=F('revenue') + Subquery(same.values('revenue')),
+        orders=F('orders') + Subquery(same.values('orders')),
+    )
+
+
+def history_rollups(since=None):
+    """
+    Итоги продаж, посчитанные по позициям оформленных заказов (с дня since),
+    включая архивные. Магазин и категория берутся текущие, из товара.
+    """
+    items = OrderHistoryItem.objects.filter(order__status='completed', order__completed_at__isnull=False)
+    if since is not None:
+        start = datetime.datetime.combine(since, datetime.time.min, tzinfo=timezone.get_current_timezone())
+        items = items.filter(order__completed_at__gte=start)
+    return (
+        items.order_by()
+        .values(day_=TruncDate('order__completed_at'), store_=F('product__store_id'),
+                category_=F('product__category_id'))
+        .annotate(units=Sum('quantity'), revenue=Sum(F('price') * F('quantity')),
+                  orders=Count('order_id', distinct=True))
+    )
+
+
+def rebuild_rollups(since=None, batch_size=1000):
+    """
+    Пересчитывает итоги продаж (все или с дня since) по истории заказов в одной
+    транзакции. Возвращает число созданных строк.
+    """
+    created = 0
+    with transaction.atomic():
+        stale = SalesRollup.objects.all()
+        if since is not None:
+            stale = stale.filter(day__gte=since)
+        stale.delete()
+
+        batch = []
+        for row in history_rollups(since).iterator():
+            batch.append(SalesRollup(day=row['day_'], store_id=row['store_'], category_id=row['category_'],
+                                     units=row['units'], revenue=row['revenue'], orders=row['orders']))
+            if len(batch) >= batch_size:
+                created += len(SalesRollup.objects.bulk_create(batch))
+                batch = []
+        created += len(SalesRollup.objects.bulk_create(batch))
+    return created
+
+
+def sales_report(queryset, group_by):
+    """
+    Суммы total_units, total_revenue и total_orders по строкам queryset (SalesRollup),
+    сгруппированные по полям group_by из GROUPINGS. Число заказов при группировке
+    шире дня и категории складывается по строкам: заказ с товарами двух категорий
+    учитывается дважды.
+    """
+    fields = [GROUPINGS[name] for name in group_by if isinstance(GROUPINGS[name], str)]
+    expressions = {name: GROUPINGS[name] for name in group_by if not isinstance(GROUPINGS[name], str)}
+    for name in group_by:
+        if name in GROUPING_NAMES:
+            label, expression = GROUPING_NAMES[name]
+            expressions[label] = expression
+    return (
+        queryset.order_by()
+        .values(*fields, **expressions)
+        .annotate(total_units=Sum('units'), total_revenue=Sum('revenue'), total_orders=Sum('orders'))
+        .order_by(*group_by)
+    )
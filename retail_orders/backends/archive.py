@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+
+ARCHIVE_BATCH_SIZE = 1000
+
+ORDER_COLUMNS = ['id', 'user_id', 'avatar', 'status', 'total_price', 'items_count', 'created_at', 'updated_at',
+                 'completed_at']
+ORDER_ITEM_COLUMNS = ['id', 'order_id', 'product_id', 'quantity', 'price']
+
+# Представления истории (модели OrderHistory и OrderHistoryItem): объединение живых и архивных таблиц.
+HISTORY_VIEWS = {
+    'retail_orders_order_history': """
+        SELECT {columns}, FALSE AS archived FROM retail_orders_order
+        UNION ALL
+        SELECT {columns}, TRUE AS archived FROM retail_orders_archivedorder
+    """.format(columns='id, user_id, status, total_price, items_count, created_at, updated_at, completed_at'),
+    'retail_orders_order_history_item': """
+        SELECT {columns} FROM retail_orders_orderitem
+        UNION ALL
+        SELECT {columns} FROM retail_orders_archivedorderitem
+    """.format(columns='id, order_id, product_id, quantity, price'),
+}
+
+
+def install_history_views(connection):
+    """
+    Создает (пересоздает) представления истории заказов, если архивные таблицы уже есть.
+    """
+    if 'retail_orders_archivedorderitem' not in connection.introspection.table_names():
+        return
+    uninstall_history_views(connection)
+    with connection.cursor() as cursor:
+        for name, sql in HISTORY_VIEWS.items():
+            cursor.execute(f'CREATE VIEW {name} AS {sql}')
+
+
+def uninstall_history_views(connection):
+    with connection.cursor() as cursor:
+        for name in reversed(HISTORY_VIEWS):
+            cursor.execute(f'DROP VIEW IF EXISTS {name}')
+
+
+def archive_cutoff(days=None):
+    """
+    Граница архивации: заказы, завершенные раньше, переносятся в архив.
+    """
+    return timezone.now() - timedelta(days=settings.ORDER_ARCHIVE_AFTER_DAYS if days is None else days)
+
+
+def archive_batch(before, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Переносит в архив до batch_size завершенных заказов (completed_at < before)
+    вместе с позициями в одной транзакции: INSERT в архивные таблицы и DELETE
+    из живых. Возвращает число перенесенных заказов.
+    """
+    with transaction.atomic():
+        ids = list(
+            Order.objects.select_for_update(skip_locked=True)
+            .filter(status='completed', completed_at__lt=before)
+            .order_by('completed_at').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        now = timezone.now()
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(archived_at=now, **row)
+            for row in Order.objects.filter(id__in=ids).order_by().values(*ORDER_COLUMNS)
+        ])
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(**row)
+            for row in OrderItem.objects.filter(order_id__in=ids).order_by().values(*ORDER_ITEM_COLUMNS)
+        ])
+        OrderItem.objects.filter(order_id__in=ids).delete()
+        Order.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def archive_orders(before=None, batch_size=ARCHIVE_BATCH_SIZE, max_batches=None):
+    """
+    Переносит в архив все завершенные заказы старше before (по умолчанию -
+    ORDER_ARCHIVE_AFTER_DAYS дней) пачками по batch_size, каждая пачка - своя
+    короткая транзакция. Возвращает число перенесенных заказов.
+    """
+    before = before or archive_cutoff()
+    archived = batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(before, batch_size)
+        if not moved:
+            break
+        archived += moved
+        batches += 1
+    return archived
@@ -0,0 +1,241 @@
+"""
+Асинхронные версии чтения каталога и истории заказов для ASGI. JSON совпадает
+с ProductViewSet.list/retrieve и OrderViewSet.list (постраничная пагинация).
+Независимые обращения к кэшу и БД запускаются вместе (asyncio.gather); запросы
+ORM одного запроса Django все равно выполняет по очереди в его потоке, поэтому
+выигрыш - в обращениях к Redis и в обслуживании многих запросов без потока на каждый.
+"""
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import InvalidPage
+from django.http import HttpResponse
+from django_filters.filterset import filterset_factory
+from rest_framework.exceptions import AuthenticationFailed, MethodNotAllowed, NotAuthenticated, NotFound, Throttled
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .caching import (CATALOGUE_SCOPE, PRODUCT_LIST_SCOPE, aresponse_cache_key, conditional_response, last_modified,
+                      modified_stamps, overlay_inventory, product_scope, response_items)
+from .inventory import ainventory_levels
+from .models import Category, OrderHistory, OrderHistoryItem, Product, Store
+from .serializers import OrderItemSerializer, OrderSerializer, ProductListSerializer
+from .throttling import UserRedisRateThrottle
+from .views import OrderViewSet, ProductViewSet
+
+
+ProductFilterSet = filterset_factory(Product, fields=ProductViewSet.filterset_fields)
+OrderFilterSet = filterset_factory(OrderHistory, fields=OrderViewSet.filterset_fields)
+
+# Собственные колонки товара; магазин и категория читаются отдельными запросами.
+PRODUCT_COLUMNS = [column for column in ProductListSerializer.columns if '__' not in column]
+STORE_COLUMNS = ['name', 'address', 'created_at', 'updated_at']
+CATEGORY_COLUMNS = ['name', 'description']
+ORDER_COLUMNS = ['id', 'user', 'status', 'created_at', 'updated_at', 'completed_at', 'total_price', 'items_count']
+
+
+def json_response(data, status=200):
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status)
+
+
+async def authenticate(request):
+    """
+    Пользователь сессии или JWT (как в DEFAULT_AUTHENTICATION_CLASSES), иначе None.
+    """
+    user = await request.auser()
+    if user.is_authenticated:
+        return user
+    result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    return result[0] if result else None
+
+
+def async_read_view(view):
+    """
+    Проверки DRF для асинхронного представления чтения: только GET/HEAD,
+    аутентификация (401) и лимит запросов пользователя UserRedisRateThrottle (429).
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return json_response({'detail': MethodNotAllowed(request.method).detail}, status=405)
+        try:
+            user = await authenticate(request)
+        except AuthenticationFailed as e:
+            user, detail = None, e.detail
+        else:
+            detail = NotAuthenticated.default_detail
+        if user is None:
+            response = json_response({'detail': detail}, status=401)
+            response['WWW-Authenticate'] = JWTAuthentication().authenticate_header(request)
+            return response
+        request.user = user
+
+        throttle = UserRedisRateThrottle()
+        if not await sync_to_async(throttle.allow_request)(request, None):
+            return json_response({'detail': Throttled(throttle.wait()).detail}, status=429)
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def filter_queryset(filterset_class, request, queryset):
+    """
+    Фильтры django-filter, как в ViewSet: (queryset, ошибки фильтров). Проверка
+    формы может обращаться к БД (существование магазина), поэтому выполняется синхронно.
+    """
+    def build():
+        filterset = filterset_class(request.GET, queryset=queryset, request=request)
+        if not filterset.is_valid():
+            return None, filterset.errors
+        return filterset.qs, None
+    return await sync_to_async(build)()
+
+
+async def paginate(request, queryset):
+    """
+    Страница как у PageNumberPagination: количество и строки страницы
+    загружаются одновременно. Возвращает (count, rows, next, previous).
+    """
+    page_size = api_settings.PAGE_SIZE
+    try:
+        number = int(request.GET.get('page', 1))
+        if number < 1:
+            raise ValueError
+    except ValueError:
+        raise InvalidPage()
+    offset = (number - 1) * page_size
+    count, rows = await asyncio.gather(
+        queryset.acount(), alist(queryset[offset:offset + page_size]))
+    if not rows and number > 1:
+        raise InvalidPage()
+
+    url = request.build_absolute_uri()
+    next_url = replace_query_param(url, 'page', number + 1) if offset + page_size < count else None
+    previous_url = None
+    if number == 2:
+        previous_url = remove_query_param(url, 'page')
+    elif number > 2:
+        previous_url = replace_query_param(url, 'page', number - 1)
+    return count, rows, next_url, previous_url
+
+
+async def alist(queryset):
+    return [row async for row in queryset]
+
+
+async def cached_catalogue_response(request, scopes, render, product_ids=None):
+    """
+    Асинхронный cached_response: данные из кэша ответов или render() (без
+    остатков), затем подстановка остатков, ETag и Last-Modified карточки. Если id товаров
+    известны заранее, остатки читаются одновременно с ключом кэша.
+    """
+    if product_ids is not None:
+        key, levels = await asyncio.gather(aresponse_cache_key(request, scopes), ainventory_levels(product_ids))
+    else:
+        key, levels = await aresponse_cache_key(request, scopes), None
+    entry = await cache.aget(key)
+    if entry is None:
+        data = await render()
+        if isinstance(data, HttpResponse):
+            return data
+        entry = {'data': data, 'last_modified': last_modified(data)}
+        await cache.aset(key, entry, settings.CATALOGUE_CACHE_TIMEOUT)
+
+    if levels is None:
+        levels = await ainventory_levels([item['id'] for item in response_items(entry['data'])])
+    data, stock_modified = overlay_inventory(entry['data'], levels)
+    return conditional_response(request, json_response(data), *modified_stamps(entry, stock_modified))
+
+
+@async_read_view
+async def product_list(request):
+    """
+    Асинхронный список товаров (фильтры store, price, category; ?page=).
+    """
+    async def render():
+        queryset, errors = await filter_queryset(ProductFilterSet, request, Product.objects.all())
+        if errors:
+            return json_response(errors, status=400)
+        try:
+            count, rows, next_url, previous_url = await paginate(
+                request, queryset.values(*ProductListSerializer.columns))
+        except InvalidPage:
+            return json_response({'detail': NotFound('Invalid page.').detail}, status=404)
+        results = ProductListSerializer(rows, context={'request': request}, levels={}).data
+        return {'count': count, 'next': next_url, 'previous': previous_url, 'results': results}
+
+    return await cached_catalogue_response(request, [CATALOGUE_SCOPE, PRODUCT_LIST_SCOPE], render)
+
+
+@async_read_view
+async def product_detail(request, pk):
+    """
+    Асинхронная карточка товара: товар, магазин, категория и остатки читаются
+    одновременно (миниатюры хранятся в строке товара).
+    """
+    async def render():
+        product, store, category = await asyncio.gather(
+            Product.objects.filter(pk=pk).values(*PRODUCT_COLUMNS).afirst(),
+            Store.objects.filter(product__id=pk).values(*STORE_COLUMNS).afirst(),
+            Category.objects.filter(product__id=pk).values(*CATEGORY_COLUMNS).afirst(),
+        )
+        if product is None:
+            return json_response({'detail': NotFound.default_detail}, status=404)
+        row = dict(product)
+        row.update({f'store__{column}': store[column] for column in STORE_COLUMNS})
+        row.update({f'category__{column}': (category or {}).get(column) for column in CATEGORY_COLUMNS})
+        return ProductListSerializer([row], context={'request': request}, levels={}).data[0]
+
+    return await cached_catalogue_response(request, [CATALOGUE_SCOPE, product_scope(pk)], render, product_ids=[pk])
+
+
+@async_read_view
+async def order_list(request):
+    """
+    Асинхронная история заказов пользователя, живых и архивных (фильтры status, created_at; ?page=).
+    Позиции с товарами и остатки товаров загружаются одновременно.
+    """
+    queryset, errors = await filter_queryset(OrderFilterSet, request, OrderHistory.objects.filter(user=request.user))
+    if errors:
+        return json_response(errors, status=400)
+    try:
+        count, orders, next_url, previous_url = await paginate(request, queryset.values(*ORDER_COLUMNS))
+    except InvalidPage:
+        return json_response({'detail': NotFound('Invalid page.').detail}, status=404)
+
+    order_ids = [order['id'] for order in orders]
+    items = OrderHistoryItem.objects.filter(order_id__in=order_ids)
+    item_rows, levels = await asyncio.gather(
+        alist(items.order_by('id').values(
+            'id', 'order_id', 'quantity', 'price', *(f'product__{column}' for column in ProductListSerializer.columns))),
+        ainventory_levels(items.values('product_id')),
+    )
+    products = ProductListSerializer(
+        [{column: row[f'product__{column}'] for column in ProductListSerializer.columns} for row in item_rows],
+        context={'request': request}, levels=levels,
+    ).data
+
+    item_price = OrderItemSerializer().fields['price'].to_representation
+    order_items = {order_id: [] for order_id in order_ids}
+    for row, product in zip(item_rows, products):
+        order_items[row['order_id']].append({
+            'id': row['id'], 'product': product, 'quantity': row['quantity'], 'price': item_price(row['price']),
+        })
+
+    fields = OrderSerializer().fields
+    results = []
+    for order in orders:
+        data = {}
+        for name in OrderSerializer.Meta.fields:
+            if name == 'orderitem_set':
+                data[name] = order_items[order['id']]
+            elif name == 'user' or order[name] is None:
+                data[name] = order[name]
+            else:
+                data[name] = fields[name].to_representation(order[name])
+        results.append(data)
+    return json_response({'count': count, 'next': next_url, 'previous': previous_url, 'results': results})
@@ -0,0 +1,207 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, quote_etag, urlencode
+from rest_framework.response import Response
+
+from .inventory import inventory_levels
+
+
+CATALOGUE_PREFIX = 'catalogue'
+# Магазины и категории входят в ответ каждого товара: их изменение сбрасывает весь кэш.
+CATALOGUE_SCOPE = 'all'
+PRODUCT_LIST_SCOPE = 'products'
+
+
+def product_scope(product_id):
+    return f'product:{product_id}'
+
+
+def _version_key(scope):
+    return f'{CATALOGUE_PREFIX}:version:{scope}'
+
+
+def _new_version():
+    return uuid.uuid4().hex[:12]
+
+
+def _version_keys(scopes):
+    return [_version_key(scope) for scope in scopes]
+
+
+def catalogue_version(scopes):
+    """
+    Текущие версии областей кэша одним чтением. Отсутствующая версия (новая
+    или вытесненная из кэша) создается со случайным значением, поэтому
+    старые ответы с ней не совпадут.
+    """
+    keys = _version_keys(scopes)
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, _new_version(), None)
+        versions.update(cache.get_many(missing))
+    return ':'.join(versions.get(key, '') for key in keys)
+
+
+async def acatalogue_version(scopes):
+    """
+    Асинхронный catalogue_version.
+    """
+    keys = _version_keys(scopes)
+    versions = await cache.aget_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            await cache.aadd(key, _new_version(), None)
+        versions.update(await cache.aget_many(missing))
+    return ':'.join(versions.get(key, '') for key in keys)
+
+
+def bump_versions(scopes):
+    cache.set_many({_version_key(scope): _new_version() for scope in scopes}, None)
+
+
+def invalidate_products(product_ids=()):
+    """
+    Сбрасывает закэшированные ответы товаров product_ids и все списки товаров.
+    Версии меняются после фиксации транзакции: иначе параллельный запрос мог бы
+    сохранить старые данные уже под новой версией.
+    """
+    scopes = [PRODUCT_LIST_SCOPE] + [product_scope(product_id) for product_id in product_ids]
+    transaction.on_commit(lambda: bump_versions(scopes))
+
+
+def invalidate_catalogue():
+    transaction.on_commit(lambda: bump_versions([CATALOGUE_SCOPE]))
+
+
+def _response_key(version, host, path, query_lists, media_type):
+    query = urlencode(sorted(query_lists), doseq=True)
+    variant = f'{host}|{path}?{query}|{media_type}'
+    digest = hashlib.md5(variant.encode('utf-8')).hexdigest()
+    return f'{CATALOGUE_PREFIX}:response:{version}:{digest}'
+
+
+def response_cache_key(request, scopes):
+    """
+    Ключ ответа: версии областей, хост (в ответе абсолютные URL), путь,
+    отсортированные параметры запроса и формат ответа.
+    """
+    return _response_key(catalogue_version(scopes), request.get_host(), request.path,
+                         request.query_params.lists(), request.accepted_media_type)
+
+
+async def aresponse_cache_key(request, scopes, media_type='application/json'):
+    """
+    Ключ ответа асинхронного представления (request - HttpRequest).
+    """
+    return _response_key(await acatalogue_version(scopes), request.get_host(), request.path,
+                         request.GET.lists(), media_type)
+
+
+def response_items(data):
+    """
+    Товары ответа: карточка, страница списка или список.
+    """
+    if isinstance(data, dict):
+        return data.get('results', [data])
+    return data
+
+
+def overlay_inventory(data, levels):
+    """
+    Подставляет в данные ответа stock и reserved из levels (формат inventory_levels).
+    Возвращает новые данные и наибольший Inventory.updated_at.
+    """
+    items = response_items(data)
+    patched = []
+    for item in items:
+        stock, reserved, _ = levels.get(item['id'], (0, 0, None))
+        patched.append(dict(item, stock=stock, reserved=reserved))
+    stamps = [updated_at for _, _, updated_at in levels.values() if updated_at]
+
+    if not isinstance(data, dict):
+        data = patched
+    elif 'results' in data:
+        data = dict(data, results=patched)
+    else:
+        data = patched[0]
+    return data, max(stamps) if stamps else None
+
+
+def with_inventory(data):
+    """
+    Подставляет в данные ответа текущие stock и reserved из Inventory (один запрос
+    по id товаров ответа).
+    """
+    return overlay_inventory(data, inventory_levels([item['id'] for item in response_items(data)]))
+
+
+def last_modified(data):
+    """
+    updated_at товара для ответа-карточки. У списков Last-Modified нет: удаление
+    товара или его уход из фильтра не сдвигает updated_at оставшихся строк,
+    поэтому списки сверяются только по ETag.
+    """
+    if not isinstance(data, dict) or 'results' in data:
+        return None
+    return parse_datetime(data['updated_at']) if data.get('updated_at') else None
+
+
+def modified_stamps(entry, stock_modified):
+    """
+    Времена изменения для Last-Modified ответа из записи кэша: товар и его остатки,
+    только если у записи есть last_modified (карточка товара).
+    """
+    return (entry['last_modified'], stock_modified) if entry['last_modified'] else ()
+
+
+def cached_response(view, request, scopes, render):
+    """
+    Ответ каталога: данные товаров берутся из кэша ответов, иначе из render()
+    с сохранением в кэш на CATALOGUE_CACHE_TIMEOUT секунд (только ответы 200).
+    Остатки хранятся отдельно (Inventory) и подставляются при каждом запросе,
+    поэтому продажи не сбрасывают кэш. К ответу добавляются ETag (хэш содержимого),
+    а к карточке товара еще Last-Modified (по updated_at товара и остатков): на запрос
+    с совпадающим If-None-Match/If-Modified-Since возвращается 304.
+    """
+    key = response_cache_key(request, scopes)
+    entry = cache.get(key)
+    if entry is None:
+        response = render()
+        if response.status_code != 200:
+            return response
+        entry = {'data': response.data, 'last_modified': last_modified(response.data)}
+        cache.set(key, entry, settings.CATALOGUE_CACHE_TIMEOUT)
+
+    data, stock_modified = with_inventory(entry['data'])
+    response = Response(data)
+    response.accepted_renderer = request.accepted_renderer
+    response.accepted_media_type = request.accepted_media_type
+    response.renderer_context = view.get_renderer_context()
+    response.render()
+    return conditional_response(request._request, response, *modified_stamps(entry, stock_modified))
+
+
+def conditional_response(request, response, *modified):
+    """
+    Добавляет к отрисованному ответу ETag (хэш содержимого), Last-Modified (наибольшее
+    из modified) и Cache-Control; на совпадающий If-None-Match/If-Modified-Since
+    возвращает 304.
+    """
+    etag = quote_etag(hashlib.md5(response.content).hexdigest())
+    modified = max(filter(None, modified), default=None)
+    modified = int(modified.timestamp()) if modified else None
+    response['ETag'] = etag
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified)
+    # Ответы зависят от прав доступа: браузер хранит их сам и каждый раз сверяет с сервером.
+    patch_cache_control(response, private=True, no_cache=True)
+    return get_conditional_response(request, etag=etag, last_modified=modified, response=response)
@@ -0,0 +1,275 @@
+import threading
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import reservations
+
+
+CART_SESSION_KEY = 'cart_id'
+# Блокировка корзины на время чтения-изменения-записи: срок жизни и ожидание, секунд.
+CART_LOCK_TIMEOUT = 10
+CART_LOCK_WAIT = 5
+
+
+def user_owner(user):
+    return user_id_owner(user.pk)
+
+
+def user_id_owner(user_id):
+    """
+    Владелец корзины пользователя по его id (когда объект пользователя не загружен).
+    """
+    return f'user:{user_id}'
+
+
+def cart_owner(request, create=True):
+    """
+    Владелец корзины для запроса: пользователь или анонимная сессия.
+    Анонимная корзина привязана к cart_id в данных сессии, а не к ключу сессии,
+    который меняется при входе.
+    """
+    if request.user.is_authenticated:
+        return user_owner(request.user)
+    cart_id = request.session.get(CART_SESSION_KEY)
+    if cart_id is None:
+        if not create:
+            return None
+        cart_id = request.session[CART_SESSION_KEY] = uuid.uuid4().hex
+    return f'anon:{cart_id}'
+
+
+def cart_state(items):
+    """
+    Представление корзины для ответа API.
+    """
+    lines = [
+        {'product_id': product_id, 'quantity': quantity, 'price': price}
+        for product_id, (quantity, price) in sorted(items.items())
+    ]
+    return {
+        'items': lines,
+        'items_count': sum(line['quantity'] for line in lines),
+        'total_price': sum((line['price'] * line['quantity'] for line in lines), Decimal('0')),
+    }
+
+
+class RedisCartStore:
+    """
+    Корзины в Redis: для каждого владельца хэш product_id -> quantity и хэш
+    product_id -> price (цена на момент первого добавления). Корзины пользователей
+    попадают в множество dirty, которое задача flush_carts переносит в БД.
+    """
+    prefix = 'cart'
+
+    def __init__(self, alias=None, ttl=None):
+        from django_redis import get_redis_connection
+
+        self.client = get_redis_connection(alias or settings.CART_REDIS_ALIAS)
+        self.ttl = ttl or settings.CART_TTL
+
+    def keys(self, owner):
+        return f'{self.prefix}:{owner}', f'{self.prefix}:{owner}:prices'
+
+    def owner_lock(self, owner):
+        """
+        Блокировка корзины owner для последовательности get -> изменение -> replace
+        (redis-py Lock; если не получена за CART_LOCK_WAIT секунд - LockError).
+        """
+        return self.client.lock(f'{self.prefix}:lock:{owner}', timeout=CART_LOCK_TIMEOUT,
+                                blocking_timeout=CART_LOCK_WAIT)
+
+    def _touch(self, pipe, owner):
+        for key in self.keys(owner):
+            pipe.expire(key, self.ttl)
+        if owner.startswith('user:'):
+            pipe.sadd(f'{self.prefix}:dirty', owner)
+
+    def add(self, owner, product_id, quantity, price):
+        quantities, prices = self.keys(owner)
+        with self.client.pipeline() as pipe:
+            pipe.hincrby(quantities, product_id, quantity)
+            pipe.hsetnx(prices, product_id, str(price))
+            self._touch(pipe, owner)
+            return pipe.execute()[0]
+
+    def set(self, owner, product_id, quantity, price):
+        if quantity <= 0:
+            return self.remove(owner, product_id)
+        quantities, prices = self.keys(owner)
+        with self.client.pipeline() as pipe:
+            pipe.hset(quantities, product_id, quantity)
+            pipe.hsetnx(prices, product_id, str(price))
+            self._touch(pipe, owner)
+            pipe.execute()
+
+    def remove(self, owner, product_id):
+        quantities, prices = self.keys(owner)
+        with self.client.pipeline() as pipe:
+            pipe.hdel(quantities, product_id)
+            pipe.hdel(prices, product_id)
+            self._touch(pipe, owner)
+            return bool(pipe.execute()[0])
+
+    def get(self, owner):
+        """
+        Содержимое корзины: {product_id: (quantity, price)}.
+        """
+        quantities, prices = self.keys(owner)
+        with self.client.pipeline() as pipe:
+            pipe.hgetall(quantities)
+            pipe.hgetall(prices)
+            quantity_map, price_map = pipe.execute()
+        return {
+            int(product_id): (int(quantity), Decimal(price_map.get(product_id, b'0').decode()))
+            for product_id, quantity in quantity_map.items()
+            if int(quantity) > 0
+        }
+
+    def replace(self, owner, items):
+        """
+        Заменяет содержимое корзины целиком ({product_id: (quantity, price)}).
+        """
+        quantities, prices = self.keys(owner)
+        with self.client.pipeline() as pipe:
+            pipe.delete(quantities, prices)
+            if items:
+                pipe.hset(quantities, mapping={product_id: quantity for product_id, (quantity, price) in items.items()})
+                pipe.hset(prices, mapping={product_id: str(price) for product_id, (quantity, price) in items.items()})
+            self._touch(pipe, owner)
+            pipe.execute()
+
+    def clear(self, owner):
+        self.client.delete(*self.keys(owner))
+        self.client.srem(f'{self.prefix}:dirty', owner)
+
+    def merge(self, source, target):
+        """
+        Переносит корзину source (анонимную) в корзину target и удаляет source.
+        """
+        items = self.get(source)
+        if items:
+            quantities, prices = self.keys(target)
+            with self.client.pipeline() as pipe:
+                for product_id, (quantity, price) in items.items():
+                    pipe.hincrby(quantities, product_id, quantity)
+                    pipe.hsetnx(prices, product_id, str(price))
+                self._touch(pipe, target)
+                pipe.execute()
+        self.client.delete(*self.keys(source))
+        return items
+
+    def pop_dirty(self, count):
+        return [owner.decode() for owner in self.client.spop(f'{self.prefix}:dirty', count) or []]
+
+    def mark_dirty(self, owners):
+        if owners:
+            self.client.sadd(f'{self.prefix}:dirty', *owners)
+
+
+class LocalCartStore:
+    """
+    Хранилище корзин в памяти процесса с тем же интерфейсом, что и RedisCartStore.
+    Для тестов и однопроцессной разработки без Redis; TTL не поддерживается.
+    """
+    def __init__(self, **kwargs):
+        self.lock = threading.Lock()
+        self.carts = {}
+        self.dirty = set()
+        self.owner_locks = {}
+
+    def owner_lock(self, owner):
+        with self.lock:
+            return self.owner_locks.setdefault(owner, threading.Lock())
+
+    def _touch(self, owner):
+        if owner.startswith('user:'):
+            self.dirty.add(owner)
+
+    def add(self, owner, product_id, quantity, price):
+        with self.lock:
+            cart = self.carts.setdefault(owner, {})
+            current, current_price = cart.get(product_id, (0, Decimal(str(price))))
+            cart[product_id] = (current + quantity, current_price)
+            self._touch(owner)
+            return current + quantity
+
+    def set(self, owner, product_id, quantity, price):
+        if quantity <= 0:
+            return self.remove(owner, product_id)
+        with self.lock:
+            cart = self.carts.setdefault(owner, {})
+            cart[product_id] = (quantity, cart.get(product_id, (0, Decimal(str(price))))[1])
+            self._touch(owner)
+
+    def remove(self, owner, product_id):
+        with self.lock:
+            self._touch(owner)
+            return self.carts.get(owner, {}).pop(product_id, None) is not None
+
+    def get(self, owner):
+        with self.lock:
+            return dict(self.carts.get(owner, {}))
+
+    def replace(self, owner, items):
+        with self.lock:
+            self.carts[owner] = dict(items)
+            self._touch(owner)
+
+    def clear(self, owner):
+        with self.lock:
+            self.carts.pop(owner, None)
+            self.dirty.discard(owner)
+
+    def merge(self, source, target):
+        items = self.get(source)
+        for product_id, (quantity, price) in items.items():
+            self.add(target, product_id, quantity, price)
+        with self.lock:
+            self.carts.pop(source, None)
+        return items
+
+    def pop_dirty(self, count):
+        with self.lock:
+            owners = [self.dirty.pop() for _ in range(min(count, len(self.dirty)))]
+        return owners
+
+    def mark_dirty(self, owners):
+        with self.lock:
+            self.dirty.update(owners)
+
+
+_stores = {}
+
+
+def get_cart_store():
+    """
+    Хранилище корзин из settings.CART_STORE (один экземпляр на процесс).
+    """
+    path = settings.CART_STORE
+    if path not in _stores:
+        _stores[path] = import_string(path)()
+    return _stores[path]
+
+
+def merge_anonymous_cart(request, user):
+    """
+    Переносит анонимную корзину сессии в корзину пользователя после входа.
+    """
+    from .services import save_cart
+
+    cart_id = request.session.pop(CART_SESSION_KEY, None)
+    if not cart_id:
+        return
+    store = get_cart_store()
+    source = f'anon:{cart_id}'
+    reservations.transfer(source, user_owner(user))
+    if settings.CART_WRITE_BEHIND:
+        store.merge(source, user_owner(user))
+        return
+    items = store.get(source)
+    if items:
+        save_cart(user, items, replace=False)
+    store.clear(source)
@@ -0,0 +1,13 @@
+class OrderAlreadyProcessed(Exception):
+    """
+    Заказ уже оформлен (или оформляется параллельным запросом).
+    """
+
+
+class InsufficientStock(Exception):
+    """
+    Недостаточно товара на складе. В items - все позиции, которых не хватает.
+    """
+    def __init__(self, items):
+        super().__init__('Недостаточно товара на складе')
+        self.items = items
@@ -0,0 +1,195 @@
+import csv
+import io
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from .models import OrderHistoryItem
+
+
+EXPORT_CHUNK_SIZE = 2000
+WRITE_CHUNK_SIZE = 64 * 1024
+
+FORMATS = ('csv', 'ndjson')
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Колонки выгрузки: (имя колонки, поле для values_list). Колонки товаров
+# совпадают с колонками импорта, поэтому выгрузку можно загрузить обратно.
+PRODUCT_FIELDS = [
+    ('id', 'id'), ('name', 'name'), ('price', 'price'), ('stock', 'inventory__stock'),
+    ('store', 'store__name'), ('category', 'category__name'), ('description', 'description'),
+    ('created_at', 'created_at'), ('updated_at', 'updated_at'),
+]
+ORDER_FIELDS = [
+    ('id', 'id'), ('user', 'user__username'), ('status', 'status'), ('created_at', 'created_at'),
+    ('completed_at', 'completed_at'), ('items_count', 'items_count'), ('total_price', 'total_price'),
+]
+ORDER_ITEM_FIELDS = [
+    ('product_id', 'product_id'), ('product', 'product__name'), ('quantity', 'quantity'), ('price', 'price'),
+]
+CONTACT_FIELDS = [
+    ('id', 'id'), ('user', 'user__username'), ('name', 'name'), ('email', 'email'), ('phone', 'phone'),
+    ('address', 'address'), ('message', 'message'), ('created_at', 'created_at'),
+]
+
+_encoder = DjangoJSONEncoder()
+
+
+def iter_rows(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Строки запроса словарями {колонка: значение} в порядке id. Читаются
+    через iterator() пачками по chunk_size (в PostgreSQL - серверным курсором).
+    """
+    columns = [column for column, _ in fields]
+    queryset = queryset.order_by('id').values_list(*[lookup for _, lookup in fields])
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield dict(zip(columns, row))
+
+
+def iter_orders(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Заказы со списком позиций (items): позиции читаются одним запросом на пачку заказов.
+    """
+    chunk = []
+    for order in iter_rows(queryset, ORDER_FIELDS, chunk_size):
+        chunk.append(order)
+        if len(chunk) >= chunk_size:
+            yield from _with_items(chunk)
+            chunk = []
+    yield from _with_items(chunk)
+
+
+def _with_items(orders):
+    if not orders:
+        return
+    items = {order['id']: [] for order in orders}
+    columns = [column for column, _ in ORDER_ITEM_FIELDS]
+    # Позиции из истории: заказ может быть и живым, и архивным.
+    rows = (OrderHistoryItem.objects.filter(order_id__in=items).order_by('order_id', 'id')
+            .values_list('order_id', *[lookup for _, lookup in ORDER_ITEM_FIELDS]))
+    for order_id, *values in rows:
+        items[order_id].append(dict(zip(columns, values)))
+    for order in orders:
+        order['items'] = items[order['id']]
+        yield order
+
+
+def _flatten_orders(orders):
+    """
+    Заказы для CSV: строка на позицию (поля заказа повторяются), заказ без позиций - одна строка.
+    """
+    empty = {f'item_{column}': None for column, _ in ORDER_ITEM_FIELDS}
+    for order in orders:
+        items = order.pop('items')
+        for item in items or [None]:
+            row = dict(order)
+            row.update({f'item_{column}': value for column, value in item.items()} if item else empty)
+            yield row
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (str, int, float)):
+        return value
+    # Decimal, дата и время - так же, как в NDJSON и API.
+    return _encoder.default(value)
+
+
+def write_csv(columns, rows):
+    """
+    CSV с заголовком частями около WRITE_CHUNK_SIZE символов. Заголовок отдается
+    сразу, до первого запроса к БД.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for row in rows:
+        writer.writerow([_csv_value(row[column]) for column in columns])
+        if buffer.tell() >= WRITE_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def write_ndjson(rows):
+    """
+    Объект JSON на строку, частями около WRITE_CHUNK_SIZE символов.
+    """
+    lines = []
+    size = 0
+    for row in rows:
+        line = json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= WRITE_CHUNK_SIZE:
+            yield ''.join(lines)
+            lines, size = [], 0
+    if lines:
+        yield ''.join(lines)
+
+
+def export_products(queryset, file_format):
+    rows = iter_rows(queryset, PRODUCT_FIELDS)
+    if file_format == 'csv':
+        return write_csv([column for column, _ in PRODUCT_FIELDS], rows)
+    return write_ndjson(rows)
+
+
+def export_orders(queryset, file_format):
+    """
+    Заказы с позициями: в NDJSON позиции вложены списком items, в CSV - строка
+    на позицию с колонками item_*.
+    """
+    orders = iter_orders(queryset)
+    if file_format == 'csv':
+        columns = [column for column, _ in ORDER_FIELDS] + [f'item_{column}' for column, _ in ORDER_ITEM_FIELDS]
+        return write_csv(columns, _flatten_orders(orders))
+    return write_ndjson(orders)
+
+
+def export_contacts(queryset, file_format):
+    rows = iter_rows(queryset, CONTACT_FIELDS)
+    if file_format == 'csv':
+        return write_csv([column for column, _ in CONTACT_FIELDS], rows)
+    return write_ndjson(rows)
+
+
+def gzip_chunks(chunks, level=6):
+    """
+    Сжимает поток частей в gzip. Каждая часть сбрасывается (Z_SYNC_FLUSH), поэтому
+    клиент получает данные сразу, а не после заполнения буфера компрессора.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def export_response(chunks, file_format, file_name, compress=False):
+    """
+    Потоковый ответ с файлом выгрузки (file_name без расширения). При compress
+    файл отдается сжатым (.gz, application/gzip).
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f'Неизвестный формат выгрузки: {file_format}')
+    content = (chunk.encode('utf-8') for chunk in chunks)
+    file_name = f'{file_name}.{file_format}'
+    content_type = CONTENT_TYPES[file_format]
+    if compress:
+        content = gzip_chunks(content)
+        file_name += '.gz'
+        content_type = 'application/gzip'
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+    return response
@@ -8,4 +8,25 @@ class ProductForm(forms.ModelForm):
     """
     class Meta:
         model = Product
-        fields = ['name', 'image']
\ No newline at end of file
+        fields = ['name', 'image']
+
+class ProductAdminForm(forms.ModelForm):
+    """
+    Форма товара в админке. Остаток хранится в Inventory, поэтому поле stock
+    объявлено в форме и сохраняется через свойство Product.stock.
+    """
+    stock = forms.IntegerField(min_value=0, initial=0, label='Остаток')
+
+    class Meta:
+        model = Product
+        fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk is not None:
+            self.initial['stock'] = self.instance.stock
+
+    def save(self, commit=True):
+        if 'stock' in self.cleaned_data:
+            self.instance.stock = self.cleaned_data['stock']
+        return super().save(commit)
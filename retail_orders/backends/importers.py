@@ -0,0 +1,300 @@
+import csv
+import io
+import json
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import invalidate_products
+from .models import Store, Category, Product, Inventory
+
+
+IMPORT_BATCH_SIZE = 1000
+IMPORT_MAX_ERRORS = 100
+READ_CHUNK_SIZE = 64 * 1024
+
+FORMATS = ('json', 'ndjson', 'csv')
+FORMAT_EXTENSIONS = {
+    '.json': 'json',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.csv': 'csv',
+}
+
+_WHITESPACE = re.compile(r'\s*')
+
+
+class ImportRowError(ValueError):
+    """
+    Ошибка в отдельной строке импорта. Не прерывает импорт файла.
+    """
+
+
+def detect_format(file_name):
+    """
+    Определяет формат файла импорта по расширению.
+    """
+    for extension, file_format in FORMAT_EXTENSIONS.items():
+        if file_name.lower().endswith(extension):
+            return file_format
+    raise ValueError(f'Неизвестный формат файла импорта: {file_name}')
+
+
+def iter_json_array(stream, chunk_size=READ_CHUNK_SIZE):
+    """
+    Разбирает JSON-массив объектов по частям, не загружая файл целиком.
+    Возвращает пары (номер записи, объект).
+    """
+    decoder = json.JSONDecoder(parse_float=Decimal)
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def read_more():
+        nonlocal buffer, pos, eof
+        chunk = '' if eof else stream.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    def peek():
+        nonlocal pos
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos < len(buffer):
+                return buffer[pos]
+            if not read_more():
+                raise ValueError('Неожиданный конец JSON-массива')
+
+    if peek() != '[':
+        raise ValueError('Ожидается JSON-массив объектов')
+    pos += 1
+    if peek() == ']':
+        return
+
+    row = 0
+    while True:
+        peek()
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if not read_more():
+                    raise
+                continue
+            # Число на границе блока может продолжаться в следующем блоке.
+            if end < len(buffer) or not isinstance(obj, (int, Decimal)) or not read_more():
+                break
+        pos = end
+        row += 1
+        yield row, obj
+
+        char = peek()
+        if char == ']':
+            return
+        if char != ',':
+            raise ValueError(f'Ожидается "," после записи {row}')
+        pos += 1
+
+
+def iter_ndjson(stream):
+    """
+    Разбирает NDJSON: по одному JSON-объекту в строке.
+    Битые строки возвращаются как ImportRowError, а не прерывают импорт.
+    """
+    for row, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield row, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield row, ImportRowError(f'Неверный JSON: {e.msg}')
+
+
+def iter_csv(stream):
+    """
+    Разбирает CSV с заголовком (name, price, stock, store, category, description).
+    """
+    reader = csv.DictReader(stream)
+    for row, record in enumerate(reader, start=1):
+        yield row, {key.strip(): value for key, value in record.items() if key}
+
+
+READERS = {
+    'json': iter_json_array,
+    'ndjson': iter_ndjson,
+    'csv': iter_csv,
+}
+
+
+def iter_records(stream, file_format):
+    """
+    Возвращает итератор записей для бинарного потока в заданном формате.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    return READERS[file_format](text)
+
+
+def _clean_text(record, key):
+    value = record.get(key)
+    if value is None:
+        return None
+    return str(value).strip()
+
+
+def clean_record(record):
+    """
+    Проверяет запись импорта и приводит поля к типам модели Product.
+    """
+    if not isinstance(record, dict):
+        raise ImportRowError('Запись должна быть объектом')
+
+    name = _clean_text(record, 'name')
+    if not name:
+        raise ImportRowError('Не указано название товара')
+    if len(name) > Product._meta.get_field('name').max_length:
+        raise ImportRowError('Слишком длинное название товара')
+
+    store = _clean_text(record, 'store')
+    if not store:
+        raise ImportRowError('Не указан магазин')
+
+    try:
+        price = Decimal(str(record.get('price')).strip()).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        raise ImportRowError('Неверная цена')
+    if not price.is_finite() or price < Decimal('0.01') or len(price.as_tuple().digits) > 10:
+        raise ImportRowError('Неверная цена')
+
+    cleaned = {'name': name, 'store': store, 'price': price}
+
+    stock = record.get('stock')
+    if stock not in (None, ''):
+        try:
+            stock = int(str(stock).strip())
+        except ValueError:
+            raise ImportRowError('Неверный остаток')
+        if stock < 0:
+            raise ImportRowError('Остаток не может быть отрицательным')
+        cleaned['stock'] = stock
+
+    if 'category' in record:
+        cleaned['category'] = _clean_text(record, 'category') or None
+    if 'description' in record:
+        cleaned['description'] = _clean_text(record, 'description') or ''
+    return cleaned
+
+
+class ProductImporter:
+    """
+    Импорт товаров пачками: магазины и категории ищутся по имени через
+    кэш в памяти, товары (ключ - магазин и название) создаются через
+    bulk_create и обновляются через bulk_update. Остатки пишутся в Inventory:
+    запись, в которой изменился только остаток, не трогает таблицу товаров.
+    """
+    update_fields = ('price', 'category', 'description')
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, max_errors=IMPORT_MAX_ERRORS, progress=None):
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.progress = progress
+        self.stores = {}
+        self.categories = {}
+        self.stats = {'processed': 0, 'created': 0, 'updated': 0, 'failed': 0, 'errors': []}
+
+    def run(self, records):
+        """
+        Импортирует записи из итератора пар (номер строки, запись).
+        """
+        batch = []
+        for row, record in records:
+            self.stats['processed'] += 1
+            try:
+                if isinstance(record, ImportRowError):
+                    raise record
+                batch.append((row, clean_record(record)))
+            except ImportRowError as e:
+                self.add_error(row, str(e))
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        if batch:
+            self.flush(batch)
+        return self.stats
+
+    def add_error(self, row, message):
+        self.stats['failed'] += 1
+        if len(self.stats['errors']) < self.max_errors:
+            self.stats['errors'].append({'row': row, 'error': message})
+
+    def flush(self, batch):
+        """
+        Записывает пачку строк в одной транзакции.
+        """
+        with transaction.atomic():
+            self.resolve(self.stores, Store, {rec['store'] for _, rec in batch})
+            self.resolve(self.categories, Category, {rec['category'] for _, rec in batch if rec.get('category')})
+
+            rows = {}
+            for row, rec in batch:
+                rows[(self.stores[rec.pop('store')], rec['name'])] = (row, rec)
+
+            existing = {}
+            lookup = Product.objects.filter(
+                store_id__in={key[0] for key in rows},
+                name__in={key[1] for key in rows},
+            ).order_by('-id').values_list('id', 'store_id', 'name')
+            for pk, store_id, name in lookup:
+                existing[(store_id, name)] = pk
+
+            now = timezone.now()
+            to_create = []
+            to_update = {}
+            stock = {}
+            for key, (row, rec) in rows.items():
+                if 'category' in rec:
+                    rec['category_id'] = self.categories.get(rec.pop('category'))
+                pk = existing.get(key)
+                if pk is None:
+                    to_create.append(Product(store_id=key[0], **rec))
+                    continue
+                if 'stock' in rec:
+                    stock[pk] = rec.pop('stock')
+                fields = tuple(field for field in self.update_fields
+                               if field in rec or f'{field}_id' in rec)
+                if fields:
+                    to_update.setdefault(fields, []).append(Product(id=pk, updated_at=now, **rec))
+
+            Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+            # Остаток обновляется или создается, если у товара еще нет записи Inventory.
+            Inventory.objects.bulk_create(
+                [Inventory(product_id=pk, stock=quantity, updated_at=now) for pk, quantity in stock.items()],
+                update_conflicts=True, unique_fields=['product'], update_fields=['stock', 'updated_at'],
+                batch_size=self.batch_size,
+            )
+            for fields, products in to_update.items():
+                Product.objects.bulk_update(products, fields + ('updated_at',), batch_size=self.batch_size)
+            if to_create or to_update:
+                invalidate_products([product.id for products in to_update.values() for product in products])
+
+        self.stats['created'] += len(to_create)
+        self.stats['updated'] += len(rows) - len(to_create)
+        if self.progress:
+            self.progress(self.stats)
+
+    @staticmethod
+    def resolve(cache, model, names):
+        """
+        Дополняет кэш имя -> id недостающими записями, создавая новые.
+        """
+        missing = names - cache.keys()
+        if not missing:
+            return
+        model.objects.bulk_create([model(name=name) for name in missing], ignore_conflicts=True)
+        cache.update(model.objects.filter(name__in=missing).values_list('name', 'id'))
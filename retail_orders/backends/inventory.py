@@ -0,0 +1,28 @@
+from .models import Inventory
+
+
+def _levels_query(product_ids):
+    return Inventory.objects.filter(product_id__in=product_ids).values_list(
+        'product_id', 'stock', 'reserved', 'updated_at')
+
+
+def inventory_levels(product_ids):
+    """
+    Остатки товаров одним запросом: {product_id: (stock, reserved, updated_at)}.
+    Запрос не затрагивает таблицу товаров, поэтому закэшированные запросы
+    и ответы каталога от него не зависят.
+    """
+    return {
+        product_id: (stock, reserved, updated_at)
+        for product_id, stock, reserved, updated_at in _levels_query(product_ids)
+    }
+
+
+async def ainventory_levels(product_ids):
+    """
+    Асинхронный inventory_levels.
+    """
+    return {
+        product_id: (stock, reserved, updated_at)
+        async for product_id, stock, reserved, updated_at in _levels_query(product_ids)
+    }
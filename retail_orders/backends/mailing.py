@@ -0,0 +1,96 @@
+import logging
+import smtplib
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+
+
+logger = logging.getLogger(__name__)
+
+EMAIL_MAX_RETRIES = 3
+EMAIL_RETRY_DELAY = 60
+
+
+def recipient_batches(recipients, batch_size):
+    """
+    Делит получателей на пачки, пропуская пустые адреса и повторы.
+    """
+    batch = []
+    seen = set()
+    for recipient in recipients:
+        recipient = (recipient or '').strip()
+        if not recipient or recipient.lower() in seen:
+            continue
+        seen.add(recipient.lower())
+        batch.append(recipient)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def build_message(recipient, subject, body, html_body=None, from_email=None, connection=None):
+    message = EmailMultiAlternatives(subject, body, from_email, [recipient], connection=connection)
+    if html_body:
+        message.attach_alternative(html_body, 'text/html')
+    return message
+
+
+class BulkMailer:
+    """
+    Массовая рассылка: получатели делятся на пачки по batch_size, на пачку
+    открывается одно соединение почтового бэкенда. Каждое письмо отправляется
+    отдельно, поэтому отказ по одному адресу не прерывает пачку; при потере
+    соединения неотправленные адреса пачки считаются ошибочными.
+    rate_limit - не больше писем в секунду (пачка ждет, если отправилась быстрее).
+    """
+    def __init__(self, batch_size=None, rate_limit=None, backend=None):
+        self.batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+        self.rate_limit = settings.EMAIL_RATE_LIMIT if rate_limit is None else rate_limit
+        self.backend = backend
+        self.stats = {'sent': 0, 'failed': 0, 'batches': 0, 'elapsed': 0.0, 'per_second': 0.0}
+
+    def send(self, recipients, subject, body, html_body=None, from_email=None):
+        """
+        Отправляет письмо всем получателям. Возвращает список адресов,
+        которым отправить не удалось.
+        """
+        failed = []
+        started = time.monotonic()
+        for batch in recipient_batches(recipients, self.batch_size):
+            batch_started = time.monotonic()
+            pending = list(batch)
+            try:
+                with get_connection(self.backend) as connection:
+                    while pending:
+                        try:
+                            connection.send_messages([
+                                build_message(pending[0], subject, body, html_body, from_email, connection)])
+                        except smtplib.SMTPRecipientsRefused as e:
+                            logger.warning('Письмо для %s не отправлено: %s', pending[0], e)
+                            failed.append(pending[0])
+                        else:
+                            self.stats['sent'] += 1
+                        pending.pop(0)
+            except (smtplib.SMTPException, OSError) as e:
+                # Соединение потеряно: неотправленные письма пачки уходят в повтор.
+                logger.warning('Ошибка соединения при рассылке: %s', e)
+                failed.extend(pending)
+            self.stats['batches'] += 1
+            self.wait(batch_started, len(batch))
+
+        self.stats['failed'] += len(failed)
+        self.stats['elapsed'] += time.monotonic() - started
+        if self.stats['elapsed']:
+            self.stats['per_second'] = round(self.stats['sent'] / self.stats['elapsed'], 1)
+        logger.info('Рассылка: отправлено %(sent)s, ошибок %(failed)s, пачек %(batches)s, '
+                    '%(per_second)s писем/с', self.stats)
+        return failed
+
+    def wait(self, batch_started, count):
+        if self.rate_limit:
+            delay = count / self.rate_limit - (time.monotonic() - batch_started)
+            if delay > 0:
+                time.sleep(delay)
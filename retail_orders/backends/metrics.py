@@ -0,0 +1,242 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django_redis.cache import RedisCache
+
+
+logger = logging.getLogger(__name__)
+
+# Метрики текущего запроса (RequestMetrics) или None вне RequestMetricsMiddleware.
+current_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+_MISSING = object()
+
+
+class RequestMetrics:
+    """
+    Метрики одного запроса. Экземпляр - обертка execute_wrapper, которая считает
+    запросы и их время по формам: форма - текст SQL с плейсхолдерами, поэтому
+    повторы одного запроса (N+1) видны без разбора SQL.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.shapes = {}
+        self.slowest = (0.0, None, None)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries += 1
+            self.sql_time += duration
+            count, total = self.shapes.get(sql, (0, 0.0))
+            self.shapes[sql] = (count + 1, total + duration)
+            if duration > self.slowest[0]:
+                self.slowest = (duration, sql, params)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def duplicates(self):
+        """
+        Формы запросов, выполненные больше одного раза: {sql: (число, время)}.
+        """
+        return {sql: shape for sql, shape in self.shapes.items() if shape[0] > 1}
+
+    def duplicate_count(self):
+        return sum(count - 1 for count, _ in self.shapes.values())
+
+    def server_timing(self, total):
+        """
+        Значение заголовка Server-Timing: время SQL с числом запросов и повторов,
+        обращения к кэшу, время без SQL и полное время запроса (мс).
+        """
+        return ', '.join([
+            f'db;dur={self.sql_time * 1000:.2f};desc="queries={self.queries} duplicates={self.duplicate_count()}"',
+            f'cache;desc="hits={self.cache_hits} misses={self.cache_misses}"',
+            f'view;dur={(total - self.sql_time) * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+    def offending_sql(self, limit=5):
+        """
+        Строки для журнала медленных запросов: самый долгий запрос и повторяющиеся
+        формы по убыванию суммарного времени. SQL пишется с плейсхолдерами;
+        значения параметров (данные пользователей) - только при REQUEST_METRICS_LOG_SQL_PARAMS.
+        """
+        duration, sql, params = self.slowest
+        shown = f' {params!r}' if settings.REQUEST_METRICS_LOG_SQL_PARAMS else ''
+        lines = [f'самый долгий ({duration * 1000:.1f} мс): {sql}{shown}'] if sql else []
+        shapes = sorted(self.duplicates().items(), key=lambda item: item[1][1], reverse=True)
+        lines += [f'x{count} ({total * 1000:.1f} мс): {sql}' for sql, (count, total) in shapes[:limit]]
+        return lines
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Постоянная обертка соединений БД (подключается сигналом connection_created):
+    передает запрос метрикам текущего запроса. Метрики берутся из контекста,
+    а не из соединения, поэтому асинхронные запросы, чьи вызовы ORM выполняются
+    в одном потоке, не смешиваются.
+    """
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def record_cache_access(hits, misses):
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+class InstrumentedRedisCache(RedisCache):
+    """
+    Кэш django-redis, который считает попадания и промахи get/get_many
+    в метриках текущего запроса.
+    """
+    def get(self, key, default=None, version=None, client=None):
+        value = super().get(key, _MISSING, version=version, client=client)
+        if value is _MISSING:
+            record_cache_access(0, 1)
+            return default
+        record_cache_access(1, 0)
+        return value
+
+    def get_many(self, keys, *args, **kwargs):
+        keys = list(keys)
+        values = super().get_many(keys, *args, **kwargs)
+        record_cache_access(len(values), len(keys) - len(values))
+        return values
+
+    async def aget_many(self, keys, version=None):
+        # BaseCache.aget_many читает ключи по одному; здесь - одна команда MGET.
+        return await sync_to_async(self.get_many)(keys, version=version)
+
+
+class ActionStats:
+    """
+    Сводка метрик по действиям (ViewSet.action или имя URL). Счетчики копятся
+    в памяти процесса и раз в REQUEST_METRICS_FLUSH_INTERVAL секунд одним
+    конвейером добавляются в хэши Redis, общие для всех процессов.
+    """
+    prefix = 'metrics:actions'
+    fields = ('requests', 'total_ms', 'sql_ms', 'queries', 'duplicates', 'cache_hits', 'cache_misses', 'slow')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = defaultdict(lambda: dict.fromkeys(self.fields, 0))
+        self.flushed_at = time.monotonic()
+
+    @property
+    def client(self):
+        from django_redis import get_redis_connection
+
+        return get_redis_connection(settings.REQUEST_METRICS_REDIS_ALIAS)
+
+    def record(self, action, **values):
+        """
+        Добавляет запрос к счетчикам действия. Возвращает накопленные счетчики,
+        если их пора сохранить (flush), иначе None.
+        """
+        with self.lock:
+            counters = self.pending[action]
+            counters['requests'] += 1
+            for field, value in values.items():
+                counters[field] += value
+            if time.monotonic() - self.flushed_at >= settings.REQUEST_METRICS_FLUSH_INTERVAL:
+                pending, self.pending = self.pending, defaultdict(lambda: dict.fromkeys(self.fields, 0))
+                self.flushed_at = time.monotonic()
+                return pending
+        return None
+
+    def flush(self, pending):
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                for action, counters in pending.items():
+                    pipe.sadd(self.prefix, action)
+                    for field, value in counters.items():
+                        if value:
+                            pipe.hincrbyfloat(f'{self.prefix}:{action}', field, value)
+                pipe.execute()
+        except Exception:
+            # Метрики не должны ломать запросы: несохраненные счетчики теряются.
+            logger.exception('Не удалось сохранить метрики запросов')
+
+    def snapshot(self):
+        """
+        Сводка всех процессов (сохраненная в Redis) с учетом еще не сохраненных
+        счетчиков этого процесса, по убыванию суммарного времени.
+        """
+        client = self.client
+        actions = sorted(action.decode() for action in client.smembers(self.prefix))
+        with client.pipeline(transaction=False) as pipe:
+            for action in actions:
+                pipe.hgetall(f'{self.prefix}:{action}')
+            stored = pipe.execute()
+
+        totals = defaultdict(lambda: dict.fromkeys(self.fields, 0))
+        for action, counters in zip(actions, stored):
+            for field, value in counters.items():
+                totals[action][field.decode()] += float(value)
+        with self.lock:
+            for action, counters in self.pending.items():
+                for field, value in counters.items():
+                    totals[action][field] += value
+
+        rows = []
+        for action, counters in totals.items():
+            requests = counters['requests'] or 1
+            rows.append({
+                'action': action,
+                'requests': int(counters['requests']),
+                'avg_ms': round(counters['total_ms'] / requests, 2),
+                'avg_sql_ms': round(counters['sql_ms'] / requests, 2),
+                'avg_queries': round(counters['queries'] / requests, 2),
+                'duplicates': int(counters['duplicates']),
+                'cache_hits': int(counters['cache_hits']),
+                'cache_misses': int(counters['cache_misses']),
+                'slow': int(counters['slow']),
+                'total_ms': round(counters['total_ms'], 2),
+            })
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def reset(self):
+        client = self.client
+        actions = [action.decode() for action in client.smembers(self.prefix)]
+        client.delete(self.prefix, *[f'{self.prefix}:{action}' for action in actions])
+        with self.lock:
+            self.pending.clear()
+
+
+action_stats = ActionStats()
+
+
+def request_action(request):
+    """
+    Имя действия запроса для сводки: 'ProductViewSet.list' для ViewSet,
+    имя URL для остальных представлений.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    view_class = getattr(match.func, 'cls', None)
+    actions = getattr(match.func, 'actions', None)
+    if view_class is not None and actions:
+        return f'{view_class.__name__}.{actions.get(request.method.lower(), request.method.lower())}'
+    if view_class is not None:
+        return view_class.__name__
+    return match.view_name or match._func_path
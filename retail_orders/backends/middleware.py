@@ -0,0 +1,131 @@
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from .metrics import RequestMetrics, action_stats, current_metrics, logger, request_action
+from .routers import RoutingState, current_routing
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RequestMetricsMiddleware:
+    """
+    Метрики каждого запроса: число и время SQL запросов, повторяющиеся формы
+    запросов, попадания и промахи кэша, время без SQL. Метрики отдаются
+    в заголовке Server-Timing (REQUEST_METRICS_SERVER_TIMING), суммируются
+    по действиям (metrics.action_stats), а медленные запросы (дольше
+    REQUEST_METRICS_SLOW_MS) с долей REQUEST_METRICS_SLOW_SAMPLE_RATE пишутся
+    в журнал вместе с SQL. Накладные расходы - обертка вызова SQL и несколько
+    сложений на запрос, поэтому middleware включен всегда. Работает и в
+    асинхронной цепочке (ASGI), не переводя асинхронные представления в потоки.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        pending = self.finish(request, response, metrics)
+        if pending:
+            action_stats.flush(pending)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        # sync_to_async копирует контекст, поэтому вызовы ORM в потоках видят эти метрики.
+        token = current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        pending = self.finish(request, response, metrics)
+        if pending:
+            await sync_to_async(action_stats.flush, thread_sensitive=False)(pending)
+        return response
+
+    def finish(self, request, response, metrics):
+        """
+        Заголовок Server-Timing, журнал медленных запросов и сводка по действию.
+        Возвращает счетчики сводки, которые пора сохранить.
+        """
+        total = metrics.elapsed()
+        if settings.REQUEST_METRICS_SERVER_TIMING:
+            response['Server-Timing'] = metrics.server_timing(total)
+
+        action = request_action(request)
+        slow = total * 1000 >= settings.REQUEST_METRICS_SLOW_MS
+        if slow and random.random() < settings.REQUEST_METRICS_SLOW_SAMPLE_RATE:
+            logger.warning(
+                'Медленный запрос %s %s (%s): %.0f мс, SQL: %d запросов, %.0f мс, кэш: %d/%d\n%s',
+                request.method, request.get_full_path(), action, total * 1000, metrics.queries,
+                metrics.sql_time * 1000, metrics.cache_hits, metrics.cache_misses,
+                '\n'.join(metrics.offending_sql()),
+            )
+        return action_stats.record(
+            action, total_ms=total * 1000, sql_ms=metrics.sql_time * 1000, queries=metrics.queries,
+            duplicates=metrics.duplicate_count(),
+            cache_hits=metrics.cache_hits, cache_misses=metrics.cache_misses, slow=int(slow),
+        )
+
+
+class DatabaseRoutingMiddleware:
+    """
+    Read-your-writes при чтении с реплик (routers.PrimaryReplicaRouter). Запрос
+    с изменяющим методом целиком работает с основной БД. После записи клиент
+    получает cookie DATABASE_PIN_COOKIE и следующие DATABASE_PIN_SECONDS секунд
+    (дольше обычного отставания реплик) тоже читает из основной БД. Без реплик
+    middleware ничего не делает.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        state = self.routing_state(request)
+        token = current_routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        return self.pin(response, state)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+        state = self.routing_state(request)
+        token = current_routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        return self.pin(response, state)
+
+    def routing_state(self, request):
+        return RoutingState(
+            primary=request.method not in SAFE_METHODS or settings.DATABASE_PIN_COOKIE in request.COOKIES)
+
+    def pin(self, response, state):
+        if state.wrote:
+            response.set_cookie(settings.DATABASE_PIN_COOKIE, '1', max_age=settings.DATABASE_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
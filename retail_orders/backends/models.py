@@ -28,6 +28,21 @@ class Category(models.Model):
         return self.name
 
 
+class ProductQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Создает товары и их остатки (Inventory), как save(): товар без заданного
+        stock получает запись с нулевым остатком.
+        Нужна СУБД, которая возвращает id из bulk_create (SQLite, PostgreSQL).
+        """
+        objs = super().bulk_create(objs, *args, **kwargs)
+        Inventory.objects.bulk_create(
+            [obj._state.fields_cache.get('inventory') or Inventory(product=obj) for obj in objs if obj.pk is not None],
+            batch_size=kwargs.get('batch_size'),
+        )
+        return objs
+
+
 class Product(models.Model):
     """
     Класс для создания продукта
@@ -38,15 +53,103 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0.01)])
     store = models.ForeignKey(Store, on_delete=models.CASCADE)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
-    stock = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    thumbnails = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+    _stock_changed = False
+
     def __str__(self):
         return f"{self.name} ({self.store.name})"
 
+    def get_inventory(self):
+        """
+        Остатки товара (Inventory); для нового товара - еще не сохраненная запись.
+        Товар без записи остатков считается отсутствующим на складе.
+        """
+        try:
+            return self.inventory
+        except Inventory.DoesNotExist:
+            return Inventory(product=self)
+
+    @property
+    def stock(self):
+        return self.get_inventory().stock
+
+    @stock.setter
+    def stock(self, value):
+        self.get_inventory().stock = value
+        self._stock_changed = True
+
+    @property
+    def reserved(self):
+        return self.get_inventory().reserved
+
+    @property
+    def available_stock(self):
+        """
+        Остаток за вычетом активных резервов корзин.
+        """
+        return self.stock - self.reserved
+
+    def save(self, *args, **kwargs):
+        """
+        Остаток, заданный через stock (форма, сериализатор, Product.objects.create),
+        сохраняется в Inventory; reserved меняют только резервы корзин.
+        """
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding or self._stock_changed:
+            self.inventory, _ = Inventory.objects.update_or_create(product=self, defaults={'stock': self.stock})
+            self._stock_changed = False
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+            models.Index(fields=['store', '-created_at', '-id'], name='product_store_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='product_category_created_idx'),
+            models.Index(fields=['price', '-created_at', '-id'], name='product_price_created_idx'),
+        ]
+
+class Inventory(models.Model):
+    """
+    Остатки товара. Вынесены из Product: оформление заказов и резервы корзин
+    меняют только эту таблицу, поэтому кэши каталога (cachalot и кэш ответов)
+    при продажах не сбрасываются.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='inventory')
+    stock = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    reserved = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.stock} шт. ({self.reserved} в резерве) для {self.product_id}"
+
+class ProductThumbnail(models.Model):
+    """
+    Миниатюра изображения товара для алиаса из THUMBNAIL_ALIASES.
+    source_hash - хэш содержимого исходного изображения, из которого она получена.
+    Готовые URL и размеры миниатюр дублируются в Product.thumbnails для выдачи в API.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    alias = models.CharField(max_length=50)
+    source_hash = models.CharField(max_length=64)
+    name = models.CharField(max_length=255)
+    width = models.PositiveIntegerField(default=0)
+    height = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.alias} для {self.product_id}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'alias'], name='unique_product_thumbnail_alias'),
+        ]
+
+ORDER_STATUSES = [('pending', 'Ожидает'), ('completed', 'Завершен')]
+
 
 class Order(models.Model):
     """
@@ -55,19 +158,25 @@ class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
     products = models.ManyToManyField(Product, through='OrderItem')
-    status = models.CharField(max_length=20, choices=[('pending', 'Ожидает'), ('completed', 'Завершен')])
+    status = models.CharField(max_length=20, choices=ORDER_STATUSES)
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    items_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"Заказ {self.id} для {self.user.username} ({self.status})"
 
-    @property
-    def total_price(self):
-        return sum(item.product.price * item.quantity for item in self.orderitem_set.all())
-
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'status', '-created_at'], name='order_user_status_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='order_status_created_idx'),
+            models.Index(fields=['status', 'completed_at'], name='order_status_completed_idx'),
+            models.Index(fields=['-created_at', '-id'], name='order_created_idx'),
+        ]
 
 class OrderItem(models.Model):
     """
@@ -76,10 +185,159 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    price = models.DecimalField(max_digits=10, decimal_places=2)
 
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
 
+    def save(self, *args, **kwargs):
+        """
+        Фиксирует цену товара на момент добавления позиции.
+        """
+        if self.price is None:
+            self.price = self.product.price
+        super().save(*args, **kwargs)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'product'], name='unique_order_product'),
+        ]
+
+
+class ArchivedOrder(models.Model):
+    """
+    Завершенный заказ, перенесенный из Order архивацией (archive.archive_orders).
+    id заказа сохраняется, поэтому id живых и архивных заказов не пересекаются.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    status = models.CharField(max_length=20, choices=ORDER_STATUSES)
+    total_price = models.DecimalField(max_digits=12, decimal_places=2)
+    items_count = models.PositiveIntegerField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    completed_at = models.DateTimeField(null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Архивный заказ {self.id} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='archived_order_user_idx'),
+        ]
+
+
+class ArchivedOrderItem(models.Model):
+    """
+    Позиция архивного заказа (id позиции сохраняется).
+    """
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    quantity = models.PositiveIntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id}"
+
+
+class OrderHistory(models.Model):
+    """
+    История заказов: живые и архивные заказы вместе (представление БД, только чтение).
+    Поля и имя обратной связи позиций (orderitem_set) совпадают с Order, поэтому
+    фильтры, пагинация и OrderSerializer работают с ней без изменений.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    status = models.CharField(max_length=20, choices=ORDER_STATUSES)
+    total_price = models.DecimalField(max_digits=12, decimal_places=2)
+    items_count = models.PositiveIntegerField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    completed_at = models.DateTimeField(null=True)
+    archived = models.BooleanField()
+
+    def __str__(self):
+        return f"Заказ {self.id} ({self.status})"
+
+    class Meta:
+        managed = False
+        db_table = 'retail_orders_order_history'
+        ordering = ['-created_at']
+
+
+class OrderHistoryItem(models.Model):
+    """
+    Позиции живых и архивных заказов (представление БД, только чтение).
+    """
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(OrderHistory, on_delete=models.DO_NOTHING, db_constraint=False,
+                              related_name='orderitem_set')
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    quantity = models.PositiveIntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id}"
+
+    class Meta:
+        managed = False
+        db_table = 'retail_orders_order_history_item'
+
+
+class StockReservation(models.Model):
+    """
+    Резерв товара для позиции корзины на ограниченное время.
+    owner - владелец корзины ('user:<id>' или 'anon:<cart_id>').
+    """
+    owner = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} для {self.owner}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'product'], name='unique_reservation_owner_product'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ]
+
+
+class SalesRollup(models.Model):
+    """
+    Итоги продаж за день по магазину и категории товаров: штуки, выручка и число
+    заказов с товарами этой группы. Обновляются при оформлении заказа и
+    пересчитываются командой rebuild_sales_rollups.
+    """
+    day = models.DateField()
+    store = models.ForeignKey(Store, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.store_id}/{self.category_id}: {self.revenue}"
+
+    class Meta:
+        ordering = ['-day', 'store', 'category']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'store', 'category'], name='unique_sales_rollup'),
+            # NULL в уникальном ограничении не совпадает с NULL, поэтому строки без категории - отдельно.
+            models.UniqueConstraint(fields=['day', 'store'], condition=models.Q(category__isnull=True),
+                                    name='unique_sales_rollup_no_category'),
+        ]
+        indexes = [
+            models.Index(fields=['store', 'day'], name='sales_rollup_store_day_idx'),
+            models.Index(fields=['category', 'day'], name='sales_rollup_category_day_idx'),
+        ]
+
 
 class Contact(models.Model):
     """
@@ -0,0 +1,177 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .exceptions import InsufficientStock
+from .models import Inventory, StockReservation
+
+
+RESERVATION_EXPIRE_BATCH_SIZE = 1000
+
+
+def _per_product(values):
+    return Case(
+        *[When(product_id=product_id, then=Value(value)) for product_id, value in values.items()],
+        output_field=IntegerField(),
+    )
+
+
+def _lock_products(product_ids):
+    """
+    Блокирует строки остатков в порядке id товаров (как checkout_order), если их несколько,
+    чтобы многострочные UPDATE не приводили к взаимным блокировкам.
+    """
+    if len(product_ids) > 1:
+        list(Inventory.objects.select_for_update().filter(product_id__in=product_ids)
+             .order_by('product_id').values_list('product_id', flat=True))
+
+
+def _release_rows(rows):
+    """
+    Снимает резервы (id, product_id, quantity): уменьшает Inventory.reserved
+    одним UPDATE и удаляет строки резервов.
+    """
+    if not rows:
+        return 0
+    totals = defaultdict(int)
+    for pk, product_id, quantity in rows:
+        totals[product_id] += quantity
+    _lock_products(totals)
+    Inventory.objects.filter(product_id__in=totals).update(
+        reserved=F('reserved') - _per_product(totals), updated_at=timezone.now())
+    StockReservation.objects.filter(id__in=[row[0] for row in rows]).delete()
+    return len(rows)
+
+
+def hold(owner, lines, increment=False, ttl=None):
+    """
+    Резервирует товары для корзины owner: lines - {product_id: quantity}.
+    Количество задает итоговый резерв по товару (при increment=True добавляется
+    к текущему), 0 снимает резерв; срок всех затронутых резервов продлевается.
+    Доступный остаток (stock - reserved) проверяется и резерв увеличивается одним
+    условным UPDATE остатков, который выполняется последним, чтобы строка
+    популярного товара была заблокирована как можно меньше. Таблица товаров
+    не меняется, поэтому кэш каталога резервы не сбрасывают.
+    При нехватке поднимает InsufficientStock, при отрицательном итоговом
+    резерве - ValueError; резервы не меняются.
+    """
+    expires_at = timezone.now() + timedelta(seconds=ttl or settings.STOCK_RESERVATION_TTL)
+    targets = {}
+    held = {}
+    try:
+        with transaction.atomic():
+            current = {
+                reservation.product_id: reservation
+                for reservation in StockReservation.objects.select_for_update().filter(owner=owner, product_id__in=lines)
+            }
+            held = {product_id: reservation.quantity for product_id, reservation in current.items()}
+            deltas = {}
+            to_create = []
+            to_update = []
+            to_delete = []
+            for product_id, quantity in lines.items():
+                reservation = current.get(product_id)
+                targets[product_id] = target = held.get(product_id, 0) + quantity if increment else quantity
+                if target < 0:
+                    raise ValueError(f'Резерв товара {product_id} не может быть отрицательным: {target}')
+                if target != held.get(product_id, 0):
+                    deltas[product_id] = target - held.get(product_id, 0)
+                if reservation is None:
+                    if target > 0:
+                        to_create.append(StockReservation(owner=owner, product_id=product_id,
+                                                          quantity=target, expires_at=expires_at))
+                elif target > 0:
+                    reservation.quantity = target
+                    reservation.expires_at = expires_at
+                    to_update.append(reservation)
+                else:
+                    to_delete.append(reservation.pk)
+
+            if to_delete:
+                StockReservation.objects.filter(pk__in=to_delete).delete()
+            StockReservation.objects.bulk_create(to_create)
+            StockReservation.objects.bulk_update(to_update, ['quantity', 'expires_at'])
+
+            if deltas:
+                _lock_products(deltas)
+                increase = {product_id: delta for product_id, delta in deltas.items() if delta > 0}
+                decrease = {product_id: -delta for product_id, delta in deltas.items() if delta < 0}
+                if decrease:
+                    Inventory.objects.filter(product_id__in=decrease).update(
+                        reserved=F('reserved') - _per_product(decrease), updated_at=timezone.now())
+                if increase:
+                    needed = _per_product(increase)
+                    updated = Inventory.objects.filter(
+                        product_id__in=increase, stock__gte=F('reserved') + needed,
+                    ).update(reserved=F('reserved') + needed, updated_at=timezone.now())
+                    if updated != len(increase):
+                        raise InsufficientStock([])
+    except InsufficientStock as e:
+        e.items = [
+            {'product_id': product_id, 'name': name, 'requested': targets[product_id],
+             'available': stock - reserved + held.get(product_id, 0)}
+            for product_id, name, stock, reserved in Inventory.objects.filter(product_id__in=lines).values_list(
+                'product_id', 'product__name', 'stock', 'reserved')
+            if stock - reserved + held.get(product_id, 0) < targets[product_id]
+        ]
+        raise
+
+
+def release(owner, product_ids=None):
+    """
+    Снимает резервы корзины owner (все или только по product_ids).
+    """
+    with transaction.atomic():
+        reservations = StockReservation.objects.select_for_update().filter(owner=owner)
+        if product_ids is not None:
+            reservations = reservations.filter(product_id__in=product_ids)
+        return _release_rows(list(reservations.values_list('id', 'product_id', 'quantity')))
+
+
+def transfer(source, target):
+    """
+    Передает резервы анонимной корзины source корзине target (после входа).
+    Inventory.reserved не меняется: общий объем резервов остается тем же.
+    """
+    with transaction.atomic():
+        reservations = list(StockReservation.objects.select_for_update().filter(owner=source))
+        if not reservations:
+            return
+        existing = {
+            reservation.product_id: reservation
+            for reservation in StockReservation.objects.select_for_update().filter(
+                owner=target, product_id__in=[reservation.product_id for reservation in reservations])
+        }
+        for reservation in reservations:
+            kept = existing.get(reservation.product_id)
+            if kept is not None:
+                kept.quantity += reservation.quantity
+                kept.expires_at = max(kept.expires_at, reservation.expires_at)
+            reservation.owner = target
+        StockReservation.objects.bulk_update(existing.values(), ['quantity', 'expires_at'])
+        StockReservation.objects.filter(pk__in=[r.pk for r in reservations if r.product_id in existing]).delete()
+        StockReservation.objects.bulk_update([r for r in reservations if r.product_id not in existing], ['owner'])
+
+
+def expire_reservations(batch_size=RESERVATION_EXPIRE_BATCH_SIZE, now=None):
+    """
+    Снимает просроченные резервы пачками по batch_size: на пачку - один UPDATE
+    остатков и один DELETE. Строки, заблокированные другими транзакциями, пропускаются.
+    Возвращает количество снятых резервов.
+    """
+    now = now or timezone.now()
+    expired = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=now).order_by('expires_at')
+                .values_list('id', 'product_id', 'quantity')[:batch_size]
+            )
+            expired += _release_rows(rows)
+        if len(rows) < batch_size:
+            return expired
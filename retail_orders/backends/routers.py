@@ -0,0 +1,79 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from cachalot.utils import get_table_cache_key
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class RoutingState:
+    """
+    Маршрутизация в пределах запроса: primary - чтения идут в основную БД,
+    wrote - в запросе была запись (клиента нужно закрепить за основной БД).
+    """
+    def __init__(self, primary=False):
+        self.primary = primary
+        self.wrote = False
+
+
+current_routing = ContextVar('current_routing', default=None)
+
+
+@contextmanager
+def use_primary():
+    """
+    Все чтения внутри блока идут в основную БД, например в задаче, которая
+    читает только что записанные другим процессом данные.
+    """
+    token = current_routing.set(RoutingState(primary=True))
+    try:
+        yield
+    finally:
+        current_routing.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Запись - всегда в основную БД (default), чтение - в случайную реплику из
+    DATABASE_REPLICAS. В основную БД идут и чтения:
+    - внутри transaction.atomic() на основной БД (select_for_update, проверки перед записью);
+    - после записи в том же запросе и у клиента, закрепленного за основной БД
+      (DatabaseRoutingMiddleware, read-your-writes);
+    - связанных объектов экземпляра, прочитанного из основной БД.
+    Без реплик маршрутизатор ничего не меняет.
+    """
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS:
+            return None
+        state = current_routing.get()
+        if (state is not None and state.primary) or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = current_routing.get()
+        if state is not None:
+            state.primary = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же строки, что и основная БД.
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def table_cache_key(db_alias, table):
+    """
+    Ключ таблицы для cachalot (CACHALOT_TABLE_KEYGEN): у реплик он тот же, что
+    у основной БД, поэтому запись в основную БД сбрасывает и закэшированные
+    чтения с реплик.
+    """
+    if db_alias in settings.DATABASE_REPLICAS:
+        db_alias = DEFAULT_DB_ALIAS
+    return get_table_cache_key(db_alias, table)
@@ -0,0 +1,136 @@
+import re
+
+from django.db import connections
+from django.db.models import Q
+
+
+SEARCH_MAX_TERMS = 8
+SEARCH_CONFIG = 'simple'
+FTS_TABLE = 'retail_orders_product_fts'
+PRODUCT_TABLE = 'retail_orders_product'
+
+SQLITE_TRIGGERS = {
+    f'{FTS_TABLE}_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {PRODUCT_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+        END
+    """,
+    f'{FTS_TABLE}_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {PRODUCT_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+        END
+    """,
+    f'{FTS_TABLE}_au': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, description ON {PRODUCT_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+        END
+    """,
+}
+
+
+def install_search_index(connection):
+    """
+    Создает полнотекстовый индекс товаров, если его нет (повторный вызов безопасен).
+    SQLite: таблица FTS5 с внешним содержимым и триггеры, которые обновляют индекс
+    при любой записи в таблицу товаров, включая bulk_create/bulk_update импорта.
+    Триггеры срабатывают только при изменении name или description.
+    PostgreSQL: вычисляемый столбец tsvector (название с весом A, описание - B) и GIN индекс.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"""
+                ALTER TABLE {PRODUCT_TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector
+                GENERATED ALWAYS AS (
+                    setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A') ||
+                    setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')
+                ) STORED
+            """)
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS product_search_idx ON {PRODUCT_TABLE} USING GIN (search_vector)')
+            return
+
+        if connection.vendor != 'sqlite':
+            return
+
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+                name, description, content='{PRODUCT_TABLE}', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        """)
+        for sql in SQLITE_TRIGGERS.values():
+            cursor.execute(sql)
+        # Совпадение в названии весит больше, чем в описании.
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', 'bm25(10.0, 1.0)')")
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def repair_search_index(connection):
+    """
+    Триггеры SQLite пропадают, когда миграция пересоздает таблицу товаров:
+    если индекс установлен, но триггеров нет, они создаются заново и индекс перестраивается.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE %s",
+                       [f'{FTS_TABLE}%'])
+        existing = {row[0] for row in cursor.fetchall()}
+    if FTS_TABLE in existing and not existing.issuperset(SQLITE_TRIGGERS):
+        install_search_index(connection)
+
+
+def uninstall_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('DROP INDEX IF EXISTS product_search_idx')
+            cursor.execute(f'ALTER TABLE {PRODUCT_TABLE} DROP COLUMN IF EXISTS search_vector')
+        elif connection.vendor == 'sqlite':
+            for name in SQLITE_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def search_terms(query):
+    """
+    Слова поискового запроса (без операторов FTS), не больше SEARCH_MAX_TERMS.
+    """
+    return re.findall(r'\w+', query.lower())[:SEARCH_MAX_TERMS]
+
+
+def search_products(queryset, query, ranked=True):
+    """
+    Полнотекстовый поиск товаров: каждое слово запроса ищется как префикс слова
+    в названии или описании, нужны совпадения по всем словам.
+    При ranked=True результат упорядочен по релевантности (поле rank).
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        queryset = queryset.extra(
+            select={'rank': f"ts_rank_cd({PRODUCT_TABLE}.search_vector, to_tsquery('{SEARCH_CONFIG}', %s))"},
+            select_params=[tsquery],
+            where=[f"{PRODUCT_TABLE}.search_vector @@ to_tsquery('{SEARCH_CONFIG}', %s)"],
+            params=[tsquery],
+        )
+        ordering = ('-rank', '-id')
+    elif vendor == 'sqlite':
+        queryset = queryset.extra(
+            select={'rank': f'{FTS_TABLE}.rank'},
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {PRODUCT_TABLE}.id', f'{FTS_TABLE} MATCH %s'],
+            params=[' '.join(f'"{term}"*' for term in terms)],
+        )
+        ordering = ('rank', '-id')
+    else:
+        for term in terms:
+            queryset = queryset.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        return queryset
+
+    return queryset.order_by(*ordering) if ranked else queryset
@@ -1,5 +1,10 @@
-from rest_framework import serializers
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from .inventory import inventory_levels
 from .models import Product, Category, Store, Order, OrderItem, Contact
+from .thumbnails import thumbnail_payload
 
 class CategorySerializer(serializers.ModelSerializer):
     """
@@ -24,10 +29,20 @@ class ProductSerializer(serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     store = StoreSerializer(read_only=True)
     stock = serializers.IntegerField(min_value=0)
+    thumbnails = serializers.SerializerMethodField()
+    reserved = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Product
-        fields = '__all__'
+        # stock и reserved хранятся в Inventory и доступны через свойства Product.
+        fields = ['id', 'category', 'store', 'stock', 'thumbnails', 'name', 'image', 'description', 'price',
+                  'reserved', 'created_at', 'updated_at']
+
+    def get_thumbnails(self, obj):
+        """
+        URL и размеры миниатюр из Product.thumbnails (заглушка, пока они не готовы).
+        """
+        return thumbnail_payload(obj.image, obj.thumbnails, self.context.get('request'))
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -38,19 +53,67 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = OrderItem
-        fields = ['id', 'product', 'quantity']
+        fields = ['id', 'product', 'quantity', 'price']
 
 class OrderSerializer(serializers.ModelSerializer):
     """
     Сериализатор для Order
     """
     orderitem_set = OrderItemSerializer(many=True, read_only=True)
-    total_price = serializers.ReadOnlyField()
 
     class Meta:
         model = Order
-        fields = ['id', 'user', 'status', 'created_at', 'updated_at', 'orderitem_set', 'total_price']
-        read_only_fields = ['user', 'created_at', 'updated_at']
+        fields = ['id', 'user', 'status', 'created_at', 'updated_at', 'completed_at', 'orderitem_set', 'total_price',
+                  'items_count']
+        read_only_fields = ['user', 'created_at', 'updated_at', 'completed_at', 'total_price', 'items_count']
+
+
+class CartAddSerializer(serializers.Serializer):
+    """
+    Добавление товара в корзину
+    """
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class CartRemoveSerializer(serializers.Serializer):
+    """
+    Удаление товара из корзины
+    """
+    product_id = serializers.IntegerField()
+
+
+class CartOperationSerializer(serializers.Serializer):
+    """
+    Операция пакетного изменения корзины
+    """
+    op = serializers.ChoiceField(choices=['add', 'set', 'remove'], default='add')
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, default=1)
+
+
+class CartBatchSerializer(serializers.Serializer):
+    """
+    Пакет операций над корзиной
+    """
+    operations = serializers.ListField(child=CartOperationSerializer(), allow_empty=False, max_length=1000)
+
+
+class SalesReportSerializer(serializers.Serializer):
+    """
+    Строка отчета о продажах (analytics.sales_report): поля группировки,
+    которых нет в строке, не выводятся.
+    """
+    day = serializers.DateField(read_only=True)
+    week = serializers.DateField(read_only=True)
+    month = serializers.DateField(read_only=True)
+    store = serializers.IntegerField(read_only=True)
+    store_name = serializers.CharField(read_only=True)
+    category = serializers.IntegerField(read_only=True)
+    category_name = serializers.CharField(read_only=True)
+    units = serializers.IntegerField(source='total_units', read_only=True)
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2, source='total_revenue', read_only=True)
+    orders = serializers.IntegerField(source='total_orders', read_only=True)
 
 
 class ContactSerializer(serializers.ModelSerializer):
@@ -60,4 +123,125 @@ class ContactSerializer(serializers.ModelSerializer):
     class Meta:
         model = Contact
         fields = '__all__'
-        read_only_fields = ['created_at']
\ No newline at end of file
+        read_only_fields = ['created_at']
+
+class ProductListSerializer:
+    """
+    Сериализатор списка товаров для быстрого чтения. Работает со строками
+    QuerySet.values(columns) и выдает тот же JSON, что и ProductSerializer,
+    но без создания моделей и вложенных сериализаторов: каждый магазин
+    и каждая категория сериализуются один раз на страницу. Остатки страницы
+    загружаются отдельным запросом к Inventory, чтобы запрос товаров
+    оставался в кэше cachalot при продажах (или передаются в levels
+    в формате inventory_levels).
+    """
+    columns = (
+        'id', 'thumbnails', 'name', 'image', 'description', 'price', 'created_at', 'updated_at',
+        'store_id', 'store__name', 'store__address', 'store__created_at', 'store__updated_at',
+        'category_id', 'category__name', 'category__description',
+    )
+    _fields = None
+
+    def __init__(self, rows, context=None, levels=None):
+        self.rows = rows
+        self.context = context or {}
+        self.levels = levels
+
+    @classmethod
+    def get_fields(cls):
+        """
+        Поля ProductSerializer, чьи to_representation используются для цены и дат.
+        """
+        if cls._fields is None:
+            cls._fields = ProductSerializer().fields
+        return cls._fields
+
+    @staticmethod
+    def iso_datetime(tz):
+        """
+        Быстрый аналог DateTimeField.to_representation для формата ISO 8601.
+        """
+        def to_representation(value):
+            if not value:
+                return None
+            value = value.astimezone(tz).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return to_representation
+
+    @staticmethod
+    def fixed_decimal(field):
+        """
+        DecimalField.to_representation без повторного округления значений,
+        которые уже пришли из БД с нужным числом знаков.
+        """
+        exponent = -field.decimal_places
+
+        def to_representation(value):
+            if value.as_tuple().exponent == exponent:
+                return f'{value:f}'
+            return field.to_representation(value)
+        return to_representation
+
+    @property
+    def data(self):
+        fields = self.get_fields()
+        price = self.fixed_decimal(fields['price'])
+        datetime = fields['created_at'].to_representation
+        if settings.USE_TZ and api_settings.DATETIME_FORMAT.lower() == ISO_8601:
+            datetime = self.iso_datetime(timezone.get_current_timezone())
+        image_url = Product._meta.get_field('image').storage.url
+        request = self.context.get('request')
+
+        rows = list(self.rows)
+        levels = self.levels
+        if levels is None:
+            levels = inventory_levels([row['id'] for row in rows])
+
+        stores = {}
+        categories = {}
+        data = []
+        for row in rows:
+            store = stores.get(row['store_id'])
+            if store is None:
+                store = stores[row['store_id']] = {
+                    'id': row['store_id'],
+                    'name': row['store__name'],
+                    'address': row['store__address'],
+                    'created_at': datetime(row['store__created_at']),
+                    'updated_at': datetime(row['store__updated_at']),
+                }
+
+            category = None
+            if row['category_id'] is not None:
+                category = categories.get(row['category_id'])
+                if category is None:
+                    category = categories[row['category_id']] = {
+                        'id': row['category_id'],
+                        'name': row['category__name'],
+                        'description': row['category__description'],
+                    }
+
+            image = None
+            if row['image']:
+                image = image_url(row['image'])
+                if request is not None:
+                    image = request.build_absolute_uri(image)
+
+            stock, reserved, _ = levels.get(row['id'], (0, 0, None))
+            data.append({
+                'id': row['id'],
+                'category': category,
+                'store': store,
+                'stock': stock,
+                'thumbnails': thumbnail_payload(row['image'], row['thumbnails'], request),
+                'name': row['name'],
+                'image': image,
+                'description': row['description'],
+                'price': price(row['price']),
+                'reserved': reserved,
+                'created_at': datetime(row['created_at']),
+                'updated_at': datetime(row['updated_at']),
+            })
+        return data
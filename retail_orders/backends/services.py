@@ -0,0 +1,287 @@
+from contextlib import suppress
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import analytics, reservations
+from .cart import user_id_owner
+from .exceptions import InsufficientStock, OrderAlreadyProcessed
+from .models import Inventory, Product, Order, OrderItem, StockReservation
+
+
+def order_totals():
+    """
+    Выражения для пересчета total_price и items_count заказа по его позициям
+    (для QuerySet.update).
+    """
+    items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    return {
+        'total_price': Coalesce(
+            Subquery(items.annotate(amount=Sum(F('price') * F('quantity'))).values('amount')),
+            Value(0), output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        'items_count': Coalesce(Subquery(items.annotate(units=Sum('quantity')).values('units')), Value(0)),
+    }
+
+
+def refresh_order_totals(order):
+    """
+    Пересчитывает итоги одного заказа одним UPDATE.
+    """
+    Order.objects.filter(pk=order.pk).update(updated_at=timezone.now(), **order_totals())
+    order.refresh_from_db(fields=['total_price', 'items_count', 'updated_at'])
+    return order
+
+
+def add_to_cart(user, product, quantity):
+    """
+    Добавляет товар в корзину (заказ pending) пользователя по цене на момент добавления
+    и увеличивает итоги заказа без пересчета всех позиций.
+    """
+    with transaction.atomic():
+        order, _ = Order.objects.get_or_create(user=user, status='pending')
+        item, created = OrderItem.objects.get_or_create(
+            order=order,
+            product=product,
+            defaults={'quantity': quantity, 'price': product.price},
+        )
+        if not created:
+            OrderItem.objects.filter(pk=item.pk).update(quantity=F('quantity') + quantity)
+
+        amount = item.price * quantity
+        Order.objects.filter(pk=order.pk).update(
+            total_price=F('total_price') + amount,
+            items_count=F('items_count') + quantity,
+            updated_at=timezone.now(),
+        )
+    order.total_price += amount
+    order.items_count += quantity
+    return order
+
+
+def _write_cart(order, items, existing):
+    """
+    Приводит позиции заказа к содержимому корзины items ({product_id: (quantity, price)})
+    пакетными запросами. existing - текущие позиции заказа по product_id.
+    """
+    existing = dict(existing)
+    to_create = []
+    to_update = []
+    for product_id, (quantity, price) in items.items():
+        item = existing.pop(product_id, None)
+        if item is None:
+            to_create.append(OrderItem(order=order, product_id=product_id, quantity=quantity, price=price))
+        elif item.quantity != quantity:
+            item.quantity = quantity
+            to_update.append(item)
+
+    if existing:
+        OrderItem.objects.filter(pk__in=[item.pk for item in existing.values()]).delete()
+    OrderItem.objects.bulk_create(to_create)
+    OrderItem.objects.bulk_update(to_update, ['quantity'])
+    refresh_order_totals(order)
+
+
+def _pending_cart(user):
+    """
+    Заказ pending пользователя (заблокированный до конца транзакции) и его позиции.
+    """
+    order, _ = Order.objects.select_for_update().get_or_create(user=user, status='pending')
+    existing = {item.product_id: item for item in OrderItem.objects.filter(order=order)}
+    return order, existing
+
+
+def save_cart(user, items, replace=True):
+    """
+    Переносит корзину из хранилища корзин ({product_id: (quantity, price)})
+    в заказ pending пользователя пакетными запросами. При replace=True позиции
+    заказа заменяются содержимым корзины, иначе количества добавляются к существующим.
+    """
+    with transaction.atomic():
+        order, existing = _pending_cart(user)
+        products = set(Product.objects.filter(id__in=items).values_list('id', flat=True))
+        items = {product_id: line for product_id, line in items.items() if product_id in products}
+        if not replace:
+            current = {product_id: (item.quantity, item.price) for product_id, item in existing.items()}
+            items = apply_cart_operations(current, [
+                {'op': 'add', 'product_id': product_id, 'quantity': quantity}
+                for product_id, (quantity, price) in items.items()
+            ], {product_id: price for product_id, (quantity, price) in items.items()})
+        _write_cart(order, items, existing)
+    return order
+
+
+def apply_cart_operations(items, operations, prices):
+    """
+    Применяет операции add/set/remove к корзине {product_id: (quantity, price)}
+    и возвращает новую корзину. Для новых позиций цена берется из prices.
+    """
+    items = dict(items)
+    for operation in operations:
+        product_id = operation['product_id']
+        current, price = items.get(product_id, (0, prices.get(product_id)))
+        if operation['op'] == 'remove':
+            quantity = 0
+        elif operation['op'] == 'add':
+            quantity = current + operation['quantity']
+        else:
+            quantity = operation['quantity']
+        if quantity > 0:
+            items[product_id] = (quantity, price)
+        else:
+            items.pop(product_id, None)
+    return items
+
+
+def update_cart(user, operations, products, owner, store=None):
+    """
+    Пакетно изменяет корзину owner: операции применяются в одной транзакции,
+    резервы товаров из операций приводятся к итоговым количествам (hold).
+    products - строки (id, name, price, stock) всех товаров из операций.
+    Корзина берется из хранилища корзин store (если передано, под блокировкой
+    корзины) или из заказа pending пользователя. Возвращает новое содержимое корзины.
+    """
+    prices = {product_id: price for product_id, name, price, stock in products}
+
+    def held_lines(items):
+        return {product_id: items.get(product_id, (0, None))[0] for product_id in prices}
+
+    if store is not None:
+        # Без блокировки параллельный пакет той же корзины перезаписал бы эти позиции.
+        with store.owner_lock(owner):
+            current = store.get(owner)
+            items = apply_cart_operations(current, operations, prices)
+            reservations.hold(owner, held_lines(items))
+            try:
+                store.replace(owner, items)
+            except Exception:
+                # Корзина не изменилась: резервы возвращаются к ее содержимому. Если снятый
+                # резерв уже не вернуть, остаток остается свободным, а не занятым до истечения срока.
+                with suppress(InsufficientStock):
+                    reservations.hold(owner, held_lines(current))
+                raise
+        return items
+
+    with transaction.atomic():
+        order, existing = _pending_cart(user)
+        current = {product_id: (item.quantity, item.price) for product_id, item in existing.items()}
+        items = apply_cart_operations(current, operations, prices)
+        _write_cart(order, items, existing)
+        reservations.hold(owner, held_lines(items))
+    return items
+
+
+def remove_from_cart(order, **lookup):
+    """
+    Удаляет позицию из заказа (по id или product_id), снимает резерв товара
+    и пересчитывает итоги заказа.
+    """
+    with transaction.atomic():
+        items = OrderItem.objects.filter(order=order, **lookup)
+        product_ids = list(items.values_list('product_id', flat=True))
+        if not product_ids:
+            raise OrderItem.DoesNotExist()
+        items.delete()
+        reservations.release(user_id_owner(order.user_id), product_ids)
+        refresh_order_totals(order)
+    return order
+
+
+def _shortages(lines, products):
+    """
+    Позиции, которых не хватает. Товар без записи остатков (Inventory) считается
+    отсутствующим на складе.
+    """
+    products = list(products)
+    missing = lines.keys() - {row[0] for row in products}
+    if missing:
+        products += [(product_id, name, 0)
+                     for product_id, name in Product.objects.filter(id__in=missing).values_list('id', 'name')]
+    return [
+        {'product_id': product_id, 'name': name, 'requested': lines[product_id], 'available': stock}
+        for product_id, name, stock in products
+        if stock < lines[product_id]
+    ]
+
+
+def _available(products, held):
+    """
+    Строки (id, name, доступно) для _shortages: остаток за вычетом чужих резервов.
+    products - QuerySet остатков (Inventory).
+    """
+    return [
+        (product_id, name, stock - reserved + held.get(product_id, 0))
+        for product_id, name, stock, reserved in products.values_list('product_id', 'product__name', 'stock', 'reserved')
+    ]
+
+
+def checkout_order(order):
+    """
+    Оформляет заказ: переводит его в статус completed, сверяет итоги с позициями
+    и списывает остатки по всем позициям одним условным UPDATE. Резервы корзины
+    пользователя при этом снимаются, а резервы других корзин не могут быть списаны.
+    Остатки хранятся в Inventory, таблица товаров (и кэш каталога) не меняется.
+    Заказ добавляется к итогам продаж дня (SalesRollup) в той же транзакции.
+    Строки остатков блокируются в порядке id товаров, чтобы параллельные оформления
+    не приводили к взаимным блокировкам.
+    """
+    owner = user_id_owner(order.user_id)
+    lines = {}
+    held = {}
+    completed_at = timezone.now()
+    try:
+        with transaction.atomic():
+            claimed = Order.objects.filter(pk=order.pk, status='pending').update(
+                status='completed', updated_at=completed_at, completed_at=completed_at, **order_totals())
+            if not claimed:
+                raise OrderAlreadyProcessed()
+
+            totals = list(
+                OrderItem.objects.filter(order_id=order.pk).order_by()
+                .values('product_id', 'product__store_id', 'product__category_id')
+                .annotate(units=Sum('quantity'), amount=Sum(F('price') * F('quantity')))
+                .values_list('product_id', 'product__store_id', 'product__category_id', 'units', 'amount')
+            )
+            lines = {}
+            total_price = 0
+            for product_id, store_id, category_id, units, amount in totals:
+                lines[product_id] = units
+                total_price += amount
+            if lines:
+                locked = Inventory.objects.select_for_update(of=('self',)).filter(
+                    product_id__in=lines).order_by('product_id')
+                held = dict(StockReservation.objects.select_for_update().filter(
+                    owner=owner, product_id__in=lines).values_list('product_id', 'quantity'))
+                shortages = _shortages(lines, _available(locked, held))
+                if shortages:
+                    raise InsufficientStock(shortages)
+
+                needed = Case(
+                    *[When(product_id=product_id, then=Value(quantity)) for product_id, quantity in lines.items()],
+                    output_field=IntegerField(),
+                )
+                released = Case(
+                    *[When(product_id=product_id, then=Value(quantity)) for product_id, quantity in held.items()],
+                    default=Value(0), output_field=IntegerField(),
+                )
+                updated = Inventory.objects.filter(
+                    product_id__in=lines, stock__gte=F('reserved') - released + needed,
+                ).update(stock=F('stock') - needed, reserved=F('reserved') - released, updated_at=timezone.now())
+                if updated != len(lines):
+                    raise InsufficientStock([])
+                if held:
+                    StockReservation.objects.filter(owner=owner, product_id__in=held).delete()
+                analytics.record_sales(timezone.localdate(completed_at),
+                                       analytics.sale_groups(line[1:] for line in totals))
+    except InsufficientStock as e:
+        if not e.items:
+            e.items = _shortages(lines, _available(Inventory.objects.filter(product_id__in=lines), held))
+        raise
+
+    order.status = 'completed'
+    order.completed_at = completed_at
+    order.total_price = total_price
+    order.items_count = sum(lines.values())
+    return order
@@ -0,0 +1,81 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete, pre_migrate
+from django.dispatch import receiver
+
+from .analytics import merge_category_rollups
+from .archive import install_history_views, uninstall_history_views
+from .caching import invalidate_catalogue, invalidate_products
+from .cart import merge_anonymous_cart
+from .metrics import record_query
+from .models import Category, Product, Store
+from .search import repair_search_index
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    """
+    При входе анонимная корзина сессии переносится в корзину пользователя.
+    """
+    if request is not None and hasattr(request, 'session'):
+        merge_anonymous_cart(request, user)
+
+
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    """
+    Подключает учет SQL запросов для RequestMetricsMiddleware к каждому новому соединению.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(pre_migrate)
+def drop_history_views(sender, using, **kwargs):
+    """
+    Представления истории заказов удаляются на время миграций: иначе SQLite не даст
+    пересоздать таблицы заказов, а PostgreSQL - изменить тип их колонок.
+    """
+    if sender.label == 'retail_orders':
+        uninstall_history_views(connections[using])
+
+
+@receiver(post_migrate)
+def restore_history_views(sender, using, **kwargs):
+    if sender.label == 'retail_orders':
+        install_history_views(connections[using])
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, using, **kwargs):
+    """
+    Восстанавливает триггеры полнотекстового индекса, если миграция пересоздала
+    таблицу товаров (SQLite). Сигнал приходит для каждого приложения, проверка дешевая.
+    """
+    repair_search_index(connections[using])
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш ответов товара и списков товаров.
+    """
+    invalidate_products([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Store)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_catalogue_cache(sender, instance, **kwargs):
+    """
+    Магазин и категория вложены в ответ товара, поэтому сбрасывается весь кэш каталога.
+    """
+    invalidate_catalogue()
+
+
+@receiver(pre_delete, sender=Category)
+def keep_category_sales(sender, instance, **kwargs):
+    """
+    Итоги продаж удаляемой категории переходят к строкам без категории, а не удаляются.
+    """
+    merge_category_rollups(instance.pk)
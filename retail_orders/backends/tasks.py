@@ -1,34 +1,128 @@
+import logging
+import smtplib
+
 from celery import shared_task
-from sorl.thumbnail import get_thumbnail
-import time
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from . import archive
+from .cart import get_cart_store
+from .importers import IMPORT_BATCH_SIZE, ProductImporter, detect_format, iter_records
+from .mailing import EMAIL_MAX_RETRIES, EMAIL_RETRY_DELAY, BulkMailer, build_message
+from .models import Product
+from .reservations import expire_reservations
+from .services import save_cart
+from .thumbnails import ThumbnailGenerator
 
 
-@shared_task
-def send_email(to_email, subject, message):
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, max_retries=EMAIL_MAX_RETRIES, default_retry_delay=EMAIL_RETRY_DELAY)
+def send_email(self, to_email, subject, message, html_message=None):
     """
-    Задача Celery для отправки email.
+    Задача Celery для отправки email одному получателю (с повторами при ошибке).
     """
-    time.sleep(5)
-    print("Отправлено {to_email}: {subject} - {message}")
-    return f"{to_email}"
+    try:
+        build_message(to_email, subject, message, html_message).send()
+    except (smtplib.SMTPException, OSError) as e:
+        raise self.retry(exc=e)
+    return to_email
+
 
 @shared_task
-def do_import(data):
+def send_bulk_email(recipients, subject, message, html_message=None, batch_size=None):
     """
-    Задача Celery для импорта данных. Принимает данные в виде списка или словаря.
+    Задача Celery для массовой рассылки: одно соединение на пачку получателей
+    и ограничение скорости EMAIL_RATE_LIMIT. Получатели, которым отправить
+    не удалось, отправляются повторно отдельными задачами send_email.
+    Возвращает статистику рассылки (в том числе писем в секунду).
     """
-    print(f"Импортировано: {data}")
-    return f'Импорт произведен'
+    mailer = BulkMailer(batch_size=batch_size)
+    failed = mailer.send(recipients, subject, message, html_message)
+    for recipient in failed:
+        send_email.apply_async((recipient, subject, message, html_message), countdown=EMAIL_RETRY_DELAY)
+    return dict(mailer.stats, retried=failed)
+
+
+@shared_task(bind=True)
+def do_import(self, file_name, file_format=None, batch_size=IMPORT_BATCH_SIZE, delete_file=True):
+    """
+    Задача Celery для потокового импорта товаров из файла (JSON, NDJSON или CSV),
+    сохраненного в default_storage. Возвращает статистику и ошибки по строкам.
+    """
+    file_format = file_format or detect_format(file_name)
+
+    def report_progress(stats):
+        if not self.request.called_directly:
+            self.update_state(state='PROGRESS', meta=stats)
+
+    importer = ProductImporter(batch_size=batch_size, progress=report_progress)
+    try:
+        with default_storage.open(file_name, 'rb') as stream:
+            stats = importer.run(iter_records(stream, file_format))
+    finally:
+        if delete_file:
+            default_storage.delete(file_name)
+    return stats
 
 
 @shared_task
-def generate_thumbnails(image_field, aliases):
+def flush_carts(batch_size=500):
     """
-    Задача Celery для загрузки изображения.
+    Задача Celery: переносит измененные корзины пользователей из хранилища корзин
+    в заказы pending (режим CART_WRITE_BEHIND). Корзины, которые сохранить
+    не удалось, снова помечаются измененными и переносятся следующим запуском.
+    Возвращает количество сохраненных корзин.
     """
-    thumb = get_thumbnail(file_path, '200x200', crop='center', quality=90)
+    store = get_cart_store()
+    saved = 0
+    failed = []
+    owners = []
+    try:
+        while True:
+            owners = store.pop_dirty(batch_size)
+            if not owners:
+                return saved
+            users = User.objects.in_bulk([int(owner.split(':', 1)[1]) for owner in owners])
+            while owners:
+                owner = owners[-1]
+                user = users.get(int(owner.split(':', 1)[1]))
+                if user is not None:
+                    try:
+                        save_cart(user, store.get(owner))
+                        saved += 1
+                    except Exception:
+                        logger.exception('Не удалось сохранить корзину %s', owner)
+                        failed.append(owner)
+                owners.pop()
+    finally:
+        # Ошибка сохранения или прерванная пачка: корзины еще не в БД.
+        store.mark_dirty(failed + owners)
 
 
+@shared_task
+def expire_stock_reservations():
+    """
+    Задача Celery: снимает просроченные резервы товаров пачками.
+    """
+    return expire_reservations()
 
 
+@shared_task
+def archive_orders(batch_size=archive.ARCHIVE_BATCH_SIZE):
+    """
+    Задача Celery: переносит завершенные заказы старше ORDER_ARCHIVE_AFTER_DAYS
+    с позициями в архивные таблицы пачками. Возвращает количество заказов.
+    """
+    return archive.archive_orders(batch_size=batch_size)
+
 
+@shared_task
+def generate_thumbnails(product_ids, aliases=None):
+    """
+    Задача Celery для генерации миниатюр товаров: изображение каждого товара
+    декодируется один раз для всех алиасов (по умолчанию - PRODUCT_THUMBNAIL_ALIASES),
+    неизмененные изображения пропускаются. Большие объемы обрабатывает команда
+    generate_thumbnails с пулом процессов.
+    """
+    return ThumbnailGenerator(aliases).run(Product.objects.filter(id__in=product_ids))
@@ -0,0 +1,124 @@
+import logging
+
+from django.conf import settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+logger = logging.getLogger(__name__)
+
+# Счетчик скользящего окна в одном хэше Redis: окна длиной period отсчитываются
+# от первого запроса клиента (start), current и previous - число запросов в текущем
+# и предыдущем окне. Оценка числа запросов за последний period - current плюс доля
+# previous, которая еще перекрывает скользящее окно; запрос проходит, если оценка
+# с ним не больше limit. Отклоненные запросы не считаются. Время берется у Redis,
+# поэтому часы процессов не важны. Возвращает {1, 0} или {0, миллисекунд до того,
+# как оценка опустится настолько, что следующий запрос пройдет}.
+SLIDING_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'start', 'window', 'current', 'previous')
+local start = tonumber(state[1]) or now
+local window = math.floor((now - start) / period)
+local current, previous = 0, 0
+if tonumber(state[2]) == window then
+    current, previous = tonumber(state[3]), tonumber(state[4])
+elseif tonumber(state[2]) == window - 1 then
+    previous = tonumber(state[3])
+end
+local elapsed = now - start - window * period
+if previous * (period - elapsed) / period + current + 1 > limit then
+    local wait
+    if current < limit and previous > 0 then
+        wait = period * (1 - (limit - 1 - current) / previous) - elapsed
+    else
+        wait = period - elapsed + period * (1 - (limit - 1) / current)
+    end
+    return {0, math.max(1, math.ceil(wait))}
+end
+redis.call('HSET', KEYS[1], 'start', start, 'window', window, 'current', current + 1, 'previous', previous)
+redis.call('PEXPIRE', KEYS[1], 2 * period)
+return {1, 0}
+"""
+
+
+class RedisRateThrottle(SimpleRateThrottle):
+    """
+    Лимит запросов на счетчике скользящего окна в Redis: одно атомарное выполнение
+    скрипта на запрос и один хэш из четырех полей на клиента, сколько бы ни было
+    разрешено запросов (SimpleRateThrottle хранит в кэше список времен всех запросов
+    за период и перезаписывает его без блокировки). Запросы предыдущего окна
+    учитываются пропорционально перекрытию, поэтому серия в конце одного окна
+    и серия в начале следующего вместе не превышают limit за period.
+
+    Лимит отдельного действия ViewSet задается в DEFAULT_THROTTLE_RATES ключом
+    '<scope>.<action>' (например 'user.checkout'): такое действие считается
+    в своем окне. Если Redis недоступен, запросы пропускаются.
+    """
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+    scripts = {}
+
+    def allow_request(self, request, view):
+        self._wait = None
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        action = getattr(view, 'action', None)
+        rate = self.THROTTLE_RATES.get(f'{self.scope}.{action}') if action else None
+        if rate is not None:
+            key = f'{key}:{action}'
+            limit, period = self.parse_rate(rate)
+        else:
+            limit, period = self.num_requests, self.duration
+        if limit is None:
+            return True
+
+        try:
+            allowed, wait = self.script(keys=[key], args=[limit, int(period * 1000)])
+        except Exception:
+            logger.exception('Не удалось проверить лимит запросов %s', key)
+            return True
+        if allowed:
+            return True
+        self._wait = wait / 1000
+        return False
+
+    @property
+    def script(self):
+        from django_redis import get_redis_connection
+
+        alias = settings.THROTTLE_REDIS_ALIAS
+        if alias not in self.scripts:
+            self.scripts[alias] = get_redis_connection(alias).register_script(SLIDING_WINDOW_SCRIPT)
+        return self.scripts[alias]
+
+    def wait(self):
+        return self._wait
+
+
+class AnonRedisRateThrottle(RedisRateThrottle):
+    """
+    Лимит анонимных запросов по IP (scope 'anon'), как AnonRateThrottle.
+    """
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class UserRedisRateThrottle(RedisRateThrottle):
+    """
+    Лимит запросов пользователя (scope 'user'), для анонимов - по IP, как UserRateThrottle.
+    """
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
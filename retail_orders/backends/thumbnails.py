@@ -0,0 +1,250 @@
+import hashlib
+import io
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.templatetags.static import static
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .caching import invalidate_products
+from .models import Product, ProductThumbnail
+
+
+THUMBNAIL_BATCH_SIZE = 200
+THUMBNAIL_QUALITY = 85
+THUMBNAIL_DIR = 'thumbnails'
+
+
+def thumbnail_aliases(names=None):
+    """
+    Настройки алиасов из THUMBNAIL_ALIASES[''] (names или PRODUCT_THUMBNAIL_ALIASES).
+    """
+    aliases = settings.THUMBNAIL_ALIASES['']
+    if names is None:
+        names = settings.PRODUCT_THUMBNAIL_ALIASES
+    unknown = set(names) - aliases.keys()
+    if unknown:
+        raise ValueError(f'Неизвестные алиасы миниатюр: {", ".join(sorted(unknown))}')
+    return {name: aliases[name] for name in names}
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def thumbnail_name(digest, spec):
+    """
+    Имя файла миниатюры определяется содержимым исходника и параметрами алиаса,
+    поэтому одинаковые изображения разных товаров рендерятся один раз.
+    """
+    width, height = spec['size']
+    crop = '_crop' if spec.get('crop') else ''
+    return f'{THUMBNAIL_DIR}/{digest[:2]}/{digest}_{width}x{height}{crop}.jpg'
+
+
+def render_thumbnails(data, specs):
+    """
+    Декодирует изображение один раз и рендерит из него все миниатюры specs
+    ({имя файла: настройки алиаса}). Возвращает {имя файла: (JPEG, ширина, высота)}.
+    Функция не зависит от Django и выполняется в процессах пула.
+    """
+    width = max(spec['size'][0] for spec in specs.values())
+    height = max(spec['size'][1] for spec in specs.values())
+    with Image.open(io.BytesIO(data)) as source:
+        # JPEG декодируется сразу в уменьшенном масштабе, не меньше нужного размера.
+        source.draft('RGB', (width, height))
+        image = ImageOps.exif_transpose(source)
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        else:
+            image = image.convert('RGB')
+
+    rendered = {}
+    for name, spec in specs.items():
+        size = tuple(spec['size'])
+        if spec.get('crop'):
+            thumbnail = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+        else:
+            thumbnail = image.copy()
+            thumbnail.thumbnail(size, Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        thumbnail.save(output, 'JPEG', quality=spec.get('quality', THUMBNAIL_QUALITY), optimize=True)
+        rendered[name] = (output.getvalue(), thumbnail.width, thumbnail.height)
+    return rendered
+
+
+def render_job(job):
+    """
+    Задание для пула процессов: (исходные байты, specs) -> (миниатюры, ошибка).
+    """
+    data, specs = job
+    try:
+        return render_thumbnails(data, specs), None
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        return {}, str(e)
+
+
+class ThumbnailGenerator:
+    """
+    Генерация миниатюр товаров пачками. Для каждого товара читается исходник
+    и считается хэш содержимого: если миниатюры этого содержимого уже записаны
+    для товара, товар пропускается; файлы, которые уже есть в хранилище
+    (то же изображение у другого товара), не рендерятся повторно.
+    Декодирование и рендеринг выполняются в пуле из workers процессов.
+    aliases - имена из THUMBNAIL_ALIASES, по умолчанию PRODUCT_THUMBNAIL_ALIASES.
+    """
+    def __init__(self, aliases=None, workers=1, batch_size=THUMBNAIL_BATCH_SIZE, storage=None):
+        self.aliases = thumbnail_aliases(aliases)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.storage = storage or default_storage
+        self.stats = {'processed': 0, 'rendered': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+
+    def run(self, queryset):
+        """
+        Обрабатывает товары queryset с изображениями пачками по id.
+        """
+        queryset = queryset.exclude(image='').exclude(image__isnull=True).order_by('id')
+        executor = ProcessPoolExecutor(self.workers) if self.workers > 1 else None
+        try:
+            last_id = 0
+            while True:
+                rows = list(queryset.filter(id__gt=last_id).values_list('id', 'image')[:self.batch_size])
+                if not rows:
+                    break
+                self.process(rows, executor)
+                last_id = rows[-1][0]
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return self.stats
+
+    def process(self, rows, executor=None):
+        """
+        Обрабатывает пачку строк (id товара, имя файла изображения).
+        """
+        existing = {
+            (product_id, alias): (source_hash, name)
+            for product_id, alias, source_hash, name in ProductThumbnail.objects.filter(
+                product_id__in=[row[0] for row in rows], alias__in=self.aliases,
+            ).values_list('product_id', 'alias', 'source_hash', 'name')
+        }
+
+        records = {}
+        jobs = {}
+        planned = set()
+        unchanged_ids = []
+        for product_id, image in rows:
+            self.stats['processed'] += 1
+            try:
+                with self.storage.open(image, 'rb') as source:
+                    data = source.read()
+            except OSError as e:
+                self.add_error(product_id, str(e))
+                continue
+
+            digest = content_hash(data)
+            unchanged = True
+            for alias, spec in self.aliases.items():
+                name = thumbnail_name(digest, spec)
+                if existing.get((product_id, alias)) == (digest, name):
+                    continue
+                unchanged = False
+                records.setdefault(digest, []).append(
+                    ProductThumbnail(product_id=product_id, alias=alias, source_hash=digest, name=name))
+                if name in planned or self.storage.exists(name):
+                    continue
+                planned.add(name)
+                jobs.setdefault(digest, (data, {}))[1][name] = spec
+            if unchanged:
+                self.stats['skipped'] += 1
+                unchanged_ids.append(product_id)
+
+        results = executor.map(render_job, jobs.values()) if executor else map(render_job, jobs.values())
+        sizes = {}
+        for digest, (rendered, error) in zip(jobs, results):
+            if error is not None:
+                for product_id in sorted({record.product_id for record in records.pop(digest)}):
+                    self.add_error(product_id, error)
+                continue
+            for name, (content, width, height) in rendered.items():
+                self.storage.save(name, ContentFile(content))
+                sizes[name] = (width, height)
+            self.stats['rendered'] += len(rendered)
+
+        updated = [record for digest_records in records.values() for record in digest_records]
+        for record in updated:
+            if record.name not in sizes:
+                sizes[record.name] = self.image_size(record.name)
+            record.width, record.height = sizes[record.name]
+        ProductThumbnail.objects.bulk_create(
+            updated,
+            update_conflicts=True,
+            unique_fields=['product', 'alias'],
+            update_fields=['source_hash', 'name', 'width', 'height'],
+        )
+        # Миниатюры не изменились, но Product.thumbnails сброшен: повторно загружен тот же файл.
+        republish = set(Product.objects.filter(id__in=unchanged_ids, thumbnails={}).values_list(
+            'id', flat=True)) if unchanged_ids else set()
+        self.publish({record.product_id for record in updated} | republish)
+
+    def image_size(self, name):
+        """
+        Размеры уже существующей миниатюры (читается только заголовок файла).
+        """
+        with self.storage.open(name, 'rb') as thumbnail, Image.open(thumbnail) as image:
+            return image.size
+
+    def publish(self, product_ids):
+        """
+        Записывает URL и размеры всех миниатюр товаров в Product.thumbnails,
+        откуда их без дополнительных запросов берут сериализаторы.
+        """
+        if not product_ids:
+            return
+        thumbnails = defaultdict(dict)
+        for product_id, alias, name, width, height in ProductThumbnail.objects.filter(
+                product_id__in=product_ids).values_list('product_id', 'alias', 'name', 'width', 'height'):
+            thumbnails[product_id][alias] = {'url': self.storage.url(name), 'width': width, 'height': height}
+        now = timezone.now()
+        Product.objects.bulk_update(
+            [Product(id=product_id, thumbnails=thumbnails[product_id], updated_at=now) for product_id in product_ids],
+            ['thumbnails', 'updated_at'],
+        )
+        invalidate_products(product_ids)
+
+    def add_error(self, product_id, message):
+        self.stats['failed'] += 1
+        if len(self.stats['errors']) < 100:
+            self.stats['errors'].append({'product_id': product_id, 'error': message})
+
+
+def thumbnail_payload(image, thumbnails, request=None):
+    """
+    Миниатюры товара для ответа API по сохраненным Product.thumbnails:
+    {алиас: {url, width, height, pending}}. Пока миниатюра не сгенерирована,
+    отдается заглушка THUMBNAIL_PLACEHOLDER с размерами алиаса. Без изображения - None.
+    """
+    if not image:
+        return None
+    aliases = settings.THUMBNAIL_ALIASES['']
+    payload = {}
+    for alias in settings.PRODUCT_THUMBNAIL_ALIASES:
+        thumbnail = thumbnails.get(alias)
+        if thumbnail is None:
+            width, height = aliases[alias]['size']
+            thumbnail = {'url': static(settings.THUMBNAIL_PLACEHOLDER), 'width': width, 'height': height,
+                         'pending': True}
+        else:
+            thumbnail = dict(thumbnail, pending=False)
+        if request is not None:
+            thumbnail['url'] = request.build_absolute_uri(thumbnail['url'])
+        payload[alias] = thumbnail
+    return payload
@@ -1,11 +1,18 @@
 
 from django.urls import path
-from .views import ProductViewSet, OrderViewSet, ContactViewSet
+from . import async_views
+from .views import ProductViewSet, OrderViewSet, ContactViewSet, RequestMetricsView, SalesAnalyticsViewSet
 from rest_framework.routers import DefaultRouter
 
 router = DefaultRouter()
 router.register(r'contacts', ContactViewSet)
 router.register(r'products', ProductViewSet)
 router.register(r'orders', OrderViewSet, basename='order')
+router.register(r'analytics/sales', SalesAnalyticsViewSet, basename='sales-analytics')
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = router.urls + [
+    path('metrics/requests/', RequestMetricsView.as_view(), name='request-metrics'),
+    path('async/products/', async_views.product_list, name='async-product-list'),
+    path('async/products/<int:pk>/', async_views.product_detail, name='async-product-detail'),
+    path('async/orders/', async_views.order_list, name='async-order-list'),
+]
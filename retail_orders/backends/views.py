@@ -1,44 +1,131 @@
 from rest_framework import status, viewsets, status, permissions
 from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from social_django.utils import psa
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Prefetch
 from django.shortcuts import render, redirect
 from .forms import ProductForm
 from .tasks import generate_thumbnails
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Product, Order, OrderItem, Contact
-from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
-from .serializers import ProductSerializer, OrderSerializer, ContactSerializer
+from .models import Product, Order, OrderItem, OrderHistory, OrderHistoryItem, Contact, SalesRollup
+from .serializers import (ProductSerializer, ProductListSerializer, OrderSerializer, ContactSerializer,
+                          CartAddSerializer, CartBatchSerializer, CartRemoveSerializer,
+                          SalesReportSerializer)
+from .pagination import OptionalKeysetPagination
+from .search import search_products, search_terms
+from . import exporters, reservations, services
+from .analytics import GROUPINGS, sales_report
+from .metrics import action_stats
+from .throttling import AnonRedisRateThrottle, UserRedisRateThrottle
+from .caching import CATALOGUE_SCOPE, PRODUCT_LIST_SCOPE, cached_response, product_scope
+from .cart import cart_owner, cart_state, get_cart_store, user_owner
+from .services import InsufficientStock, OrderAlreadyProcessed
+
+
+def stream_export(request, queryset, exporter, file_name):
+    """
+    Потоковая выгрузка queryset (?file_format=csv|ndjson, ?compress=gzip).
+    Строки читаются и отправляются частями, поэтому память не зависит от объема.
+    """
+    file_format = request.query_params.get('file_format', 'csv')
+    if file_format not in exporters.FORMATS:
+        return Response({'error': f'Неизвестный формат выгрузки: {file_format}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    compress = request.query_params.get('compress') == 'gzip'
+    return exporters.export_response(exporter(queryset, file_format), file_format, file_name, compress)
 
 
 class ProductViewSet(viewsets.ModelViewSet):
     """
     Класс для создания модели Product
     """
-    queryset = Product.objects.select_related('store', 'category').all()
+    queryset = Product.objects.select_related('store', 'category', 'inventory').all()
     serializer_class = ProductSerializer
+    pagination_class = OptionalKeysetPagination
     filterset_fields = ['store', 'price', 'category']
     filter_backends = [DjangoFilterBackend]
 
+    def list(self, request, *args, **kwargs):
+        """
+        Список товаров из кэша ответов (с поддержкой ETag/Last-Modified).
+        """
+        return cached_response(self, request, [CATALOGUE_SCOPE, PRODUCT_LIST_SCOPE],
+                               lambda: self.list_response(request))
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Товар из кэша ответов; кэш сбрасывается только при изменении этого товара,
+        его магазина или категории.
+        """
+        pk = str(kwargs.get(self.lookup_field, ''))
+        if not pk.isdigit():
+            return super().retrieve(request, *args, **kwargs)
+        return cached_response(self, request, [CATALOGUE_SCOPE, product_scope(int(pk))],
+                               lambda: super(ProductViewSet, self).retrieve(request, *args, **kwargs))
+
+    def list_response(self, request):
+        """
+        Список товаров строится из строк .values() через ProductListSerializer:
+        JSON совпадает с ProductSerializer, но без создания моделей и вложенных сериализаторов.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).values(*ProductListSerializer.columns)
+        context = self.get_serializer_context()
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(ProductListSerializer(page, context=context).data)
+        return Response(ProductListSerializer(queryset, context=context).data)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Полнотекстовый поиск товаров (?q=) по названию и описанию с сортировкой
+        по релевантности. Фильтры store, price и category тоже применяются.
+        """
+        query = request.query_params.get('q', '')
+        if not search_terms(query):
+            return Response({'error': 'Пустой поисковый запрос'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = search_products(self.filter_queryset(self.get_queryset()), query)
+        queryset = queryset.values(*ProductListSerializer.columns)
+        context = self.get_serializer_context()
+
+        # Пагинация по ключу упорядочила бы результаты по дате, а не по релевантности.
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(ProductListSerializer(page, context=context).data)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Выгрузка каталога в CSV (колонки импорта) или NDJSON с фильтрами списка.
+        """
+        return stream_export(request, self.filter_queryset(self.get_queryset()), exporters.export_products, 'products')
+
     def perform_create(self, serializer):
         """
         Вызов генерации для создания продукта
         """
         product = serializer.save()
         if product.image:
-            generate_thumbnails.delay(product.image.name, ['product_medium'])
+            generate_thumbnails.delay([product.id])
 
     def perform_update(self, serializer):
         """
         Переопределяем после обновления продукта.
+        При замене изображения старые миниатюры не отдаются, пока не готовы новые.
         """
+        if 'image' in serializer.validated_data:
+            serializer.validated_data['thumbnails'] = {}
         product = serializer.save()
         if product.image:
-            generate_thumbnails.delay(product.image.name, ['product_medium'])
+            generate_thumbnails.delay([product.id])
 
     def upload_product(request):
         if request.method == 'POST':
@@ -46,7 +133,7 @@ class ProductViewSet(viewsets.ModelViewSet):
             if form.is_valid():
                 product = form.save()
                 if product.image:
-                    generate_thumbnails.delay(product.image.name, ['product_medium'])
+                    generate_thumbnails.delay([product.id])
                 return redirect('product_list')
         else:
             form = ProductForm()
@@ -59,93 +146,283 @@ class ContactViewSet(viewsets.ModelViewSet):
     """
     queryset = Contact.objects.all()
     serializer_class = ContactSerializer
+    pagination_class = OptionalKeysetPagination
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        """
+        Выгрузка обращений в CSV или NDJSON (только администраторы).
+        """
+        return stream_export(request, self.get_queryset(), exporters.export_contacts, 'contacts')
+
 
 class OrderViewSet(viewsets.ModelViewSet):
     """
     Класс для создания заказов, модель Order
     """
     serializer_class = OrderSerializer
+    pagination_class = OptionalKeysetPagination
     permission_classes = [IsAuthenticated]
     filterset_fields = ['status', 'created_at']
     filter_backends = [DjangoFilterBackend]
-    throttle_classes = [AnonRateThrottle, UserRateThrottle]
+    throttle_classes = [AnonRedisRateThrottle, UserRedisRateThrottle]
     permission_classes = [AllowAny]
 
     def get_queryset(self):
         """
-        Функция для сортировки заказов, возвращает только заказы текущего пользователя
+        Функция для сортировки заказов, возвращает только заказы текущего пользователя.
+        Список, просмотр и выгрузка читают историю (живые и архивные заказы),
+        остальные действия меняют только живые заказы.
         """
-        return Order.objects.filter(user=self.request.user).prefetch_related(
-            'orderitem_set__product')
+        if self.action not in ('list', 'retrieve', 'export'):
+            return Order.objects.filter(user=self.request.user)
+        queryset = OrderHistory.objects.filter(user=self.request.user)
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.prefetch_related(Prefetch(
+                'orderitem_set',
+                queryset=OrderHistoryItem.objects.select_related(
+                    'product__store', 'product__category', 'product__inventory'),
+            ))
+        return queryset
 
     @action(detail=False, methods=['post'])
     def add_to_cart(self, request):
         """
-        Функция для добавления товара в корзину
+        Функция для добавления товара в корзину. Если запись корзины не удалась,
+        резерв товара не остается.
         """
-        product_id = request.data.get('product_id')
-        quantity = int(request.data.get('quantity', 1))
+        serializer = CartAddSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        quantity = serializer.validated_data['quantity']
 
         try:
-            product = Product.objects.get(id=product_id)
+            product = Product.objects.get(id=serializer.validated_data['product_id'])
         except Product.DoesNotExist:
             return Response({'error': 'Продукт не найден'}, status=status.HTTP_404_NOT_FOUND)
 
-        if product.stock < quantity:
-            return Response({'error': 'Недостаточно товара на складе'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if not request.user.is_authenticated:
-            return Response({'message': 'Добавлено в корзину (аноним)'}, status=status.HTTP_201_CREATED)
-
-        order, created = Order.objects.get_or_create(user=request.user, status='pending')
+        owner = cart_owner(request)
+        use_cart_store = self.use_cart_store(request)
+        try:
+            if use_cart_store:
+                store = get_cart_store()
+                with store.owner_lock(owner):
+                    reservations.hold(owner, {product.id: quantity}, increment=True)
+                    try:
+                        store.add(owner, product.id, quantity, product.price)
+                    except Exception:
+                        # Резерв уже зафиксирован: без позиции в корзине он держал бы остаток до истечения срока.
+                        reservations.hold(owner, {product.id: -quantity}, increment=True)
+                        raise
+            else:
+                with transaction.atomic():
+                    reservations.hold(owner, {product.id: quantity}, increment=True)
+                    order = services.add_to_cart(request.user, product, quantity)
+        except InsufficientStock as e:
+            return Response({'error': 'Недостаточно товара на складе', 'items': e.items},
+                            status=status.HTTP_400_BAD_REQUEST)
 
-        order_item, created = OrderItem.objects.get_or_create(
-            order=order,
-            product=product,
-            defaults={'quantity': 0}
-        )
-        order_item.quantity += quantity
-        order_item.save()
+        if use_cart_store:
+            state = cart_state(store.get(owner))
+            message = 'Добавлено в корзину' if request.user.is_authenticated else 'Добавлено в корзину (аноним)'
+            return Response({'message': message, 'total_price': state['total_price'],
+                             'items_count': state['items_count']}, status=status.HTTP_201_CREATED)
 
-        return Response({'message': 'Добавлено в корзину'}, status=status.HTTP_201_CREATED)
+        return Response({'message': 'Добавлено в корзину', 'total_price': order.total_price,
+                         'items_count': order.items_count}, status=status.HTTP_201_CREATED)
 
 
     @action(detail=True, methods=['post'])
     def remove_from_cart(self, request, pk=None):
         order = self.get_object()
         item_id = request.data.get('item_id')
+        if settings.CART_WRITE_BEHIND and order.status == 'pending':
+            product_id = OrderItem.objects.filter(id=item_id, order=order).values_list('product_id', flat=True).first()
+            if product_id is not None:
+                get_cart_store().remove(user_owner(request.user), product_id)
+                reservations.release(user_owner(request.user), [product_id])
 
         try:
-            item = OrderItem.objects.get(id=item_id, order=order)
-            item.delete()
-            order.save()
-            return Response({'message': 'Удалено из корзины', 'total_price': order.total_price})
+            services.remove_from_cart(order, id=item_id)
+            return Response({'message': 'Удалено из корзины', 'total_price': order.total_price,
+                             'items_count': order.items_count})
         except OrderItem.DoesNotExist:
             return Response({'error': 'Элемент не найден'}, status=status.HTTP_404_NOT_FOUND)
 
     @action(detail=True, methods=['post'])
     def checkout(self, request, pk=None):
         """
-        Функция для обработки заказов
+        Функция для обработки заказов. Остатки списываются одним запросом для всех позиций.
         """
         order = self.get_object()
         if order.status != 'pending':
             return Response({'error': 'Заказ уже обработан'}, status=status.HTTP_400_BAD_REQUEST)
+        return self.checkout_pending(request, order)
 
-        with transaction.atomic():
-            for item in order.orderitem_set.all():
-                if item.product.stock < item.quantity:
-                    return Response({'error': f'Недостаточно {item.product.name}'}, status=status.HTTP_400_BAD_REQUEST)
-                item.product.stock -= item.quantity
-                item.product.save()
+    def use_cart_store(self, request):
+        """
+        Корзина ведется в хранилище корзин (Redis) для анонимных пользователей
+        и для всех пользователей в режиме CART_WRITE_BEHIND.
+        """
+        return settings.CART_WRITE_BEHIND or not request.user.is_authenticated
 
-            order.status = 'completed'
-            order.save()
+    def checkout_pending(self, request, order):
+        """
+        Оформляет заказ pending. В режиме CART_WRITE_BEHIND позиции сначала
+        переносятся из хранилища корзин, а после оформления корзина очищается.
+        """
+        store = get_cart_store()
+        owner = user_owner(request.user)
+        if settings.CART_WRITE_BEHIND:
+            items = store.get(owner)
+            if items:
+                order = services.save_cart(request.user, items)
 
+        try:
+            services.checkout_order(order)
+        except OrderAlreadyProcessed:
+            return Response({'error': 'Заказ уже обработан'}, status=status.HTTP_400_BAD_REQUEST)
+        except InsufficientStock as e:
+            return Response({'error': 'Недостаточно товара на складе', 'items': e.items},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if settings.CART_WRITE_BEHIND:
+            store.clear(owner)
         return Response({'message': 'Заказ оформлен', 'total_price': order.total_price})
 
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def export(self, request):
+        """
+        Выгрузка заказов пользователя с позициями в CSV или NDJSON (фильтры status, created_at).
+        """
+        return stream_export(request, self.filter_queryset(self.get_queryset()), exporters.export_orders, 'orders')
+
+    @action(detail=False, methods=['get'])
+    def cart(self, request):
+        """
+        Текущая корзина: из хранилища корзин или из заказа pending пользователя.
+        """
+        if self.use_cart_store(request):
+            owner = cart_owner(request, create=False)
+            items = get_cart_store().get(owner) if owner else {}
+        else:
+            items = {
+                product_id: (quantity, price)
+                for product_id, quantity, price in OrderItem.objects.filter(
+                    order__user=request.user, order__status='pending',
+                ).values_list('product_id', 'quantity', 'price')
+            }
+        return Response(cart_state(items))
+
+    @action(detail=False, methods=['post'], url_path='cart/batch')
+    def cart_batch(self, request):
+        """
+        Пакетное изменение корзины: список операций add/set/remove применяется
+        в одной транзакции. Товары загружаются одним запросом, при ошибке
+        в любой операции корзина не меняется.
+        """
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        operations = serializer.validated_data['operations']
+
+        product_ids = {operation['product_id'] for operation in operations}
+        products = list(Product.objects.filter(id__in=product_ids).values_list('id', 'name', 'price', 'inventory__stock'))
+        missing = sorted(product_ids - {row[0] for row in products})
+        if missing:
+            return Response({'error': 'Продукт не найден', 'product_ids': missing}, status=status.HTTP_404_NOT_FOUND)
+
+        store = get_cart_store() if self.use_cart_store(request) else None
+        try:
+            items = services.update_cart(request.user, operations, products, cart_owner(request), store=store)
+        except InsufficientStock as e:
+            return Response({'error': 'Недостаточно товара на складе', 'items': e.items},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(cart_state(items))
+
+    @action(detail=False, methods=['post'], url_path='cart/remove')
+    def cart_remove(self, request):
+        """
+        Удаляет товар (product_id) из текущей корзины.
+        """
+        serializer = CartRemoveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product_id = serializer.validated_data['product_id']
+        if self.use_cart_store(request):
+            owner = cart_owner(request, create=False)
+            if owner is None:
+                return Response({'error': 'Элемент не найден'}, status=status.HTTP_404_NOT_FOUND)
+            store = get_cart_store()
+            with store.owner_lock(owner):
+                if not store.remove(owner, product_id):
+                    return Response({'error': 'Элемент не найден'}, status=status.HTTP_404_NOT_FOUND)
+                reservations.release(owner, [product_id])
+            return Response({'message': 'Удалено из корзины'})
+
+        order = Order.objects.filter(user=request.user, status='pending').first()
+        try:
+            if order is None:
+                raise OrderItem.DoesNotExist
+            services.remove_from_cart(order, product_id=product_id)
+        except OrderItem.DoesNotExist:
+            return Response({'error': 'Элемент не найден'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'message': 'Удалено из корзины', 'total_price': order.total_price,
+                         'items_count': order.items_count})
+
+    @action(detail=False, methods=['post'], url_path='cart/checkout', permission_classes=[IsAuthenticated])
+    def cart_checkout(self, request):
+        """
+        Оформляет текущую корзину пользователя.
+        """
+        if settings.CART_WRITE_BEHIND and get_cart_store().get(user_owner(request.user)):
+            order, _ = Order.objects.get_or_create(user=request.user, status='pending')
+        else:
+            order = Order.objects.filter(user=request.user, status='pending').first()
+        if order is None:
+            return Response({'error': 'Корзина пуста'}, status=status.HTTP_400_BAD_REQUEST)
+        return self.checkout_pending(request, order)
+
+
+class SalesAnalyticsViewSet(viewsets.GenericViewSet):
+    """
+    Отчет о продажах для администраторов. Читает только готовые итоги
+    (SalesRollup), а не позиции заказов. Параметры: group_by - через запятую
+    из day, week, month, store, category (по умолчанию day); фильтры
+    day__gte, day__lte, store, category, category__isnull.
+    """
+    queryset = SalesRollup.objects.all()
+    serializer_class = SalesReportSerializer
+    permission_classes = [IsAdminUser]
+    filterset_fields = {'day': ['exact', 'gte', 'lte'], 'store': ['exact'], 'category': ['exact', 'isnull']}
+    filter_backends = [DjangoFilterBackend]
+
+    def list(self, request):
+        group_by = [name for name in request.query_params.get('group_by', 'day').split(',') if name]
+        unknown = [name for name in group_by if name not in GROUPINGS]
+        if unknown or not group_by:
+            return Response({'error': f"Неизвестная группировка: {', '.join(unknown)}",
+                             'choices': list(GROUPINGS)}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = sales_report(self.filter_queryset(self.get_queryset()), list(dict.fromkeys(group_by)))
+        page = self.paginate_queryset(report)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(report, many=True).data)
+
+
+class RequestMetricsView(APIView):
+    """
+    Сводка метрик запросов по действиям (RequestMetricsMiddleware) для администраторов,
+    по убыванию суммарного времени. DELETE обнуляет сводку.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(action_stats.snapshot())
+
+    def delete(self, request):
+        action_stats.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 class SocialAuthView(APIView):
     """
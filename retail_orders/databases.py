@@ -0,0 +1,66 @@
+"""
+Профили подключения к БД для settings.DATABASES (DATABASE_PROFILE): sqlite -
+развертывание на одном узле, postgresql - рабочий профиль.
+"""
+
+# Соединение живет между запросами столько секунд.
+CONN_MAX_AGE = 600
+
+# SQLite: сколько секунд писатель ждет освобождения блокировки, прежде чем получить "database is locked".
+SQLITE_BUSY_TIMEOUT = 20
+SQLITE_PRAGMAS = [
+    # Читатели не блокируют писателя и наоборот; настройка сохраняется в файле БД.
+    'PRAGMA journal_mode=WAL',
+    # В режиме WAL безопасно: при сбое питания теряются только последние транзакции, но не целостность.
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-20000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=134217728',
+]
+
+# PostgreSQL: предельное время запроса и простоя внутри транзакции (мс), ожидание подключения (секунд).
+POSTGRESQL_STATEMENT_TIMEOUT = 30000
+POSTGRESQL_IDLE_IN_TRANSACTION_TIMEOUT = 60000
+POSTGRESQL_CONNECT_TIMEOUT = 5
+
+
+def sqlite_database(name):
+    """
+    SQLite в режиме WAL: читатели не блокируют писателя, а писатель ждет блокировку
+    записи до SQLITE_BUSY_TIMEOUT секунд. Транзакции остаются DEFERRED: cachalot
+    открывает свой уровень atomic до BEGIN, и упавший BEGIN IMMEDIATE оставил бы его
+    незакрытым. Поэтому горячие транзакции пишут первым запросом (как checkout).
+    Соединение с локальным файлом не рвется, поэтому без проверок перед использованием.
+    """
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'OPTIONS': {
+            'timeout': SQLITE_BUSY_TIMEOUT,
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+        },
+    }
+
+
+def postgresql_database(name, user='', password='', host='', port=''):
+    """
+    PostgreSQL с ограничением времени запросов. Каждый поток держит постоянное
+    соединение (psycopg2), которое проверяется перед первым запросом в каждом
+    HTTP запросе; общий пул между процессами - PgBouncer.
+    """
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': name,
+        'USER': user,
+        'PASSWORD': password,
+        'HOST': host,
+        'PORT': port,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'connect_timeout': POSTGRESQL_CONNECT_TIMEOUT,
+            'options': f'-c statement_timeout={POSTGRESQL_STATEMENT_TIMEOUT} '
+                       f'-c idle_in_transaction_session_timeout={POSTGRESQL_IDLE_IN_TRANSACTION_TIMEOUT}',
+        },
+    }
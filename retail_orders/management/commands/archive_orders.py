@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from retail_orders.backends.archive import ARCHIVE_BATCH_SIZE, archive_cutoff, archive_orders
+
+
+class Command(BaseCommand):
+    """
+    Переносит завершенные заказы с позициями из живых таблиц в архивные.
+    """
+    help = 'Переносит завершенные заказы старше заданного числа дней в архивные таблицы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            help='Возраст заказа (дней с завершения); по умолчанию ORDER_ARCHIVE_AFTER_DAYS')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE,
+                            help='Количество заказов, переносимых одной транзакцией')
+        parser.add_argument('--max-batches', type=int, help='Остановиться после стольких пачек')
+
+    def handle(self, *args, **options):
+        archived = archive_orders(archive_cutoff(options['days']), batch_size=options['batch_size'],
+                                  max_batches=options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(f'Перенесено в архив заказов: {archived}'))
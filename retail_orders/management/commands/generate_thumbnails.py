@@ -0,0 +1,37 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from retail_orders.backends.models import Product
+from retail_orders.backends.thumbnails import THUMBNAIL_BATCH_SIZE, ThumbnailGenerator
+
+
+class Command(BaseCommand):
+    """
+    Генерирует миниатюры всех товаров с изображениями в пуле процессов
+    (например, после массового импорта или изменения PRODUCT_THUMBNAIL_ALIASES).
+    """
+    help = 'Генерирует миниатюры изображений товаров пачками в пуле процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alias', action='append', dest='aliases',
+                            help='Алиас из THUMBNAIL_ALIASES (можно несколько), по умолчанию - '
+                                 'алиасы товаров из PRODUCT_THUMBNAIL_ALIASES')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Количество процессов для декодирования и рендеринга')
+        parser.add_argument('--batch-size', type=int, default=THUMBNAIL_BATCH_SIZE,
+                            help='Количество товаров в пачке')
+
+    def handle(self, *args, **options):
+        try:
+            generator = ThumbnailGenerator(options['aliases'], workers=options['workers'],
+                                           batch_size=options['batch_size'])
+        except ValueError as e:
+            raise CommandError(e)
+
+        stats = generator.run(Product.objects.all())
+        for error in stats['errors']:
+            self.stderr.write(f"Товар {error['product_id']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Товаров: {stats['processed']}, миниатюр создано: {stats['rendered']}, "
+            f"без изменений: {stats['skipped']}, ошибок: {stats['failed']}"))
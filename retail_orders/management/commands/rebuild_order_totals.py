@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from retail_orders.backends.models import Order
+from retail_orders.backends.services import order_totals
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает total_price и items_count всех заказов пачками по диапазонам id.
+    """
+    help = 'Пересчитывает сохраненные итоги заказов (total_price, items_count) по позициям'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Количество id заказов, пересчитываемых одним UPDATE')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = Order.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            self.stdout.write('Заказов нет')
+            return
+
+        updated = 0
+        for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+            with transaction.atomic():
+                updated += Order.objects.filter(pk__gte=start, pk__lt=start + batch_size).update(**order_totals())
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано заказов: {updated}'))
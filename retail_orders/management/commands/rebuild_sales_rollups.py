@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from retail_orders.backends.analytics import rebuild_rollups
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает итоги продаж (SalesRollup) по позициям оформленных заказов.
+    """
+    help = 'Пересчитывает итоги продаж по дням, магазинам и категориям по истории заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Пересчитать только итоги с этого дня (ГГГГ-ММ-ДД)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество строк итогов, создаваемых одним INSERT')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError(f"Неверная дата: {options['since']}")
+
+        created = rebuild_rollups(since, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Создано строк итогов: {created}'))
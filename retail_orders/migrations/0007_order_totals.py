@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:54
+
+from django.db import migrations, models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_totals(apps, schema_editor):
+    """
+    Фиксирует текущие цены товаров в позициях и пересчитывает итоги заказов.
+    """
+    Product = apps.get_model('retail_orders', 'Product')
+    Order = apps.get_model('retail_orders', 'Order')
+    OrderItem = apps.get_model('retail_orders', 'OrderItem')
+
+    OrderItem.objects.update(price=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('price')))
+
+    items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    Order.objects.update(
+        total_price=Coalesce(
+            Subquery(items.annotate(amount=Sum(F('price') * F('quantity'))).values('amount')),
+            Value(0), output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        items_count=Coalesce(Subquery(items.annotate(units=Sum('quantity')).values('units')), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('retail_orders', '0006_remove_contact_avatar_order_avatar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('retail_orders', '0010_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductThumbnail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=50)),
+                ('source_hash', models.CharField(max_length=64)),
+                ('name', models.CharField(max_length=255)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='thumbnails', to='retail_orders.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'alias'), name='unique_product_thumbnail_alias')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_stock_to_inventory(apps, schema_editor):
+    Product = apps.get_model('retail_orders', 'Product')
+    Inventory = apps.get_model('retail_orders', 'Inventory')
+    rows = Product.objects.using(schema_editor.connection.alias).values_list('id', 'stock', 'reserved')
+    Inventory.objects.using(schema_editor.connection.alias).bulk_create(
+        (Inventory(product_id=pk, stock=stock, reserved=reserved) for pk, stock, reserved in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+def copy_inventory_to_stock(apps, schema_editor):
+    Product = apps.get_model('retail_orders', 'Product')
+    Inventory = apps.get_model('retail_orders', 'Inventory')
+    rows = Inventory.objects.using(schema_editor.connection.alias).values_list('product_id', 'stock', 'reserved')
+    Product.objects.using(schema_editor.connection.alias).bulk_update(
+        [Product(id=pk, stock=stock, reserved=reserved) for pk, stock, reserved in rows.iterator()],
+        ['stock', 'reserved'], batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('retail_orders', '0012_product_thumbnail_urls'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Inventory',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True,
+                                                 related_name='inventory', serialize=False,
+                                                 to='retail_orders.product')),
+                ('stock', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('reserved', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(copy_stock_to_inventory, copy_inventory_to_stock),
+        migrations.RemoveField(
+            model_name='product',
+            name='reserved',
+        ),
+        migrations.RemoveField(
+            model_name='product',
+            name='stock',
+        ),
+    ]
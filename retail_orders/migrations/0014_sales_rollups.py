@@ -0,0 +1,74 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_completed_at(apps, schema_editor):
+    """
+    Для уже оформленных заказов время оформления неизвестно: берется updated_at.
+    """
+    Order = apps.get_model('retail_orders', 'Order')
+    Order.objects.using(schema_editor.connection.alias).filter(status='completed').update(
+        completed_at=models.F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('retail_orders', '0013_inventory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('orders', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-day', 'store', 'category'],
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_completed_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'completed_at'], name='order_status_completed_idx'),
+        ),
+        migrations.AddField(
+            model_name='salesrollup',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='retail_orders.category'),
+        ),
+        migrations.AddField(
+            model_name='salesrollup',
+            name='store',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='retail_orders.store'),
+        ),
+        migrations.AddIndex(
+            model_name='salesrollup',
+            index=models.Index(fields=['store', 'day'], name='sales_rollup_store_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salesrollup',
+            index=models.Index(fields=['category', 'day'], name='sales_rollup_category_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='salesrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'store', 'category'), name='unique_sales_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='salesrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('day', 'store'), name='unique_sales_rollup_no_category'),
+        ),
+    ]
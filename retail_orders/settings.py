@@ -9,8 +9,11 @@ https://docs.djangoproject.com/en/5.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
+import os
 from pathlib import Path
 
+from retail_orders.databases import postgresql_database, sqlite_database
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
@@ -50,6 +53,10 @@ THUMBNAIL_ALIASES = {
     },
 }
 
+# Алиасы миниатюр изображений товаров и заглушка (static), пока миниатюра не готова.
+PRODUCT_THUMBNAIL_ALIASES = ('product_medium',)
+THUMBNAIL_PLACEHOLDER = 'retail_orders/thumbnail-placeholder.svg'
+
 
 
 REST_FRAMEWORK = {
@@ -68,12 +75,14 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20,
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
+        'retail_orders.backends.throttling.AnonRedisRateThrottle',
+        'retail_orders.backends.throttling.UserRedisRateThrottle',
     ],
+    # '<scope>.<action>' - отдельный лимит действия ViewSet (RedisRateThrottle).
     'DEFAULT_THROTTLE_RATES': {
         'anon': '10/minute',
         'user': '100/minute',
+        'user.checkout': '20/minute',
     },
 }
 
@@ -81,6 +90,8 @@ REST_FRAMEWORK = {
 
 
 MIDDLEWARE = [
+    'retail_orders.backends.middleware.RequestMetricsMiddleware',
+    'retail_orders.backends.middleware.DatabaseRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -95,7 +106,8 @@ ROOT_URLCONF = 'retail_orders.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        # Шаблоны админки лежат рядом с моделями в backends.
+        'DIRS': [BASE_DIR / 'retail_orders' / 'backends' / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -110,12 +122,31 @@ TEMPLATES = [
 WSGI_APPLICATION = 'retail_orders.wsgi.application'
 
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Профиль БД (retail_orders.databases): sqlite - один узел, postgresql - параметры из окружения.
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'sqlite')
+if DATABASE_PROFILE == 'postgresql':
+    DATABASES = {
+        'default': postgresql_database(
+            name=os.environ.get('DATABASE_NAME', 'retail_orders'),
+            user=os.environ.get('DATABASE_USER', ''),
+            password=os.environ.get('DATABASE_PASSWORD', ''),
+            host=os.environ.get('DATABASE_HOST', ''),
+            port=os.environ.get('DATABASE_PORT', ''),
+        ),
     }
-}
+else:
+    DATABASES = {
+        'default': sqlite_database(BASE_DIR / 'db.sqlite3'),
+    }
+# Реплики только для чтения (псевдонимы из DATABASES), см. backends.routers. Локально
+# реплику изображает вторая база, например:
+#     DATABASES['replica'] = sqlite_database(BASE_DIR / 'replica.sqlite3')
+#     DATABASE_REPLICAS = ['replica']
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['retail_orders.backends.routers.PrimaryReplicaRouter']
+# После записи клиент столько секунд читает из основной БД (cookie DATABASE_PIN_COOKIE).
+DATABASE_PIN_SECONDS = 15
+DATABASE_PIN_COOKIE = 'db_primary'
 
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -175,7 +206,8 @@ SOCIAL_AUTH_GOOGLE_OAUTH2_SECRET = 'Google-secret'
 
 CACHES = {
     'default': {
-        'BACKEND': 'django_redis.cache.RedisCache',
+        # RedisCache, который считает попадания и промахи для метрик запросов.
+        'BACKEND': 'retail_orders.backends.metrics.InstrumentedRedisCache',
         'LOCATION': 'redis://127.0.0.1:6379/1',
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
@@ -183,5 +215,67 @@ CACHES = {
     }
 }
 
+# InstrumentedRedisCache - подкласс django_redis.cache.RedisCache, который cachalot
+# поддерживает, но его проверка сравнивает только путь класса из CACHES.
+SILENCED_SYSTEM_CHECKS = ['cachalot.W001']
+
 CACHALOT_ENABLED = True
-CACHALOT_TIMEOUT = 60 * 60 * 24
\ No newline at end of file
+CACHALOT_TIMEOUT = 60 * 60 * 24
+# Чтения через iterator() (выгрузки) не кэшируются: иначе cachalot собрал бы результат в список.
+CACHALOT_CACHE_ITERATORS = False
+# Чтения с реплик сбрасываются вместе с таблицами основной БД.
+CACHALOT_TABLE_KEYGEN = 'retail_orders.backends.routers.table_cache_key'
+# Представления истории заказов меняются через свои таблицы, cachalot не знает о связи.
+CACHALOT_UNCACHABLE_TABLES = frozenset(
+    ('django_migrations', 'retail_orders_order_history', 'retail_orders_order_history_item'))
+# Отрисованные ответы каталога (список и карточка товара); сбрасываются сигналами при изменениях.
+CATALOGUE_CACHE_TIMEOUT = 60 * 60
+# Корзины хранятся в Redis (CART_STORE); при CART_WRITE_BEHIND корзины пользователей
+# тоже живут в Redis и периодически переносятся в БД задачей flush_carts.
+# Включается переменной окружения CART_WRITE_BEHIND=1 вместе с Celery beat (flush-carts).
+# По умолчанию выключено: корзина пользователя - заказ pending, который API заказов
+# и remove_from_cart читают из БД сразу после изменения, а в режиме write-behind он
+# отстает на интервал flush-carts. Без него Redis снимает нагрузку только с анонимных корзин.
+CART_STORE = 'retail_orders.backends.cart.RedisCartStore'
+CART_REDIS_ALIAS = 'default'
+CART_TTL = 60 * 60 * 24 * 30
+CART_WRITE_BEHIND = os.environ.get('CART_WRITE_BEHIND') == '1'
+
+# Массовые рассылки: получателей в пачке (одно SMTP соединение) и писем в секунду.
+EMAIL_BATCH_SIZE = 100
+EMAIL_RATE_LIMIT = 50
+
+# Срок резерва товара для позиции корзины, секунд.
+STOCK_RESERVATION_TTL = 15 * 60
+
+# Завершенные заказы старше стольких дней переносятся в архивные таблицы (задача archive_orders).
+ORDER_ARCHIVE_AFTER_DAYS = 180
+
+# Метрики запросов (RequestMetricsMiddleware): заголовок Server-Timing, порог медленного
+# запроса (мс) и доля медленных запросов, попадающих в журнал, интервал сохранения
+# сводки по действиям в Redis (секунд).
+REQUEST_METRICS_SERVER_TIMING = True
+REQUEST_METRICS_SLOW_MS = 1000
+REQUEST_METRICS_SLOW_SAMPLE_RATE = 0.1
+REQUEST_METRICS_FLUSH_INTERVAL = 10
+REQUEST_METRICS_REDIS_ALIAS = 'default'
+# Значения параметров SQL в журнале медленных запросов: там данные пользователей, только для отладки.
+REQUEST_METRICS_LOG_SQL_PARAMS = False
+
+# Redis для лимитов запросов (RedisRateThrottle).
+THROTTLE_REDIS_ALIAS = 'default'
+
+CELERY_BEAT_SCHEDULE = {
+    'flush-carts': {
+        'task': 'retail_orders.backends.tasks.flush_carts',
+        'schedule': 60.0,
+    },
+    'expire-stock-reservations': {
+        'task': 'retail_orders.backends.tasks.expire_stock_reservations',
+        'schedule': 30.0,
+    },
+    'archive-orders': {
+        'task': 'retail_orders.backends.tasks.archive_orders',
+        'schedule': 60 * 60.0,
+    },
+}
@@ -0,0 +1,159 @@
+"""
+Замеры API для бенчмарков: задержки (p50/p95/p99), пропускная способность
+и число SQL запросов по сценариям, сохранение результатов в JSON и сравнение
+с сохраненной базовой линией.
+"""
+import json
+import math
+import platform
+import time
+import urllib.error
+import urllib.request
+
+import django
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+def percentile(values, percent):
+    """
+    Перцентиль по методу ближайшего ранга.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+class InProcessClient:
+    """
+    Запросы через тестовый клиент DRF, без сети.
+    """
+    mode = 'in_process'
+
+    def __init__(self):
+        self.client = APIClient()
+
+    def request(self, method, path, user, data=None):
+        self.client.force_authenticate(user=user)
+        return getattr(self.client, method)(path, data, format='json').status_code
+
+
+class ServerClient:
+    """
+    HTTP запросы к запущенному серверу с JWT пользователя.
+    """
+    mode = 'server'
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.tokens = {}
+
+    def request(self, method, path, user, data=None):
+        if user.pk not in self.tokens:
+            self.tokens[user.pk] = str(RefreshToken.for_user(user).access_token)
+        request = urllib.request.Request(
+            self.base_url + path, method=method.upper(),
+            data=json.dumps(data).encode('utf-8') if data is not None else None,
+            headers={'Authorization': f'Bearer {self.tokens[user.pk]}', 'Content-Type': 'application/json'},
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def measure(call, requests, prepare=None):
+    """
+    Выполняет call(*prepare(i)) requests раз (подготовка не входит в замер)
+    и возвращает статистику: задержки в мс, запросов в секунду одного клиента
+    и SQL запросов на вызов. call возвращает HTTP статус, ошибочный статус
+    прерывает замер.
+    """
+    latencies = []
+    queries = []
+    for i in range(requests):
+        args = prepare(i) if prepare else (i,)
+        # Журнал запросов ограничен 9000 записями: заполненный журнал CaptureQueriesContext не считает.
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            status = call(*args)
+            latencies.append(time.perf_counter() - start)
+        if status >= 400:
+            raise AssertionError(f'Запрос {i} завершился со статусом {status}')
+        queries.append(len(captured))
+    return {
+        'requests': requests,
+        'throughput': round(requests / sum(latencies), 1),
+        'mean_ms': round(sum(latencies) / requests * 1000, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'queries': max(queries),
+        'queries_mean': round(sum(queries) / requests, 2),
+    }
+
+
+def environment(**params):
+    """
+    Условия замера для сравнения результатов с разных машин.
+    """
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.machine(),
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        **params,
+    }
+
+
+def compare(results, baseline, latency_tolerance):
+    """
+    Регрессии относительно базовой линии: больше SQL запросов на вызов
+    или p95 выше базового больше чем на latency_tolerance (доля).
+    Возвращает список (режим, сценарий, показатель, было, стало).
+    """
+    regressions = []
+    for mode, scenarios in results['scenarios'].items():
+        for name, stats in scenarios.items():
+            base = baseline.get('scenarios', {}).get(mode, {}).get(name)
+            if base is None:
+                continue
+            if stats['queries'] > base['queries']:
+                regressions.append((mode, name, 'queries', base['queries'], stats['queries']))
+            if stats['p95_ms'] > base['p95_ms'] * (1 + latency_tolerance):
+                regressions.append((mode, name, 'p95_ms', base['p95_ms'], stats['p95_ms']))
+    return regressions
+
+
+def report(results, baseline):
+    """
+    Таблица результатов с базовыми p95 и числом запросов в скобках.
+    """
+    lines = [f"{'режим':<11}{'сценарий':<18}{'зап/с':>9}{'p50 мс':>9}{'p95 мс':>17}{'p99 мс':>9}{'SQL':>9}"]
+    for mode, scenarios in results['scenarios'].items():
+        for name, stats in scenarios.items():
+            base = baseline.get('scenarios', {}).get(mode, {}).get(name, {})
+            p95 = f"{stats['p95_ms']:.2f}" + (f" ({base['p95_ms']:.2f})" if base else '')
+            queries = f"{stats['queries']}" + (f" ({base['queries']})" if base else '')
+            lines.append(f"{mode:<11}{name:<18}{stats['throughput']:>9.1f}{stats['p50_ms']:>9.2f}{p95:>17}"
+                         f"{stats['p99_ms']:>9.2f}{queries:>9}")
+    return '\n'.join(lines)
+
+
+def load(path):
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save(results, path):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=2, sort_keys=True)
+        file.write('\n')
@@ -0,0 +1,68 @@
+from cachalot.api import cachalot_disabled
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from retail_orders.backends.models import Order, OrderItem, Product, Store
+
+
+class AdminChangelistQueriesTest(TestCase):
+    """
+    Число запросов списков заказов и позиций в админке не зависит от числа строк.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='password')
+        stores = [Store.objects.create(name=f'Store {i}') for i in range(3)]
+        products = [Product.objects.create(name=f'Product {i}', price=i + 1, stock=10, store=stores[i % 3])
+                    for i in range(30)]
+        users = [User.objects.create(username=f'customer {i}') for i in range(20)]
+        for i in range(100):
+            order = Order.objects.create(user=users[i % 20], status='completed' if i % 2 else 'pending')
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=products[(i + line) % 30], quantity=1, price=1) for line in range(3)
+            ])
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, url, params=None):
+        # Без cachalot, чтобы считать запросы, которые выполнила бы база.
+        with cachalot_disabled(), CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(captured)
+
+    def test_order_changelist(self):
+        response, queries = self.changelist_queries('/admin/retail_orders/order/')
+        self.assertEqual(len(response.context['cl'].result_list), 100)
+        self.assertContains(response, 'Заказ')
+        self.assertLessEqual(queries, 6)
+
+        _, filtered = self.changelist_queries('/admin/retail_orders/order/', {'status__exact': 'completed'})
+        self.assertLessEqual(filtered, queries)
+
+    def test_order_item_changelist(self):
+        response, queries = self.changelist_queries('/admin/retail_orders/orderitem/')
+        self.assertEqual(len(response.context['cl'].result_list), 100)
+        self.assertContains(response, '1 x Product')
+        self.assertLessEqual(queries, 6)
+
+    def test_changelist_count(self):
+        response = self.client.get('/admin/retail_orders/order/', {'status__exact': 'completed'})
+        changelist = response.context['cl']
+        self.assertEqual((changelist.result_count, changelist.full_result_count), (50, None))
+
+    def test_change_forms(self):
+        order = Order.objects.first()
+        item = OrderItem.objects.first()
+        for url in (f'/admin/retail_orders/order/{order.id}/change/', '/admin/retail_orders/order/add/',
+                    f'/admin/retail_orders/orderitem/{item.id}/change/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            # raw_id_fields: поле с id вместо списка всех пользователей, заказов и товаров.
+            self.assertContains(response, 'vForeignKeyRawIdAdminField')
+            self.assertNotContains(response, '<select name="user"')
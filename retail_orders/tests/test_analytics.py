@@ -0,0 +1,132 @@
+import datetime
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from retail_orders.backends.models import Category, Order, OrderItem, Product, SalesRollup, Store
+from retail_orders.backends.services import checkout_order
+
+
+class SalesRollupTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='password')
+        self.stores = [Store.objects.create(name='Store A'), Store.objects.create(name='Store B')]
+        self.category = Category.objects.create(name='Молочное')
+        self.milk = Product.objects.create(name='Молоко', price=10, stock=100, store=self.stores[0],
+                                           category=self.category)
+        self.kefir = Product.objects.create(name='Кефир', price=20, stock=100, store=self.stores[0])
+        self.bread = Product.objects.create(name='Хлеб', price=5, stock=100, store=self.stores[1],
+                                            category=self.category)
+
+    def checkout(self, *lines):
+        order = Order.objects.create(user=self.user, status='pending')
+        for product, quantity in lines:
+            OrderItem.objects.create(order=order, product=product, quantity=quantity)
+        return checkout_order(order)
+
+    def rollups(self):
+        return {
+            (row.store_id, row.category_id): (row.units, row.revenue, row.orders)
+            for row in SalesRollup.objects.filter(day=timezone.localdate())
+        }
+
+    def test_checkout_updates_rollups(self):
+        order = self.checkout((self.milk, 2), (self.kefir, 1), (self.bread, 3))
+        self.checkout((self.milk, 1))
+
+        self.assertIsNotNone(order.completed_at)
+        self.assertEqual(self.rollups(), {
+            (self.stores[0].id, self.category.id): (3, Decimal('30.00'), 2),
+            (self.stores[0].id, None): (1, Decimal('20.00'), 1),
+            (self.stores[1].id, self.category.id): (3, Decimal('15.00'), 1),
+        })
+
+    def snapshot(self, **lookup):
+        return set(SalesRollup.objects.filter(**lookup).values_list(
+            'day', 'store', 'category', 'units', 'revenue', 'orders'))
+
+    def test_rebuild_matches_incremental(self):
+        today = timezone.localdate()
+        earlier = today - datetime.timedelta(days=3)
+        Order.objects.create(user=self.user, status='pending', completed_at=timezone.now())
+        self.checkout((self.milk, 2), (self.kefir, 1), (self.bread, 3))
+        self.checkout((self.kefir, 4))
+        self.checkout((self.milk, 1), (self.bread, 1))
+        old = self.checkout((self.bread, 1))
+        # Последний заказ переносится на три дня назад вместе с его итогами.
+        Order.objects.filter(pk=old.pk).update(completed_at=timezone.now() - datetime.timedelta(days=3))
+        SalesRollup.objects.filter(store=self.stores[1], day=today).update(units=4, revenue=20, orders=2)
+        SalesRollup.objects.create(day=earlier, store=self.stores[1], category=self.category,
+                                   units=1, revenue=5, orders=1)
+        expected = self.snapshot()
+
+        SalesRollup.objects.update(units=0)
+        call_command('rebuild_sales_rollups', since=str(today), stdout=StringIO())
+        self.assertEqual(self.snapshot(day=today), {row for row in expected if row[0] == today})
+        # Итоги до since не пересчитываются.
+        self.assertEqual(self.snapshot(day=earlier), {(earlier, self.stores[1].id, self.category.id, 0,
+                                                       Decimal('5.00'), 1)})
+
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(self.snapshot(), expected)
+
+    def test_deleted_category_sales_are_kept(self):
+        self.checkout((self.milk, 2), (self.kefir, 1))
+        self.category.delete()
+        self.assertEqual(self.rollups(), {
+            (self.stores[0].id, None): (3, Decimal('40.00'), 2),
+        })
+
+
+class SalesAnalyticsApiTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser(username='admin', password='password'))
+        self.stores = [Store.objects.create(name='Store A'), Store.objects.create(name='Store B')]
+        self.category = Category.objects.create(name='Молочное')
+        self.today = datetime.date(2026, 3, 10)
+        for days, store, category, units in [(0, 0, self.category, 2), (0, 0, None, 1), (1, 1, self.category, 5),
+                                              (40, 0, self.category, 7)]:
+            SalesRollup.objects.create(day=self.today - datetime.timedelta(days=days), store=self.stores[store],
+                                       category=category, units=units, revenue=units * 10, orders=1)
+
+    def test_group_by_day(self):
+        response = self.client.get('/api/analytics/sales/', {'day__gte': '2026-03-01'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'], [
+            {'day': '2026-03-09', 'units': 5, 'revenue': '50.00', 'orders': 1},
+            {'day': '2026-03-10', 'units': 3, 'revenue': '30.00', 'orders': 2},
+        ])
+
+    def test_group_by_store_and_month(self):
+        response = self.client.get('/api/analytics/sales/', {'group_by': 'month,store', 'category': self.category.id})
+        self.assertEqual(response.json()['results'], [
+            {'month': '2026-01-01', 'store': self.stores[0].id, 'store_name': 'Store A',
+             'units': 7, 'revenue': '70.00', 'orders': 1},
+            {'month': '2026-03-01', 'store': self.stores[0].id, 'store_name': 'Store A',
+             'units': 2, 'revenue': '20.00', 'orders': 1},
+            {'month': '2026-03-01', 'store': self.stores[1].id, 'store_name': 'Store B',
+             'units': 5, 'revenue': '50.00', 'orders': 1},
+        ])
+
+    def test_reads_only_rollups(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/analytics/sales/', {'group_by': 'category'})
+        self.assertCountEqual([row['category_name'] for row in response.json()['results']], ['Молочное', None])
+
+    def test_validation_and_permissions(self):
+        response = self.client.get('/api/analytics/sales/', {'group_by': 'day,product'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(User.objects.create_user(username='user', password='password'))
+        self.assertEqual(self.client.get('/api/analytics/sales/').status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_admin_changelist_totals(self):
+        self.client.force_login(User.objects.get(username='admin'))
+        response = self.client.get('/admin/retail_orders/salesrollup/', {'store__id__exact': self.stores[0].id})
+        self.assertContains(response, 'Итого по выборке: 10 шт., выручка 100')
@@ -0,0 +1,84 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from retail_orders.backends.analytics import rebuild_rollups
+from retail_orders.backends.archive import archive_orders
+from retail_orders.backends.models import (ArchivedOrder, ArchivedOrderItem, Order, OrderItem, Product, SalesRollup,
+                                           Store)
+
+
+class OrderArchiveTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        store = Store.objects.create(name='Store')
+        self.products = [Product.objects.create(name=f'Product {i}', price=i + 1, stock=10, store=store)
+                         for i in range(3)]
+        now = timezone.now()
+        self.orders = []
+        # Пять заказов: три давно завершенных, один недавно завершенный, один pending.
+        for i, (status, age) in enumerate([('completed', 400), ('completed', 300), ('completed', 200),
+                                           ('completed', 5), ('pending', 400)]):
+            order = Order.objects.create(user=self.user, status=status)
+            for product in self.products[:i % 3 + 1]:
+                OrderItem.objects.create(order=order, product=product, quantity=2)
+            Order.objects.filter(pk=order.pk).update(
+                created_at=now - timedelta(days=age), total_price=(i + 1) * 10, items_count=i % 3 + 1,
+                completed_at=now - timedelta(days=age) if status == 'completed' else None)
+            self.orders.append(order)
+
+    def test_archive_in_batches(self):
+        archived = archive_orders(timezone.now() - timedelta(days=180), batch_size=2)
+        self.assertEqual(archived, 3)
+        self.assertEqual(sorted(ArchivedOrder.objects.values_list('id', flat=True)),
+                         [order.id for order in self.orders[:3]])
+        self.assertEqual(ArchivedOrderItem.objects.count(), 1 + 2 + 3)
+        self.assertEqual(sorted(Order.objects.values_list('id', flat=True)), [order.id for order in self.orders[3:]])
+        self.assertEqual(OrderItem.objects.count(), 1 + 2)
+        self.assertEqual(archive_orders(timezone.now() - timedelta(days=180)), 0)
+
+    def test_history_reads_archived_orders(self):
+        expected = self.client.get('/api/orders/').json()
+        detail = self.client.get(f'/api/orders/{self.orders[0].id}/').json()
+        archive_orders(timezone.now() - timedelta(days=180))
+
+        self.assertEqual(self.client.get('/api/orders/').json(), expected)
+        self.assertEqual(self.client.get(f'/api/orders/{self.orders[0].id}/').json(), detail)
+        response = self.client.get('/api/orders/', {'status': 'completed', 'pagination': 'keyset', 'page_size': 2})
+        self.assertEqual([order['id'] for order in response.json()['results']],
+                         [self.orders[3].id, self.orders[2].id])
+        response = self.client.get(response.json()['next'])
+        self.assertEqual([order['id'] for order in response.json()['results']],
+                         [self.orders[1].id, self.orders[0].id])
+
+        # Архивный заказ только читается.
+        self.assertEqual(self.client.post(f'/api/orders/{self.orders[0].id}/checkout/').status_code, 404)
+
+    def test_export_and_rollups_include_archive(self):
+        rebuild_rollups()
+        rollups = list(SalesRollup.objects.order_by('day', 'category').values('day', 'units', 'revenue', 'orders'))
+        exported = b''.join(self.client.get('/api/orders/export/', {'file_format': 'ndjson'}).streaming_content)
+
+        archive_orders(timezone.now() - timedelta(days=180))
+        rebuild_rollups()
+        self.assertEqual(
+            list(SalesRollup.objects.order_by('day', 'category').values('day', 'units', 'revenue', 'orders')), rollups)
+        self.assertEqual(
+            b''.join(self.client.get('/api/orders/export/', {'file_format': 'ndjson'}).streaming_content), exported)
+        self.assertEqual(len(json.loads(exported.splitlines()[2])['items']), 3)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('archive_orders', '--days', '250', '--batch-size', '1', '--max-batches', '1', stdout=out)
+        self.assertIn('Перенесено в архив заказов: 1', out.getvalue())
+        self.assertEqual(list(ArchivedOrder.objects.values_list('id', flat=True)), [self.orders[0].id])
@@ -0,0 +1,90 @@
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from retail_orders.backends.models import Category, Order, OrderItem, Product, Store
+
+
+class AsyncReadViewsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.async_client.force_login(self.user)
+        self.store = Store.objects.create(name='Store', address='Address')
+        self.category = Category.objects.create(name='Category', description='Описание')
+        self.products = [
+            Product.objects.create(name=f'Product {i}', price=i + 1, stock=10, store=self.store,
+                                   category=self.category if i % 2 else None)
+            for i in range(25)
+        ]
+
+    def aget(self, path, headers=None):
+        return async_to_sync(self.async_client.get)(path, headers=headers)
+
+    def test_product_list_matches_sync(self):
+        for query in ['', '?page=2', f'?category={self.category.id}', f'?store={self.store.id}&price=5']:
+            expected = self.client.get('/api/products/' + query).json()
+            response = self.aget('/api/async/products/' + query)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertEqual((data['count'], data['results']), (expected['count'], expected['results']))
+
+        data = self.aget('/api/async/products/').json()
+        self.assertTrue(data['next'].endswith('/api/async/products/?page=2'))
+        self.assertIsNone(data['previous'])
+
+    def test_product_list_errors(self):
+        self.assertEqual(self.aget('/api/async/products/?page=5').status_code, 404)
+        self.assertEqual(self.aget('/api/async/products/?store=999').status_code, 400)
+        self.assertEqual(async_to_sync(self.async_client.post)('/api/async/products/').status_code, 405)
+
+    def test_product_detail_matches_sync(self):
+        for product in self.products[:2]:
+            response = self.aget(f'/api/async/products/{product.id}/')
+            self.assertEqual(response.json(), self.client.get(f'/api/products/{product.id}/').json())
+        self.assertEqual(self.aget('/api/async/products/999/').status_code, 404)
+
+    def test_conditional_request_and_stock_overlay(self):
+        product = self.products[0]
+        response = self.aget(f'/api/async/products/{product.id}/')
+        self.assertEqual(self.aget(f'/api/async/products/{product.id}/',
+                                   headers={'If-None-Match': response['ETag']}).status_code, 304)
+
+        product.stock = 3
+        product.save()
+        response = self.aget(f'/api/async/products/{product.id}/', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['stock'], 3)
+
+    def test_order_list_matches_sync(self):
+        for i in range(3):
+            order = Order.objects.create(user=self.user, status='pending' if i else 'completed')
+            OrderItem.objects.create(order=order, product=self.products[i], quantity=i + 1)
+            OrderItem.objects.create(order=order, product=self.products[i + 1], quantity=1)
+        Order.objects.create(user=User.objects.create_user(username='other'), status='pending')
+
+        for query in ['', '?status=pending']:
+            expected = self.client.get('/api/orders/' + query).json()
+            data = self.aget('/api/async/orders/' + query).json()
+            self.assertEqual((data['count'], data['results']), (expected['count'], expected['results']))
+        self.assertEqual(self.aget('/api/async/orders/?status=unknown').status_code, 400)
+
+    def test_authentication(self):
+        self.async_client.logout()
+        response = self.aget('/api/async/orders/')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('WWW-Authenticate', response)
+
+        token = RefreshToken.for_user(self.user).access_token
+        response = self.aget('/api/async/orders/', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_request_metrics(self):
+        response = self.aget('/api/async/products/')
+        timing = dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+        self.assertRegex(timing['db'], r'queries=[1-9]\d*')
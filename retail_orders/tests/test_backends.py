@@ -1,4 +1,5 @@
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
@@ -6,6 +7,8 @@ from retail_orders.backends.models import Product, Order, OrderItem, Contact, St
 
 class ProductViewSetTest(APITestCase):
     def setUp(self):
+        # Ответы каталога кэшируются, а сброс по сигналам ждет фиксации транзакции.
+        cache.clear()
         self.user = User.objects.create_user(username='testuser', password='testpass')
         self.client = APIClient()
         self.client.force_authenticate(user=self.user)
@@ -0,0 +1,411 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from asgiref.sync import ThreadSensitiveContext
+from cachalot.api import cachalot_disabled
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, connections
+from django.db.utils import load_backend
+from django.test import AsyncClient, LiveServerTestCase, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from retail_orders import databases
+from retail_orders.backends import reservations, services
+from retail_orders.backends.models import Inventory, Order, OrderItem, Product, Store, Category
+from retail_orders.backends.serializers import ProductSerializer, ProductListSerializer
+from retail_orders.backends.services import checkout_order
+from retail_orders.tests import benchmarking
+from retail_orders.tests.benchmarking import InProcessClient, ServerClient
+
+
+def best_of(func, repeat=10):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+@unittest.skipUnless(os.environ.get('BENCHMARK'), 'Бенчмарки запускаются с переменной окружения BENCHMARK=1')
+class ProductListBenchmark(TestCase):
+    """
+    Сравнение пропускной способности ProductSerializer и ProductListSerializer
+    на странице из 1000 товаров (запрос к БД, сериализация и рендеринг JSON).
+    """
+    rows = 1000
+
+    @classmethod
+    def setUpTestData(cls):
+        stores = Store.objects.bulk_create([Store(name=f'Store {i}', address=f'Address {i}') for i in range(20)])
+        categories = Category.objects.bulk_create([Category(name=f'Category {i}') for i in range(10)])
+        Product.objects.bulk_create([
+            Product(name=f'Product {i}', description='Description', price=i + 1, stock=i,
+                    store=stores[i % 20], category=categories[i % 10])
+            for i in range(cls.rows)
+        ])
+
+    def test_product_list_throughput(self):
+        context = {'request': RequestFactory().get('/api/products/')}
+        queryset = Product.objects.select_related('store', 'category', 'inventory')
+        renderer = JSONRenderer()
+
+        def serializer():
+            return renderer.render(ProductSerializer(list(queryset.all()), many=True, context=context).data)
+
+        def list_serializer():
+            rows = list(queryset.values(*ProductListSerializer.columns))
+            return renderer.render(ProductListSerializer(rows, context=context).data)
+
+        # Кэш запросов cachalot отключен, чтобы сравнивать именно путь сериализации.
+        with cachalot_disabled():
+            self.assertEqual(serializer(), list_serializer())
+            slow = best_of(serializer)
+            fast = best_of(list_serializer)
+        print(f'\nProductSerializer: {self.rows / slow:.0f} строк/с, '
+              f'ProductListSerializer: {self.rows / fast:.0f} строк/с, ускорение x{slow / fast:.1f}')
+        self.assertGreaterEqual(slow / fast, 3)
+
+
+@unittest.skipUnless(os.environ.get('BENCHMARK'), 'Бенчмарки запускаются с переменной окружения BENCHMARK=1')
+class ProductSearchBenchmark(TestCase):
+    """
+    Время ответа /api/products/search/ (первая страница с количеством) на каталоге
+    из 200 000 товаров: запрос совпадает с 2% каталога.
+    """
+    rows = 200000
+    words = ['молоко', 'кефир', 'сыр', 'творог', 'йогурт', 'масло', 'хлеб', 'батон', 'чай', 'кофе']
+
+    @classmethod
+    def setUpTestData(cls):
+        store = Store.objects.create(name='Store')
+        for start in range(0, cls.rows, 10000):
+            Product.objects.bulk_create([
+                Product(name=f'{cls.words[i % 10]} {cls.words[i // 10 % 10]} {i}',
+                        description=f'Описание товара {i % 997}', price=1, store=store)
+                for i in range(start, start + 10000)
+            ])
+
+    def test_search_response_time(self):
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create(username='benchmark'))
+
+        def search():
+            response = client.get('/api/products/search/', {'q': 'молоко кеф'})
+            self.assertEqual(response.status_code, 200)
+            return response
+
+        with cachalot_disabled():
+            self.assertEqual(search().data['count'], self.rows // 50)
+            timing = best_of(search)
+        print(f'\nПоиск по {self.rows} товарам: {timing * 1000:.1f} мс')
+        self.assertLess(timing, 0.05)
+
+
+@unittest.skipUnless(os.environ.get('BENCHMARK'), 'Бенчмарки запускаются с переменной окружения BENCHMARK=1')
+class CatalogueCacheBenchmark(TransactionTestCase):
+    """
+    Доля чтений каталога (списки и карточки товаров), обслуженных без запроса
+    к таблице товаров, пока идут продажи: каждое чтение чередуется с резервом
+    и оформлением заказа. Транзакции фиксируются, как в рабочем режиме, поэтому
+    сброс кэша по сигналам срабатывает по-настоящему.
+    """
+    products = 200
+    reads = 300
+    readers = 10
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        stores = Store.objects.bulk_create([Store(name=f'Store {i}', address='Address') for i in range(3)])
+        categories = Category.objects.bulk_create([Category(name=f'Category {i}') for i in range(3)])
+        self.catalogue = Product.objects.bulk_create([
+            Product(name=f'Product {i}', description='Description', price=i + 1, stock=1000,
+                    store=stores[i % 3], category=categories[i % 3])
+            for i in range(self.products)
+        ])
+        self.urls = ['/api/products/', '/api/products/?page=2', f'/api/products/?store={stores[0].id}',
+                     f'/api/products/?category={categories[1].id}']
+        self.urls += [f'/api/products/{product.id}/' for product in self.catalogue[:6]]
+
+    def checkout(self, user, product):
+        order = Order.objects.create(user=user, status='pending')
+        OrderItem.objects.create(order=order, product=product, quantity=1)
+        reservations.hold(f'user:{user.id}', {product.id: 1})
+        checkout_order(order)
+
+    def test_hit_rate_under_checkouts(self):
+        buyer = User.objects.create(username='buyer')
+        clients = []
+        for i in range(self.readers):
+            client = APIClient()
+            client.force_authenticate(user=User.objects.create(username=f'reader {i}'))
+            clients.append(client)
+
+        hits = 0
+        start = time.perf_counter()
+        for i in range(self.reads):
+            self.checkout(buyer, self.catalogue[i % 6])
+            with CaptureQueriesContext(connection) as captured:
+                response = clients[i % self.readers].get(self.urls[i % len(self.urls)])
+            self.assertEqual(response.status_code, 200)
+            if not any('"retail_orders_product"' in query['sql'] for query in captured):
+                hits += 1
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(Inventory.objects.get(product=self.catalogue[0]).stock, 1000 - self.reads // 6)
+        rate = hits / self.reads
+        print(f'\nКэш каталога при {self.reads} оформлениях заказов: попаданий {rate:.0%}, '
+              f'{elapsed / self.reads * 1000:.1f} мс на заказ и чтение')
+        # Промахи - только первые чтения каждого адреса.
+        self.assertGreaterEqual(hits, self.reads - len(self.urls))
+
+
+@unittest.skipUnless(os.environ.get('BENCHMARK'), 'Бенчмарки запускаются с переменной окружения BENCHMARK=1')
+class ApiBenchmark(LiveServerTestCase):
+    """
+    Задержки, пропускная способность и число SQL запросов основных сценариев API
+    на каталоге из 20 000 товаров и 5000 оформленных заказов: в процессе (тестовый
+    клиент) и по HTTP к локальному серверу. Результаты сохраняются в JSON
+    (BENCHMARK_OUTPUT) и сравниваются с базовой линией BASELINE: рост числа
+    запросов - ошибка, рост p95 больше BENCHMARK_TOLERANCE - ошибка только при
+    BENCHMARK_STRICT=1 (время зависит от машины). BENCHMARK_UPDATE_BASELINE=1
+    записывает результаты как новую базовую линию.
+    """
+    products = 20000
+    stores = 20
+    categories = 50
+    users = 200
+    orders = 5000
+    requests = int(os.environ.get('BENCHMARK_REQUESTS', 200))
+    baseline_path = Path(__file__).parent / 'benchmarks' / 'api_baseline.json'
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        stores = Store.objects.bulk_create([Store(name=f'Store {i}', address='Address') for i in range(self.stores)])
+        categories = Category.objects.bulk_create([Category(name=f'Category {i}') for i in range(self.categories)])
+        self.catalogue = Product.objects.bulk_create([
+            Product(name=f'Product {i}', description=f'Description {i}', price=i % 500 + 1, stock=10 ** 6,
+                    store=stores[i % self.stores], category=categories[i % self.categories])
+            for i in range(self.products)
+        ], batch_size=2000)
+        self.customers = User.objects.bulk_create([User(username=f'customer {i}') for i in range(self.users)])
+        orders = Order.objects.bulk_create([
+            Order(user=self.customers[i % self.users], status='completed', completed_at=timezone.now())
+            for i in range(self.orders)
+        ], batch_size=2000)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=self.catalogue[(i * 7 + line) % self.products], quantity=line + 1,
+                      price=self.catalogue[(i * 7 + line) % self.products].price)
+            for i, order in enumerate(orders) for line in range(3)
+        ], batch_size=2000)
+        self.filter_url = f'/api/products/?store={stores[3].id}&category={categories[3].id}'
+
+    def product(self, i):
+        return self.catalogue[i * 37 % self.products]
+
+    def customer(self, i):
+        # Запросы распределены по пользователям, чтобы не упираться в лимит запросов пользователя.
+        return self.customers[i % self.users]
+
+    def scenarios(self, client):
+        """
+        Сценарии: имя -> (вызов, подготовка вне замера).
+        """
+        def remove_prepare(i):
+            user = self.customer(i)
+            order = services.add_to_cart(user, self.product(i), 1)
+            return user, order.pk, OrderItem.objects.get(order=order, product=self.product(i)).pk
+
+        def checkout_prepare(i):
+            user = self.customer(i)
+            lines = {self.product(i + line).id: (1, self.product(i + line).price) for line in range(3)}
+            return user, services.save_cart(user, lines).pk
+
+        return {
+            'product_list': (lambda i: client.request('get', '/api/products/', self.customer(i)), None),
+            'product_detail': (lambda i: client.request('get', f'/api/products/{self.product(i % 50).id}/',
+                                                        self.customer(i)), None),
+            'product_filter': (lambda i: client.request('get', self.filter_url, self.customer(i)), None),
+            'add_to_cart': (lambda i: client.request('post', '/api/orders/add_to_cart/', self.customer(i),
+                                                     {'product_id': self.product(i).id, 'quantity': 1}), None),
+            'remove_from_cart': (lambda user, order, item: client.request(
+                'post', f'/api/orders/{order}/remove_from_cart/', user, {'item_id': item}), remove_prepare),
+            'checkout': (lambda user, order: client.request('post', f'/api/orders/{order}/checkout/', user),
+                         checkout_prepare),
+            'order_list': (lambda i: client.request('get', '/api/orders/', self.customer(i)), None),
+        }
+
+    def run_scenarios(self, client):
+        cache.clear()
+        return {name: benchmarking.measure(call, self.requests, prepare)
+                for name, (call, prepare) in self.scenarios(client).items()}
+
+    def test_api_hot_paths(self):
+        results = {
+            'environment': benchmarking.environment(products=self.products, orders=self.orders,
+                                                    requests=self.requests),
+            'scenarios': {client.mode: self.run_scenarios(client)
+                          for client in [InProcessClient(), ServerClient(self.live_server_url)]},
+        }
+        baseline = benchmarking.load(self.baseline_path)
+        benchmarking.save(results, os.environ.get('BENCHMARK_OUTPUT', 'benchmark-results.json'))
+        if os.environ.get('BENCHMARK_UPDATE_BASELINE'):
+            benchmarking.save(results, self.baseline_path)
+        print('\n' + benchmarking.report(results, baseline))
+
+        regressions = benchmarking.compare(results, baseline, float(os.environ.get('BENCHMARK_TOLERANCE', 0.5)))
+        for regression in regressions:
+            print('Регрессия: {} {} {}: {} -> {}'.format(*regression))
+        self.assertEqual([regression for regression in regressions if regression[2] == 'queries'], [])
+        if os.environ.get('BENCHMARK_STRICT'):
+            self.assertEqual(regressions, [])
+
+
+@unittest.skipUnless(os.environ.get('BENCHMARK'), 'Бенчмарки запускаются с переменной окружения BENCHMARK=1')
+class AsyncReadBenchmark(TransactionTestCase):
+    """
+    Пропускная способность и p95 чтений каталога и истории заказов: синхронные
+    представления DRF по одному запросу (как один поток WSGI) против асинхронных
+    (/api/async/...), которые обслуживают concurrency запросов одновременно
+    в одном цикле событий. Каждый асинхронный запрос выполняется в своем
+    ThreadSensitiveContext, как у ASGI сервера, поэтому ORM разных запросов
+    работает в разных потоках.
+    """
+    products = 2000
+    users = 100
+    orders = 500
+    requests = int(os.environ.get('BENCHMARK_REQUESTS', 200))
+    concurrency = 20
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        stores = Store.objects.bulk_create([Store(name=f'Store {i}', address='Address') for i in range(10)])
+        categories = Category.objects.bulk_create([Category(name=f'Category {i}') for i in range(10)])
+        self.catalogue = Product.objects.bulk_create([
+            Product(name=f'Product {i}', description='Description', price=i % 500 + 1, stock=1000,
+                    store=stores[i % 10], category=categories[i % 10])
+            for i in range(self.products)
+        ])
+        self.customers = User.objects.bulk_create([User(username=f'customer {i}') for i in range(self.users)])
+        orders = Order.objects.bulk_create([
+            Order(user=self.customers[i % self.users], status='completed', completed_at=timezone.now())
+            for i in range(self.orders)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=self.catalogue[(i * 7 + line) % self.products], quantity=1,
+                      price=self.catalogue[(i * 7 + line) % self.products].price)
+            for i, order in enumerate(orders) for line in range(3)
+        ])
+        self.tokens = {user.pk: str(RefreshToken.for_user(user).access_token) for user in self.customers}
+
+    def paths(self, prefix):
+        return {
+            'product_list': lambda i: f'{prefix}/products/?page={i % 5 + 1}',
+            'product_detail': lambda i: f'{prefix}/products/{self.catalogue[i * 37 % 100].id}/',
+            'order_list': lambda i: f'{prefix}/orders/',
+        }
+
+    def run_sync(self, path):
+        client = APIClient()
+        timings = []
+        start = time.perf_counter()
+        for i in range(self.requests):
+            client.force_authenticate(user=self.customers[i % self.users])
+            began = time.perf_counter()
+            self.assertEqual(client.get(path(i)).status_code, 200)
+            timings.append(time.perf_counter() - began)
+        return time.perf_counter() - start, timings
+
+    async def run_async(self, path):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        timings = []
+
+        async def request(i):
+            async with semaphore, ThreadSensitiveContext():
+                began = time.perf_counter()
+                response = await client.get(
+                    path(i), headers={'Authorization': f'Bearer {self.tokens[self.customers[i % self.users].pk]}'})
+                timings.append(time.perf_counter() - began)
+                self.assertEqual(response.status_code, 200)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(request(i) for i in range(self.requests)))
+        return time.perf_counter() - start, timings
+
+    def test_async_read_throughput(self):
+        sync_paths, async_paths = self.paths('/api'), self.paths('/api/async')
+        lines = []
+        for name in sync_paths:
+            cache.clear()
+            sync_elapsed, sync_timings = self.run_sync(sync_paths[name])
+            cache.clear()
+            # Свой цикл событий без внешнего синхронного потока (как у ASGI сервера):
+            # иначе sync_to_async отправил бы ORM всех запросов в этот поток.
+            async_elapsed, async_timings = asyncio.run(self.run_async(async_paths[name]))
+            lines.append(
+                f'{name}: синхронно {self.requests / sync_elapsed:.0f} запр/с, '
+                f'p95 {benchmarking.percentile(sync_timings, 95) * 1000:.1f} мс; '
+                f'асинхронно x{self.concurrency} {self.requests / async_elapsed:.0f} запр/с, '
+                f'p95 {benchmarking.percentile(async_timings, 95) * 1000:.1f} мс'
+            )
+        print('\n' + '\n'.join(lines))
+
+
+@unittest.skipUnless(os.environ.get('BENCHMARK'), 'Бенчмарки запускаются с переменной окружения BENCHMARK=1')
+class ConnectionOverheadBenchmark(SimpleTestCase):
+    """
+    Накладные расходы соединения с БД на запрос. Каждый запрос, как у обработчика
+    Django, начинается и заканчивается close_if_unusable_or_obsolete (close_old_connections)
+    и выполняет один SELECT 1. До - голые настройки (новое соединение на каждый запрос),
+    после - профиль из retail_orders.databases для движка тестовой БД.
+    """
+    requests = int(os.environ.get('BENCHMARK_REQUESTS', 2000))
+
+    def profiles(self, directory):
+        default = connections['default'].settings_dict
+        if default['ENGINE'] == 'django.db.backends.sqlite3':
+            name = os.path.join(directory, 'overhead.sqlite3')
+            before, after = {'ENGINE': default['ENGINE'], 'NAME': name}, databases.sqlite_database(name)
+        else:
+            before, after = {**default, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}, default
+        # configure_settings дополняет настройки умолчаниями Django и требует псевдоним default.
+        configured = connections.configure_settings({'default': before, 'after': after})
+        return configured['default'], configured['after']
+
+    def per_request(self, settings_dict):
+        """
+        Лучшее из нескольких прогонов время запроса: разница - десятки микросекунд,
+        одиночный прогон зашумлен.
+        """
+        connection = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, 'overhead')
+
+        def requests():
+            for _ in range(self.requests):
+                connection.close_if_unusable_or_obsolete()
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                connection.close_if_unusable_or_obsolete()
+
+        try:
+            return best_of(requests, repeat=5) / self.requests
+        finally:
+            connection.close()
+
+    def test_connection_overhead(self):
+        with tempfile.TemporaryDirectory() as directory:
+            before, after = (self.per_request(settings_dict) for settings_dict in self.profiles(directory))
+        print(f'\nСоединение с БД на запрос: без профиля {before * 1000:.3f} мс, '
+              f'с профилем {after * 1000:.3f} мс (x{before / after:.1f})')
+        self.assertLess(after, before)
@@ -0,0 +1,244 @@
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from retail_orders.backends import cart
+from retail_orders.backends.cart import LocalCartStore, RedisCartStore
+from retail_orders.backends.models import Product, Order, Store
+from retail_orders.backends.services import save_cart, update_cart
+from retail_orders.backends.tasks import flush_carts
+
+
+LOCAL_STORE = 'retail_orders.backends.cart.LocalCartStore'
+
+
+class CartStoreMixin:
+    def test_add_merge_and_dirty_owners(self):
+        store = self.store
+        store.add('anon:a', 1, 2, Decimal('10.00'))
+        store.add('anon:a', 1, 1, Decimal('99.00'))
+        store.add('user:7', 1, 1, Decimal('10.00'))
+        store.add('user:7', 2, 1, Decimal('5.50'))
+        self.assertEqual(store.get('anon:a'), {1: (3, Decimal('10.00'))})
+
+        store.merge('anon:a', 'user:7')
+        self.assertEqual(store.get('anon:a'), {})
+        self.assertEqual(store.get('user:7'), {1: (4, Decimal('10.00')), 2: (1, Decimal('5.50'))})
+        self.assertEqual(store.pop_dirty(10), ['user:7'])
+        self.assertEqual(store.pop_dirty(10), [])
+        store.mark_dirty(['user:7'])
+        self.assertEqual(store.pop_dirty(10), ['user:7'])
+
+        with store.owner_lock('user:7'):
+            self.assertTrue(store.remove('user:7', 2))
+        self.assertFalse(store.remove('user:7', 2))
+        store.clear('user:7')
+        self.assertEqual(store.get('user:7'), {})
+
+
+class LocalCartStoreTest(CartStoreMixin, TestCase):
+    def setUp(self):
+        self.store = LocalCartStore()
+
+
+class RedisCartStoreTest(CartStoreMixin, TestCase):
+    def setUp(self):
+        self.store = RedisCartStore()
+        self.store.prefix = 'test-cart'
+        for owner in ('anon:a', 'user:7'):
+            self.store.clear(owner)
+
+
+@override_settings(CART_STORE=LOCAL_STORE)
+class CartApiTest(APITestCase):
+    def setUp(self):
+        cart._stores.clear()
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client = APIClient()
+        self.store = Store.objects.create(name='Test Store')
+        self.product = Product.objects.create(name='Test Product', price=10, stock=100, store=self.store)
+        self.other = Product.objects.create(name='Other Product', price=3, stock=100, store=self.store)
+
+    def tearDown(self):
+        # Счетчики throttling хранятся в кэше и не должны влиять на другие тесты.
+        cache.clear()
+
+    def add(self, product, quantity):
+        return self.client.post('/api/orders/add_to_cart/', {'product_id': product.id, 'quantity': quantity})
+
+    def test_anonymous_cart_is_merged_on_login(self):
+        response = self.add(self.product, 2)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['message'], 'Добавлено в корзину (аноним)')
+        self.add(self.other, 1)
+        self.assertFalse(Order.objects.exists())
+
+        response = self.client.get('/api/orders/cart/')
+        self.assertEqual((response.data['items_count'], response.data['total_price']), (3, Decimal('23.00')))
+
+        self.client.login(username='testuser', password='password')
+        order = Order.objects.get(user=self.user, status='pending')
+        self.assertEqual((order.items_count, order.total_price), (3, Decimal('23.00')))
+        self.assertEqual(self.client.get('/api/orders/cart/').data['items_count'], 3)
+
+    def test_remove_by_product_id(self):
+        self.client.force_authenticate(user=self.user)
+        self.add(self.product, 2)
+        self.add(self.other, 1)
+        response = self.client.post('/api/orders/cart/remove/', {'product_id': self.other.id})
+        self.assertEqual(response.data['total_price'], Decimal('20.00'))
+        response = self.client.post('/api/orders/cart/remove/', {'product_id': self.other.id})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_remove_requires_numeric_product_id(self):
+        self.add(self.product, 1)
+        for data in ({}, {'product_id': 'abc'}):
+            response = self.client.post('/api/orders/cart/remove/', data)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('product_id', response.data)
+
+    @override_settings(CART_WRITE_BEHIND=True)
+    def test_write_behind_flush_and_checkout(self):
+        self.client.force_authenticate(user=self.user)
+        self.add(self.product, 2)
+        response = self.add(self.other, 4)
+        self.assertEqual(response.data['total_price'], Decimal('32.00'))
+        self.assertFalse(Order.objects.exists())
+
+        self.assertEqual(flush_carts(), 1)
+        order = Order.objects.get(user=self.user, status='pending')
+        self.assertEqual((order.items_count, order.total_price), (6, Decimal('32.00')))
+        self.assertEqual(flush_carts(), 0)
+
+        self.add(self.product, 1)
+        response = self.client.post('/api/orders/cart/checkout/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_price'], Decimal('42.00'))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 97)
+        self.assertEqual(self.client.get('/api/orders/cart/').data['items'], [])
+
+    def test_flush_keeps_failed_carts_dirty(self):
+        other_user = User.objects.create_user(username='other', password='password')
+        store = cart.get_cart_store()
+        for user in (self.user, other_user):
+            store.add(cart.user_owner(user), self.product.id, 1, self.product.price)
+        calls = []
+
+        def flaky_save(user, items):
+            calls.append(user)
+            if len(calls) == 1:
+                raise DatabaseError('connection lost')
+            return save_cart(user, items)
+
+        with mock.patch('retail_orders.backends.tasks.save_cart', side_effect=flaky_save):
+            self.assertEqual(flush_carts(), 1)
+        self.assertEqual(store.pop_dirty(10), [cart.user_owner(calls[0])])
+        store.mark_dirty([cart.user_owner(calls[0])])
+        self.assertEqual(flush_carts(), 1)
+        self.assertEqual(Order.objects.filter(status='pending').count(), 2)
+
+
+@override_settings(CART_STORE=LOCAL_STORE)
+class CartBatchTest(APITestCase):
+    def setUp(self):
+        cart._stores.clear()
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client = APIClient()
+        self.store = Store.objects.create(name='Test Store')
+        self.products = Product.objects.bulk_create(
+            Product(name=f'Product {i}', price=2, stock=5, store=self.store) for i in range(200))
+
+    def tearDown(self):
+        cache.clear()
+
+    def batch(self, operations):
+        return self.client.post('/api/orders/cart/batch/', {'operations': operations}, format='json')
+
+    def test_batch_takes_a_handful_of_queries(self):
+        self.client.force_authenticate(user=self.user)
+
+        def queries(operations):
+            with CaptureQueriesContext(connection) as captured:
+                response = self.batch(operations)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(captured)
+
+        # Создание заказа, 200 позиций и резервов, затем изменение 100 и удаление 100 позиций.
+        self.assertLessEqual(queries([{'op': 'set', 'product_id': p.id, 'quantity': 2} for p in self.products]), 17)
+        self.assertLessEqual(queries([{'op': 'remove' if i % 2 else 'add', 'product_id': p.id}
+                                      for i, p in enumerate(self.products)]), 17)
+        order = Order.objects.get(user=self.user, status='pending')
+        self.assertEqual((order.items_count, order.total_price), (300, Decimal('600.00')))
+
+    def test_operations_and_validation(self):
+        self.client.force_authenticate(user=self.user)
+        first, second, third = self.products[:3]
+        self.batch([{'product_id': first.id, 'quantity': 2}, {'product_id': second.id}])
+
+        response = self.batch([
+            {'op': 'add', 'product_id': first.id, 'quantity': 1},
+            {'op': 'remove', 'product_id': second.id},
+            {'op': 'set', 'product_id': third.id, 'quantity': 4},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(line['product_id'], line['quantity']) for line in response.data['items']],
+                         [(first.id, 3), (third.id, 4)])
+
+        response = self.batch([{'op': 'add', 'product_id': first.id, 'quantity': 3}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['items'][0]['requested'], 6)
+        response = self.batch([{'product_id': 0}, {'op': 'set', 'product_id': first.id, 'quantity': 1}])
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.batch([{'op': 'bad', 'product_id': first.id}]).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.get(user=self.user, status='pending').items_count, 7)
+
+    def test_anonymous_batch_uses_cart_store(self):
+        response = self.batch([{'product_id': p.id, 'quantity': 1} for p in self.products[:10]])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['items_count'], 10)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.client.get('/api/orders/cart/').data['total_price'], Decimal('20.00'))
+
+    def test_failed_store_write_restores_holds(self):
+        first, second = self.products[:2]
+        self.batch([{'product_id': first.id, 'quantity': 2}])
+        with mock.patch.object(LocalCartStore, 'replace', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            self.batch([{'op': 'set', 'product_id': first.id, 'quantity': 4},
+                        {'op': 'set', 'product_id': second.id, 'quantity': 1}])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.reserved, second.reserved), (2, 0))
+
+    def test_concurrent_batches_keep_both_lines(self):
+        store = LocalCartStore()
+        read = store.get
+
+        def slow_get(owner):
+            items = read(owner)
+            time.sleep(0.05)
+            return items
+
+        products = [(p.id, p.name, p.price, 5) for p in self.products[:2]]
+        workers = [
+            threading.Thread(target=update_cart, args=(None, [{'op': 'add', 'product_id': row[0], 'quantity': 1}],
+                                                       [row], 'anon:shared', store))
+            for row in products
+        ]
+        with mock.patch.object(store, 'get', side_effect=slow_get), \
+                mock.patch('retail_orders.backends.services.reservations.hold'):
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        self.assertEqual(set(store.get('anon:shared')), {row[0] for row in products})
@@ -0,0 +1,114 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from retail_orders.backends import reservations
+from retail_orders.backends.models import Category, Product, Store
+
+
+class CatalogueCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.store = Store.objects.create(name='Store', address='Address')
+        self.category = Category.objects.create(name='Category')
+        self.product = Product.objects.create(name='Молоко', description='', price=10, stock=5,
+                                              store=self.store, category=self.category)
+        self.other = Product.objects.create(name='Кефир', description='', price=20, stock=5, store=self.store)
+
+    def product_queries(self, func):
+        """
+        Запросы к таблице товаров при вызове func (остатки читаются из Inventory всегда).
+        """
+        with CaptureQueriesContext(connection) as captured:
+            result = func()
+        return result, [query['sql'] for query in captured if '"retail_orders_product"' in query['sql']]
+
+    def test_list_served_from_cache(self):
+        first = self.client.get('/api/products/?store=%d' % self.store.id)
+        second, queries = self.product_queries(lambda: self.client.get('/api/products/?store=%d' % self.store.id))
+        self.assertEqual(queries, [])
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertIn('private', second['Cache-Control'])
+
+    def test_not_modified(self):
+        response = self.client.get(f'/api/products/{self.product.id}/')
+        self.assertIn('Last-Modified', response)
+
+        etag = response['ETag']
+        response, queries = self.product_queries(
+            lambda: self.client.get(f'/api/products/{self.product.id}/', HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(queries, [])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+        last_modified = self.client.get(f'/api/products/{self.product.id}/')['Last-Modified']
+        response = self.client.get(f'/api/products/{self.product.id}/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_has_no_last_modified(self):
+        """Удаление товара не сдвигает updated_at остальных: список сверяется только по ETag."""
+        response = self.client.get('/api/products/')
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.delete()
+        response = self.client.get('/api/products/', HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.product.id])
+
+    def test_product_save_invalidates_only_its_detail(self):
+        self.client.get('/api/products/')
+        self.client.get(f'/api/products/{self.product.id}/')
+        etag = self.client.get(f'/api/products/{self.other.id}/')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.price = 25
+            self.other.save()
+
+        self.assertEqual(self.product_queries(lambda: self.client.get(f'/api/products/{self.product.id}/'))[1], [])
+        response = self.client.get(f'/api/products/{self.other.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['price'], '25.00')
+        self.assertNotEqual(response['ETag'], etag)
+        listed = {item['id']: item['price'] for item in self.client.get('/api/products/').json()['results']}
+        self.assertEqual(listed[self.other.id], '25.00')
+
+    def test_store_and_category_changes_invalidate_catalogue(self):
+        self.client.get(f'/api/products/{self.product.id}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.store.name = 'Renamed'
+            self.store.save()
+        self.assertEqual(self.client.get(f'/api/products/{self.product.id}/').json()['store']['name'], 'Renamed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.delete()
+        self.assertIsNone(self.client.get(f'/api/products/{self.product.id}/').json()['category'])
+
+    def test_errors_not_cached(self):
+        self.assertEqual(self.client.get('/api/products/999/').status_code, status.HTTP_404_NOT_FOUND)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(id=999, name='Новый', description='', price=1, stock=1, store=self.store)
+        self.assertEqual(self.client.get('/api/products/999/').status_code, status.HTTP_200_OK)
+
+    def test_stock_changes_do_not_invalidate_cache(self):
+        etag = self.client.get(f'/api/products/{self.product.id}/')['ETag']
+        self.client.get('/api/products/')
+        with self.captureOnCommitCallbacks(execute=True):
+            reservations.hold('user:1', {self.product.id: 1})
+
+        response, queries = self.product_queries(
+            lambda: self.client.get(f'/api/products/{self.product.id}/', HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(queries, [])
+        self.assertEqual((response.status_code, response.json()['reserved']), (status.HTTP_200_OK, 1))
+        response, queries = self.product_queries(lambda: self.client.get('/api/products/'))
+        self.assertEqual(queries, [])
+        self.assertEqual(response.json()['results'][1]['reserved'], 1)
@@ -0,0 +1,108 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from retail_orders.backends.models import Inventory, Product, Order, OrderItem, Store
+from retail_orders.backends.services import checkout_order, InsufficientStock, OrderAlreadyProcessed
+
+
+class CheckoutTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.store = Store.objects.create(name='Test Store')
+        self.products = [
+            Product.objects.create(name=f'Product {i}', price=10, stock=5, store=self.store)
+            for i in range(3)
+        ]
+        self.order = Order.objects.create(user=self.user, status='pending')
+
+    def test_checkout_reports_all_short_lines(self):
+        OrderItem.objects.create(order=self.order, product=self.products[0], quantity=6)
+        OrderItem.objects.create(order=self.order, product=self.products[1], quantity=1)
+        OrderItem.objects.create(order=self.order, product=self.products[2], quantity=7)
+        response = self.client.post(f'/api/orders/{self.order.id}/checkout/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            sorted(item['product_id'] for item in response.data['items']),
+            [self.products[0].id, self.products[2].id],
+        )
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'pending')
+        self.assertEqual(list(Inventory.objects.order_by('product_id').values_list('stock', flat=True)), [5, 5, 5])
+
+    def test_checkout_query_count_does_not_depend_on_lines(self):
+        for product in self.products:
+            OrderItem.objects.create(order=self.order, product=product, quantity=2)
+        # Два последних запроса - итоги продаж (SalesRollup), их число тоже не зависит от позиций.
+        with self.assertNumQueries(9):
+            checkout_order(self.order)
+        self.assertEqual(list(Inventory.objects.order_by('product_id').values_list('stock', flat=True)), [3, 3, 3])
+
+    def test_checkout_reports_product_without_inventory(self):
+        OrderItem.objects.create(order=self.order, product=self.products[0], quantity=1)
+        OrderItem.objects.create(order=self.order, product=self.products[1], quantity=1)
+        Inventory.objects.filter(product=self.products[1]).delete()
+        response = self.client.post(f'/api/orders/{self.order.id}/checkout/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['items'], [
+            {'product_id': self.products[1].id, 'name': 'Product 1', 'requested': 1, 'available': 0}])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'pending')
+
+    def test_checkout_twice(self):
+        checkout_order(self.order)
+        with self.assertRaises(OrderAlreadyProcessed):
+            checkout_order(self.order)
+
+
+class ConcurrentCheckoutTest(TransactionTestCase):
+    threads = 50
+    stock = 20
+
+    def setUp(self):
+        store = Store.objects.create(name='Test Store')
+        self.product = Product.objects.create(name='Hot SKU', price=10, stock=self.stock, store=store)
+        self.orders = []
+        for i in range(self.threads):
+            user = User.objects.create(username=f'user{i}')
+            order = Order.objects.create(user=user, status='pending')
+            OrderItem.objects.create(order=order, product=self.product, quantity=1)
+            self.orders.append(order)
+
+    def checkout(self, order, results):
+        try:
+            while True:
+                try:
+                    checkout_order(order)
+                    results.append('ok')
+                    return
+                except InsufficientStock:
+                    results.append('short')
+                    return
+                except OperationalError:
+                    # SQLite не блокирует строки, а сериализует запись: повторяем попытку.
+                    if connection.vendor != 'sqlite':
+                        raise
+                    time.sleep(0.001)
+        finally:
+            connection.close()
+
+    def test_hot_sku_is_never_oversold(self):
+        results = []
+        workers = [threading.Thread(target=self.checkout, args=(order, results)) for order in self.orders]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(len(results), self.threads)
+        self.assertEqual(results.count('ok'), self.stock)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(Order.objects.filter(status='completed').count(), self.stock)
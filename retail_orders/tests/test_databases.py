@@ -0,0 +1,75 @@
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import connections, transaction
+from django.db.utils import load_backend
+from django.test import SimpleTestCase
+from retail_orders import databases
+
+
+class SqliteProfileTest(SimpleTestCase):
+    """
+    Профиль SQLite на файловой базе (тестовая база Django - в памяти, без WAL).
+    """
+    writers = 10
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # Настройки с умолчаниями Django, как у псевдонимов из DATABASES.
+        self.settings_dict = connections.configure_settings(
+            {'default': databases.sqlite_database(os.path.join(directory.name, 'profile.sqlite3'))})['default']
+
+    @contextmanager
+    def connect(self):
+        connections['profile'] = load_backend(self.settings_dict['ENGINE']).DatabaseWrapper(
+            self.settings_dict, 'profile')
+        try:
+            yield connections['profile']
+        finally:
+            connections['profile'].close()
+            del connections['profile']
+
+    def test_pragmas(self):
+        with self.connect() as connection, connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_concurrent_writers_wait_for_lock(self):
+        with self.connect() as connection, connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE cart (writer INTEGER, position INTEGER)')
+        errors = []
+
+        def write(writer):
+            # Как checkout: транзакция пишет первым запросом и держит блокировку до COMMIT.
+            try:
+                with self.connect() as connection, transaction.atomic(using='profile'), \
+                        connection.cursor() as cursor:
+                    cursor.execute('INSERT INTO cart VALUES (%s, %s)', [writer, writer])
+                    time.sleep(0.01)
+            except Exception as error:
+                errors.append(error)
+
+        workers = [threading.Thread(target=write, args=(writer,)) for writer in range(self.writers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        with self.connect() as connection, connection.cursor() as cursor:
+            cursor.execute('SELECT position FROM cart ORDER BY position')
+            self.assertEqual([row[0] for row in cursor.fetchall()], list(range(self.writers)))
+
+
+class PostgresqlProfileTest(SimpleTestCase):
+    def test_persistent_connections_with_timeouts(self):
+        database = databases.postgresql_database('retail_orders', host='db')
+        self.assertEqual(database['CONN_MAX_AGE'], databases.CONN_MAX_AGE)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertIn('-c statement_timeout=30000', database['OPTIONS']['options'])
@@ -0,0 +1,114 @@
+import csv
+import gzip
+import io
+import json
+
+from cachalot.api import cachalot_disabled
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from retail_orders.backends.exporters import iter_orders
+from retail_orders.backends.models import Category, Contact, Order, OrderItem, Product, Store
+
+
+def content(response):
+    return b''.join(response.streaming_content)
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.stores = [Store.objects.create(name=f'Store {i}') for i in range(2)]
+        category = Category.objects.create(name='Молочные продукты')
+        self.products = [
+            Product.objects.create(name=f'Товар "{i}", 1 л', description='Строка 1\nстрока 2', price=i + 1.5, stock=i,
+                                   store=self.stores[i % 2], category=category if i else None)
+            for i in range(5)
+        ]
+
+    def test_products_csv(self):
+        response = self.client.get('/api/products/export/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="products.csv"')
+        first = next(iter(response.streaming_content))
+        self.assertEqual(first, b'id,name,price,stock,store,category,description,created_at,updated_at\r\n')
+
+        rows = list(csv.DictReader(io.StringIO((first + content(response)).decode('utf-8'))))
+        self.assertEqual([row['id'] for row in rows], [str(product.id) for product in self.products])
+        self.assertEqual(rows[1]['name'], 'Товар "1", 1 л')
+        self.assertEqual(rows[1]['description'], 'Строка 1\nстрока 2')
+        self.assertEqual((rows[1]['price'], rows[1]['stock'], rows[1]['store']), ('2.50', '1', 'Store 1'))
+        self.assertEqual((rows[0]['category'], rows[1]['category']), ('', 'Молочные продукты'))
+
+    def test_products_filters_and_gzip(self):
+        response = self.client.get('/api/products/export/',
+                                   {'store': self.stores[0].id, 'file_format': 'ndjson', 'compress': 'gzip'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="products.ndjson.gz"')
+        rows = [json.loads(line) for line in gzip.decompress(content(response)).decode('utf-8').splitlines()]
+        self.assertEqual([row['id'] for row in rows], [product.id for product in self.products[::2]])
+        self.assertEqual(rows[0]['price'], '1.50')
+
+        self.assertEqual(self.client.get('/api/products/export/', {'file_format': 'xml'}).status_code, 400)
+
+    def create_orders(self):
+        orders = []
+        for i in range(3):
+            order = Order.objects.create(user=self.user, status='completed' if i else 'pending')
+            for product in self.products[:i]:
+                OrderItem.objects.create(order=order, product=product, quantity=2)
+            orders.append(order)
+        Order.objects.create(user=User.objects.create_user(username='other'), status='completed')
+        return orders
+
+    def test_orders_ndjson(self):
+        orders = self.create_orders()
+        response = self.client.get('/api/orders/export/', {'file_format': 'ndjson', 'status': 'completed'})
+        rows = [json.loads(line) for line in content(response).decode('utf-8').splitlines()]
+        self.assertEqual([row['id'] for row in rows], [order.id for order in orders[1:]])
+        self.assertEqual(rows[1]['user'], 'testuser')
+        self.assertEqual([(item['product_id'], item['quantity']) for item in rows[1]['items']],
+                         [(self.products[0].id, 2), (self.products[1].id, 2)])
+
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get('/api/orders/export/').status_code, 401)
+
+    def test_orders_csv_row_per_item(self):
+        orders = self.create_orders()
+        rows = list(csv.DictReader(io.StringIO(content(self.client.get('/api/orders/export/')).decode('utf-8'))))
+        self.assertEqual([(int(row['id']), row['item_product']) for row in rows], [
+            (orders[0].id, ''),
+            (orders[1].id, self.products[0].name),
+            (orders[2].id, self.products[0].name), (orders[2].id, self.products[1].name),
+        ])
+
+    def test_order_items_read_per_chunk(self):
+        self.create_orders()
+        with cachalot_disabled(), self.assertNumQueries(3):
+            orders = list(iter_orders(Order.objects.all(), chunk_size=2))
+        self.assertEqual([len(order['items']) for order in orders], [0, 1, 2, 0])
+
+    def test_contacts_admin_only(self):
+        Contact.objects.create(name='Иван', email='ivan@example.com', message='Привет')
+        self.assertEqual(self.client.get('/api/contacts/export/').status_code, 403)
+
+        self.client.force_authenticate(user=User.objects.create_superuser(username='admin', password='password'))
+        rows = list(csv.DictReader(io.StringIO(content(self.client.get('/api/contacts/export/')).decode('utf-8'))))
+        self.assertEqual([(row['name'], row['email'], row['phone']) for row in rows],
+                         [('Иван', 'ivan@example.com', '')])
+
+    def test_admin_action(self):
+        self.client.force_login(User.objects.create_superuser(username='admin', password='password'))
+        response = self.client.post('/admin/retail_orders/product/', {
+            'action': 'export_csv_gzip', '_selected_action': [self.products[1].id, self.products[3].id],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="product.csv.gz"')
+        rows = list(csv.DictReader(io.StringIO(gzip.decompress(content(response)).decode('utf-8'))))
+        self.assertEqual([row['id'] for row in rows], [str(self.products[1].id), str(self.products[3].id)])
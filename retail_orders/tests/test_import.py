@@ -0,0 +1,97 @@
+import io
+import json
+import tempfile
+from decimal import Decimal
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from retail_orders.backends.importers import ProductImporter, iter_records, iter_json_array
+from retail_orders.backends.models import Category, Inventory, Product, Store
+from retail_orders.backends.tasks import do_import
+
+
+def records(content, file_format):
+    return iter_records(io.BytesIO(content.encode('utf-8')), file_format)
+
+
+class JSONArrayReaderTest(TestCase):
+    def test_reads_objects_across_chunk_boundaries(self):
+        data = [{'name': f'Product {i}', 'price': 10.5 + i} for i in range(50)]
+        stream = io.StringIO(json.dumps(data))
+        rows = list(iter_json_array(stream, chunk_size=7))
+        self.assertEqual(len(rows), 50)
+        self.assertEqual(rows[-1], (50, {'name': 'Product 49', 'price': Decimal('59.5')}))
+
+    def test_number_split_between_chunks(self):
+        rows = list(iter_json_array(io.StringIO('[12345, 6]'), chunk_size=3))
+        self.assertEqual(rows, [(1, 12345), (2, 6)])
+
+    def test_invalid_array(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.StringIO('{"name": "x"}')))
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.StringIO('[{"name": "x"} {"name": "y"}]')))
+
+
+class ProductImporterTest(TestCase):
+    def setUp(self):
+        self.store = Store.objects.create(name='Test Store')
+        self.product = Product.objects.create(name='Existing', price=5, stock=1, store=self.store, description='old')
+
+    def test_import_json_creates_and_updates(self):
+        content = json.dumps([
+            {'name': 'Existing', 'store': 'Test Store', 'price': '7.50', 'stock': 3},
+            {'name': 'New', 'store': 'New Store', 'category': 'Food', 'price': 2, 'stock': 10},
+        ])
+        stats = ProductImporter().run(records(content, 'json'))
+        self.assertEqual((stats['created'], stats['updated'], stats['failed']), (1, 1, 0))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price, Decimal('7.50'))
+        self.assertEqual(self.product.stock, 3)
+        self.assertEqual(self.product.description, 'old')
+        new = Product.objects.get(name='New')
+        self.assertEqual(new.store.name, 'New Store')
+        self.assertEqual(new.category.name, 'Food')
+
+    def test_stock_of_product_imported_without_stock(self):
+        ProductImporter().run(records('{"name": "New", "store": "Test Store", "price": 2}', 'ndjson'))
+        new = Product.objects.get(name='New')
+        self.assertEqual(Inventory.objects.get(product=new).stock, 0)
+
+        stats = ProductImporter().run(records('{"name": "New", "store": "Test Store", "price": 2, "stock": 42}', 'ndjson'))
+        self.assertEqual(stats['updated'], 1)
+        self.assertEqual(Inventory.objects.get(product=new).stock, 42)
+
+        # Товар без записи остатков (например, созданный до появления Inventory).
+        Inventory.objects.filter(product=self.product).delete()
+        ProductImporter().run(records('{"name": "Existing", "store": "Test Store", "price": 5, "stock": 7}', 'ndjson'))
+        self.assertEqual(Inventory.objects.get(product=self.product).stock, 7)
+
+    def test_import_ndjson_reports_row_errors(self):
+        content = '\n'.join([
+            '{"name": "A", "store": "Test Store", "price": 1}',
+            'not json',
+            '{"name": "B", "store": "Test Store", "price": -1}',
+            '{"name": "", "store": "Test Store", "price": 1}',
+        ])
+        stats = ProductImporter().run(records(content, 'ndjson'))
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['failed'], 3)
+        self.assertEqual([error['row'] for error in stats['errors']], [2, 3, 4])
+
+    def test_import_csv_in_batches_with_constant_queries(self):
+        lines = ['name,price,stock,store,category']
+        lines += [f'Product {i},{i + 1}.00,{i},Test Store,Category {i % 3}' for i in range(200)]
+        # На пачку: магазины, категории, поиск существующих, товары и их остатки.
+        with self.assertNumQueries(4 + 4 * 5):
+            ProductImporter(batch_size=50).run(records('\n'.join(lines), 'csv'))
+        self.assertEqual(Product.objects.count(), 201)
+        self.assertEqual(Category.objects.count(), 3)
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_do_import_task(self):
+        file_name = default_storage.save('imports/products.csv', ContentFile(b'name,price,store\nTask,3.00,Test Store\n'))
+        stats = do_import(file_name)
+        self.assertEqual(stats['created'], 1)
+        self.assertFalse(default_storage.exists(file_name))
@@ -0,0 +1,63 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from retail_orders.backends import reservations
+from retail_orders.backends.models import Inventory, Order, OrderItem, Product, Store
+from retail_orders.backends.services import checkout_order
+
+
+class InventoryTest(TestCase):
+    def setUp(self):
+        self.store = Store.objects.create(name='Test Store')
+        self.product = Product.objects.create(name='Product', price=10, stock=5, store=self.store)
+
+    def test_stock_stored_in_inventory(self):
+        self.assertEqual(Inventory.objects.get(product=self.product).stock, 5)
+        reservations.hold('user:1', {self.product.id: 2})
+
+        product = Product.objects.get(pk=self.product.pk)
+        product.stock = 8
+        product.save()
+        inventory = Inventory.objects.get(product=self.product)
+        self.assertEqual((inventory.stock, inventory.reserved), (8, 2))
+        self.assertEqual(product.available_stock, 6)
+
+        created = Product.objects.bulk_create([Product(name='Bulk', price=1, stock=3, store=self.store),
+                                               Product(name='No stock', price=1, store=self.store)])
+        self.assertEqual([product.stock for product in created], [3, 0])
+        # Как и save(), bulk_create создает остатки каждому товару, без stock - нулевые.
+        self.assertEqual(dict(Inventory.objects.filter(product__in=created).values_list('product__name', 'stock')),
+                         {'Bulk': 3, 'No stock': 0})
+
+    def test_checkout_does_not_touch_products(self):
+        user = User.objects.create(username='testuser')
+        order = Order.objects.create(user=user, status='pending')
+        OrderItem.objects.create(order=order, product=self.product, quantity=2)
+        updated_at = Product.objects.get(pk=self.product.pk).updated_at
+
+        with CaptureQueriesContext(connection) as captured:
+            checkout_order(order)
+        writes = [query['sql'] for query in captured
+                  if query['sql'].startswith('UPDATE "retail_orders_product"')]
+        self.assertEqual(writes, [])
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.updated_at), (3, updated_at))
+
+
+class ProductAdminInventoryTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser(username='admin', password='password'))
+        self.product = Product.objects.create(name='Product', price=10, stock=5, store=Store.objects.create(name='S'))
+
+    def test_list_editable_stock(self):
+        response = self.client.get('/admin/retail_orders/product/')
+        self.assertContains(response, 'name="form-0-stock" value="5"')
+
+        response = self.client.post('/admin/retail_orders/product/', {
+            'form-TOTAL_FORMS': 1, 'form-INITIAL_FORMS': 1,
+            'form-0-id': self.product.id, 'form-0-price': '12.00', 'form-0-stock': 7, '_save': 'Save',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.price, self.product.stock), (12, 7))
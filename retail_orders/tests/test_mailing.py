@@ -0,0 +1,114 @@
+import smtplib
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import SimpleTestCase, override_settings
+from retail_orders.backends.mailing import BulkMailer, recipient_batches
+from retail_orders.backends.tasks import send_bulk_email, send_email
+
+
+class CountingBackend(EmailBackend):
+    """
+    locmem бэкенд, который считает открытые соединения и отказывает адресам из refused.
+    """
+    opened = 0
+    refused = set()
+
+    def open(self):
+        CountingBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            if set(message.to) & self.refused:
+                raise smtplib.SMTPRecipientsRefused({address: (550, b'refused') for address in message.to})
+        return super().send_messages(messages)
+
+
+class FlakyBackend(EmailBackend):
+    """
+    Первая отправка падает с ошибкой соединения, следующие проходят.
+    """
+    calls = 0
+
+    def send_messages(self, messages):
+        FlakyBackend.calls += 1
+        if FlakyBackend.calls == 1:
+            raise smtplib.SMTPServerDisconnected('connection lost')
+        return super().send_messages(messages)
+
+
+# Путь от __name__: при обнаружении тестов из корня модуль импортируется под другим именем.
+COUNTING_BACKEND = f'{__name__}.CountingBackend'
+FLAKY_BACKEND = f'{__name__}.FlakyBackend'
+
+
+class RecipientBatchesTest(SimpleTestCase):
+    def test_skips_duplicates_and_empty(self):
+        batches = list(recipient_batches(['a@x.ru', 'A@x.ru ', '', None, 'b@x.ru', 'c@x.ru'], 2))
+        self.assertEqual(batches, [['a@x.ru', 'b@x.ru'], ['c@x.ru']])
+
+
+@override_settings(EMAIL_BACKEND=COUNTING_BACKEND, EMAIL_RATE_LIMIT=0)
+class BulkMailerTest(SimpleTestCase):
+    def setUp(self):
+        CountingBackend.opened = 0
+        CountingBackend.refused = set()
+
+    def recipients(self, count):
+        return [f'user{i}@example.com' for i in range(count)]
+
+    def test_one_connection_per_batch(self):
+        mailer = BulkMailer(batch_size=10)
+        failed = mailer.send(self.recipients(25), 'Тема', 'Текст', '<p>Текст</p>')
+
+        self.assertEqual(failed, [])
+        self.assertEqual(CountingBackend.opened, 3)
+        self.assertEqual(len(mail.outbox), 25)
+        self.assertEqual(mail.outbox[0].to, ['user0@example.com'])
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertEqual((mailer.stats['sent'], mailer.stats['batches']), (25, 3))
+        self.assertGreater(mailer.stats['per_second'], 0)
+
+    def test_refused_recipient_does_not_stop_batch(self):
+        CountingBackend.refused = {'user1@example.com'}
+        mailer = BulkMailer(batch_size=10)
+        failed = mailer.send(self.recipients(3), 'Тема', 'Текст')
+
+        self.assertEqual(failed, ['user1@example.com'])
+        self.assertEqual([message.to[0] for message in mail.outbox], ['user0@example.com', 'user2@example.com'])
+        self.assertEqual(mailer.stats['failed'], 1)
+
+    def test_rate_limit(self):
+        mailer = BulkMailer(batch_size=5, rate_limit=100)
+        mailer.send(self.recipients(10), 'Тема', 'Текст')
+
+        self.assertGreaterEqual(mailer.stats['elapsed'], 0.09)
+        self.assertLessEqual(mailer.stats['per_second'], 110)
+
+
+@override_settings(EMAIL_RATE_LIMIT=0)
+class EmailTasksTest(SimpleTestCase):
+    @override_settings(EMAIL_BACKEND=FLAKY_BACKEND)
+    def test_send_email_retries(self):
+        FlakyBackend.calls = 0
+        with mock.patch.object(send_email, 'retry', side_effect=RuntimeError('retry')) as retry:
+            with self.assertRaises(RuntimeError):
+                send_email.run('user@example.com', 'Тема', 'Текст')
+            self.assertIsInstance(retry.call_args.kwargs['exc'], smtplib.SMTPServerDisconnected)
+
+        self.assertEqual(send_email.run('user@example.com', 'Тема', 'Текст'), 'user@example.com')
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(EMAIL_BACKEND=FLAKY_BACKEND)
+    def test_bulk_email_requeues_failed_recipients(self):
+        FlakyBackend.calls = 0
+        with mock.patch.object(send_email, 'apply_async') as apply_async:
+            stats = send_bulk_email.run(['a@x.ru', 'b@x.ru', 'c@x.ru'], 'Тема', 'Текст', batch_size=2)
+
+        # Соединение первой пачки потеряно на первом письме: оба адреса пачки - в повтор.
+        self.assertEqual(stats['retried'], ['a@x.ru', 'b@x.ru'])
+        self.assertEqual(stats['sent'], 1)
+        self.assertEqual(apply_async.call_count, 2)
+        self.assertEqual(apply_async.call_args.args[0], ('b@x.ru', 'Тема', 'Текст', None))
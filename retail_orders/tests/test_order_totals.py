@@ -0,0 +1,76 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from retail_orders.backends.models import Product, Order, OrderItem, Store, Category
+
+
+class OrderTotalsTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.store = Store.objects.create(name='Test Store')
+        self.category = Category.objects.create(name='Test Category')
+        self.product = Product.objects.create(
+            name='Test Product', price=10, stock=100, store=self.store, category=self.category)
+        self.other = Product.objects.create(
+            name='Other Product', price=3, stock=100, store=self.store, category=self.category)
+
+    def add(self, product, quantity):
+        return self.client.post('/api/orders/add_to_cart/', {'product_id': product.id, 'quantity': quantity})
+
+    def test_add_to_cart_keeps_price_captured_at_add_time(self):
+        self.add(self.product, 2)
+        Product.objects.filter(pk=self.product.pk).update(price=50)
+        response = self.add(self.product, 1)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['total_price'], Decimal('30.00'))
+
+        order = Order.objects.get(user=self.user, status='pending')
+        self.assertEqual(order.total_price, Decimal('30.00'))
+        self.assertEqual(order.items_count, 3)
+        self.assertEqual(order.orderitem_set.get().price, Decimal('10.00'))
+
+    def test_remove_and_checkout_update_totals(self):
+        self.add(self.product, 2)
+        self.add(self.other, 1)
+        order = Order.objects.get(user=self.user, status='pending')
+        item = order.orderitem_set.get(product=self.other)
+
+        response = self.client.post(f'/api/orders/{order.id}/remove_from_cart/', {'item_id': item.id})
+        self.assertEqual(response.data['total_price'], Decimal('20.00'))
+        self.assertEqual(response.data['items_count'], 2)
+
+        OrderItem.objects.create(order=order, product=self.other, quantity=4)
+        response = self.client.post(f'/api/orders/{order.id}/checkout/')
+        self.assertEqual(response.data['total_price'], Decimal('32.00'))
+        order.refresh_from_db()
+        self.assertEqual((order.total_price, order.items_count), (Decimal('32.00'), 6))
+
+    def test_order_list_query_count_is_constant(self):
+        def list_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/orders/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(queries)
+
+        self.add(self.product, 1)
+        baseline = list_queries()
+        for i in range(10):
+            product = Product.objects.create(name=f'Product {i}', price=1, stock=10, store=self.store,
+                                             category=Category.objects.create(name=f'Category {i}'))
+            self.add(product, 1)
+        self.assertEqual(list_queries(), baseline)
+
+    def test_rebuild_order_totals_command(self):
+        order = Order.objects.create(user=self.user, status='completed')
+        OrderItem.objects.create(order=order, product=self.product, quantity=3)
+        OrderItem.objects.create(order=order, product=self.other, quantity=1)
+        call_command('rebuild_order_totals', batch_size=1, stdout=open('/dev/null', 'w'))
+        order.refresh_from_db()
+        self.assertEqual((order.total_price, order.items_count), (Decimal('33.00'), 4))
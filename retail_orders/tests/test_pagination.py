@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from retail_orders.backends.models import Product, Store
+
+
+class KeysetPaginationTest(APITestCase):
+    def setUp(self):
+        # Ответы каталога кэшируются, а сброс по сигналам ждет фиксации транзакции.
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.store = Store.objects.create(name='Test Store')
+        self.other_store = Store.objects.create(name='Other Store')
+        now = timezone.now()
+        for i in range(25):
+            product = Product.objects.create(name=f'Product {i}', price=10, stock=1,
+                                             store=self.store if i % 5 else self.other_store)
+            # Несколько товаров с одинаковым created_at проверяют сортировку по id.
+            Product.objects.filter(pk=product.pk).update(created_at=now - timedelta(minutes=i // 3))
+        self.expected = list(Product.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def walk(self, url):
+        ids = []
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [product['id'] for product in response.data['results']]
+            pages.append(response.data)
+            url = response.data['next']
+        return ids, pages
+
+    def test_walk_forward_and_back(self):
+        ids, pages = self.walk('/api/products/?pagination=keyset&page_size=10')
+        self.assertEqual(ids, self.expected)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]['previous'])
+        self.assertNotIn('count', pages[0])
+
+        response = self.client.get(pages[2]['previous'])
+        self.assertEqual([product['id'] for product in response.data['results']], self.expected[10:20])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([product['id'] for product in response.data['results']], self.expected[:10])
+        self.assertIsNone(response.data['previous'])
+
+    def test_keyset_with_filters_and_approximate_count(self):
+        ids, pages = self.walk(f'/api/products/?pagination=keyset&page_size=2&count=approx&store={self.other_store.id}')
+        expected = list(Product.objects.filter(store=self.other_store)
+                        .order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages[0]['count'], 5)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/products/?cursor=bad')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_number_pagination_is_default(self):
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 20)
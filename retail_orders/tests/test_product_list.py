@@ -0,0 +1,43 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APIClient
+from retail_orders.backends.models import Product, Store, Category
+from retail_orders.backends.serializers import ProductSerializer, ProductListSerializer
+
+
+class ProductListSerializerTest(APITestCase):
+    def setUp(self):
+        # Ответы каталога кэшируются, а сброс по сигналам ждет фиксации транзакции.
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        stores = [Store.objects.create(name=f'Store {i}', address=f'Address {i}') for i in range(2)]
+        category = Category.objects.create(name='Category', description='Description')
+        for i in range(6):
+            Product.objects.create(
+                name=f'Product {i}', description=f'Description {i}', price='10.5', stock=i,
+                store=stores[i % 2], category=category if i % 3 else None,
+                image='products/image.png' if i % 2 else None,
+            )
+
+    def test_same_json_as_product_serializer(self):
+        request = RequestFactory().get('/api/products/')
+        context = {'request': request}
+        queryset = Product.objects.select_related('store', 'category')
+        expected = JSONRenderer().render(ProductSerializer(queryset, many=True, context=context).data)
+        rows = queryset.values(*ProductListSerializer.columns)
+        actual = JSONRenderer().render(ProductListSerializer(rows, context=context).data)
+        self.assertEqual(json.loads(actual), json.loads(expected))
+        self.assertEqual(actual, expected)
+
+    def test_list_endpoint_uses_single_query(self):
+        # COUNT, страница товаров и остатки страницы из Inventory.
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/products/')
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertEqual(response.data['results'][0]['store']['name'], 'Store 1')
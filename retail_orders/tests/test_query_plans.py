@@ -0,0 +1,58 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from retail_orders.backends.models import Product, Order, OrderItem, Store, Category
+
+
+class QueryPlanTest(TestCase):
+    """
+    Проверяет по EXPLAIN, что горячие запросы используют составные индексы,
+    а не полный просмотр таблицы.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='testuser')
+        cls.store = Store.objects.create(name='Test Store')
+        cls.category = Category.objects.create(name='Test Category')
+        cls.product = Product.objects.create(name='Test Product', price=10, stock=5,
+                                             store=cls.store, category=cls.category)
+        cls.order = Order.objects.create(user=cls.user, status='pending')
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # На маленьких тестовых таблицах планировщик предпочел бы Seq Scan.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = self.explain(queryset)
+        self.assertIn(index_name, plan)
+        self.assertNotIn('Seq Scan', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_pending_order_lookup(self):
+        self.assertUsesIndex(Order.objects.filter(user=self.user, status='pending'), 'order_user_status_idx')
+
+    def test_order_list(self):
+        self.assertUsesIndex(Order.objects.filter(user=self.user).order_by('-created_at', '-id')[:20],
+                             'order_user_created_idx')
+        self.assertUsesIndex(Order.objects.filter(user=self.user, status='completed').order_by('-created_at')[:20],
+                             'order_user_status_idx')
+
+    def test_admin_order_list(self):
+        self.assertUsesIndex(Order.objects.order_by('-created_at', '-id')[:100], 'order_created_idx')
+
+    def test_product_list(self):
+        self.assertUsesIndex(Product.objects.order_by('-created_at', '-id')[:20], 'product_created_idx')
+        self.assertUsesIndex(Product.objects.filter(store=self.store).order_by('-created_at', '-id')[:20],
+                             'product_store_created_idx')
+        self.assertUsesIndex(Product.objects.filter(category=self.category).order_by('-created_at', '-id')[:20],
+                             'product_category_created_idx')
+        self.assertUsesIndex(Product.objects.filter(price=10).order_by('-created_at', '-id')[:20],
+                             'product_price_created_idx')
+
+    def test_order_item_lookup(self):
+        # SQLite создает уникальное ограничение внутри CREATE TABLE как автоиндекс.
+        index_name = 'sqlite_autoindex_retail_orders_orderitem' if connection.vendor == 'sqlite' else 'unique_order_product'
+        self.assertUsesIndex(OrderItem.objects.filter(order=self.order, product=self.product), index_name)
@@ -0,0 +1,80 @@
+from cachalot.api import cachalot_disabled
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from retail_orders.backends.metrics import RequestMetrics, action_stats
+from retail_orders.backends.models import Order, OrderItem, Product, Store
+
+
+class RequestMetricsTest(TestCase):
+    def test_duplicated_query_shapes(self):
+        metrics = RequestMetrics()
+        store = Store.objects.create(name='Store')
+        # Повторы без cachalot: иначе он ответит на них из кэша.
+        with cachalot_disabled(), connection.execute_wrapper(metrics):
+            for _ in range(3):
+                Store.objects.filter(pk=store.pk).exists()
+            Product.objects.count()
+
+        self.assertEqual(metrics.queries, 4)
+        self.assertEqual(metrics.duplicate_count(), 2)
+        [(sql, (count, _))] = metrics.duplicates().items()
+        self.assertIn('"retail_orders_store"', sql)
+        self.assertEqual(count, 3)
+        self.assertIn('x3', metrics.offending_sql()[1])
+        # Значения параметров (данные пользователей) в журнал не попадают без явного разрешения.
+        metrics.slowest = (1.0, 'SELECT 1 FROM "auth_user" WHERE "email" = %s', ('user@example.com',))
+        self.assertNotIn('user@example.com', metrics.offending_sql()[0])
+        self.assertIn('"email" = %s', metrics.offending_sql()[0])
+        with override_settings(REQUEST_METRICS_LOG_SQL_PARAMS=True):
+            self.assertIn('user@example.com', metrics.offending_sql()[0])
+
+
+@override_settings(REQUEST_METRICS_FLUSH_INTERVAL=0, REQUEST_METRICS_SLOW_MS=0, REQUEST_METRICS_SLOW_SAMPLE_RATE=1)
+class RequestMetricsMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.admin = User.objects.create_superuser(username='admin', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        store = Store.objects.create(name='Store')
+        self.product = Product.objects.create(name='Product', price=10, stock=5, store=store)
+        self.client.delete('/api/metrics/requests/')
+
+    def server_timing(self, response):
+        return dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+
+    def test_server_timing_header(self):
+        order = Order.objects.create(user=self.admin, status='pending')
+        OrderItem.objects.create(order=order, product=self.product, quantity=1)
+
+        with self.assertLogs('retail_orders.backends.metrics', 'WARNING') as logs:
+            response = self.client.get('/api/orders/')
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {'db', 'cache', 'view', 'total'})
+        self.assertRegex(timing['db'], r'^dur=[\d.]+;desc="queries=\d+ duplicates=0"$')
+        self.assertIn('OrderViewSet.list', logs.output[0])
+        self.assertIn('самый долгий', logs.output[0])
+
+    def test_cache_hits_and_misses(self):
+        self.client.get(f'/api/products/{self.product.id}/')
+        cached = self.server_timing(self.client.get(f'/api/products/{self.product.id}/'))
+        self.assertRegex(cached['cache'], r'desc="hits=[1-9]\d* misses=0"')
+
+    def test_stats_per_action(self):
+        self.client.get('/api/products/')
+        self.client.get('/api/products/')
+        self.client.get(f'/api/products/{self.product.id}/')
+
+        rows = {row['action']: row for row in self.client.get('/api/metrics/requests/').json()}
+        self.assertEqual(rows['ProductViewSet.list']['requests'], 2)
+        self.assertEqual(rows['ProductViewSet.retrieve']['requests'], 1)
+        self.assertGreater(rows['ProductViewSet.list']['avg_queries'], 0)
+        self.assertEqual(rows['ProductViewSet.list']['slow'], 2)
+
+        action_stats.reset()
+        self.client.force_authenticate(User.objects.create_user(username='user', password='password'))
+        self.assertEqual(self.client.get('/api/metrics/requests/').status_code, 403)
@@ -0,0 +1,140 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from retail_orders.backends import cart, reservations
+from retail_orders.backends.exceptions import InsufficientStock
+from retail_orders.backends.models import Product, Order, OrderItem, Store, StockReservation
+from retail_orders.backends.services import checkout_order
+from retail_orders.backends.tasks import expire_stock_reservations
+
+
+class ReservationTest(TestCase):
+    def setUp(self):
+        self.store = Store.objects.create(name='Test Store')
+        self.product = Product.objects.create(name='Test Product', price=10, stock=5, store=self.store)
+        self.other = Product.objects.create(name='Other Product', price=3, stock=5, store=self.store)
+
+    def reserved(self, product):
+        product.refresh_from_db()
+        return product.reserved
+
+    def test_hold_checks_available_stock(self):
+        reservations.hold('user:1', {self.product.id: 3})
+        with self.assertRaises(InsufficientStock) as raised:
+            reservations.hold('user:2', {self.product.id: 3, self.other.id: 1})
+        self.assertEqual(raised.exception.items, [
+            {'product_id': self.product.id, 'name': 'Test Product', 'requested': 3, 'available': 2}])
+        self.assertEqual((self.reserved(self.product), self.reserved(self.other)), (3, 0))
+
+        # Собственный резерв учитывается как доступный остаток.
+        reservations.hold('user:1', {self.product.id: 2}, increment=True)
+        reservations.hold('user:1', {self.product.id: 1})
+        self.assertEqual(self.reserved(self.product), 1)
+        reservations.release('user:1')
+        self.assertEqual(self.reserved(self.product), 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_hold_refuses_negative_reserve(self):
+        reservations.hold('anon:a', {self.product.id: 4})
+        reservations.hold('anon:b', {self.product.id: 1})
+        with self.assertRaises(ValueError):
+            reservations.hold('anon:b', {self.product.id: -4}, increment=True)
+        self.assertEqual(self.reserved(self.product), 5)
+
+    def test_expire_in_batches(self):
+        for i in range(5):
+            reservations.hold(f'anon:{i}', {self.product.id: 1, self.other.id: 1}, ttl=60)
+        StockReservation.objects.filter(owner__in=['anon:0', 'anon:1', 'anon:2']).update(
+            expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(reservations.expire_reservations(batch_size=2), 6)
+        self.assertEqual((self.reserved(self.product), self.reserved(self.other)), (2, 2))
+        self.assertEqual(expire_stock_reservations(), 0)
+
+    def test_transfer_merges_holds(self):
+        reservations.hold('anon:a', {self.product.id: 2, self.other.id: 1})
+        reservations.hold('user:1', {self.product.id: 1})
+        reservations.transfer('anon:a', 'user:1')
+        self.assertEqual(
+            dict(StockReservation.objects.values_list('product_id', 'quantity').filter(owner='user:1')),
+            {self.product.id: 3, self.other.id: 1})
+        self.assertEqual(self.reserved(self.product), 3)
+
+    def test_checkout_consumes_own_holds_only(self):
+        user = User.objects.create(username='buyer')
+        order = Order.objects.create(user=user, status='pending')
+        OrderItem.objects.create(order=order, product=self.product, quantity=3)
+        reservations.hold(f'user:{user.pk}', {self.product.id: 3})
+        reservations.hold('anon:a', {self.product.id: 2})
+
+        checkout_order(order)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (2, 2))
+        self.assertEqual(list(StockReservation.objects.values_list('owner', flat=True)), ['anon:a'])
+
+        second = Order.objects.create(user=user, status='pending')
+        OrderItem.objects.create(order=second, product=self.product, quantity=1)
+        with self.assertRaises(InsufficientStock):
+            checkout_order(second)
+
+
+@override_settings(CART_STORE='retail_orders.backends.cart.LocalCartStore')
+class ReservationApiTest(APITestCase):
+    def setUp(self):
+        cart._stores.clear()
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.store = Store.objects.create(name='Test Store')
+        self.product = Product.objects.create(name='Test Product', price=10, stock=5, store=self.store)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_add_and_remove_hold_stock(self):
+        add_url = '/api/orders/add_to_cart/'
+        response = self.client.post(add_url, {'product_id': self.product.id, 'quantity': 4})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        other = APIClient()
+        response = other.post(add_url, {'product_id': self.product.id, 'quantity': 2})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['items'][0]['available'], 1)
+
+        self.client.post('/api/orders/cart/remove/', {'product_id': self.product.id})
+        response = other.post(add_url, {'product_id': self.product.id, 'quantity': 2})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.reserved, self.product.available_stock), (2, 3))
+
+    def test_add_rejects_invalid_quantity(self):
+        add_url = '/api/orders/add_to_cart/'
+        self.assertEqual(self.client.post(add_url, {'product_id': self.product.id, 'quantity': 4}).status_code,
+                         status.HTTP_201_CREATED)
+        other = APIClient()
+        for quantity in (-4, 0, 'много'):
+            for client in (self.client, other):
+                response = client.post(add_url, {'product_id': self.product.id, 'quantity': quantity})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn('quantity', response.data)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 4)
+
+    def test_failed_cart_write_keeps_no_hold(self):
+        add_url = '/api/orders/add_to_cart/'
+        self.assertEqual(APIClient().post(add_url, {'product_id': self.product.id, 'quantity': 1}).status_code,
+                         status.HTTP_201_CREATED)
+        with mock.patch('retail_orders.backends.services.add_to_cart', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            self.client.post(add_url, {'product_id': self.product.id, 'quantity': 2})
+        with mock.patch.object(cart.LocalCartStore, 'add', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            APIClient().post(add_url, {'product_id': self.product.id, 'quantity': 2})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 1)
+        self.assertEqual(StockReservation.objects.count(), 1)
@@ -0,0 +1,91 @@
+import os
+import tempfile
+
+from cachalot.utils import get_table_cache_key
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.db.utils import load_backend
+from django.test import TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from retail_orders.backends.models import Order, OrderItem, Product, Store
+from retail_orders.backends.routers import PrimaryReplicaRouter, table_cache_key, use_primary
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    Реплику изображает вторая база SQLite без репликации: по тому, какие
+    строки видны в ответе, понятно, из какой базы шло чтение.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Соединение создается вне DATABASES, поэтому тестовый раннер не пересоздает эту базу.
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        settings_dict = {**connections['default'].settings_dict,
+                         'NAME': os.path.join(cls.replica_dir.name, 'replica.sqlite3')}
+        connections['replica'] = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, 'replica')
+        call_command('migrate', database='replica', verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        cls.replica_dir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username='testuser', password='password')
+        User.objects.using('replica').create(id=self.user.id, username='testuser')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        store = Store.objects.create(name='Store')
+        product = Product.objects.create(name='Product', price=10, stock=5, store=store)
+        # Заказ есть только в основной БД: реплика "отстает".
+        self.order = Order.objects.create(user=self.user, status='pending')
+        OrderItem.objects.create(order=self.order, product=product, quantity=1)
+
+    def tearDown(self):
+        User.objects.using('replica').all().delete()
+
+    def order_ids(self):
+        response = self.client.get('/api/orders/')
+        self.assertEqual(response.status_code, 200)
+        return [order['id'] for order in response.json()['results']]
+
+    def test_reads_use_replica_until_client_writes(self):
+        self.assertEqual(self.order_ids(), [])
+        self.assertNotIn(settings.DATABASE_PIN_COOKIE, self.client.cookies)
+
+        response = self.client.post(f'/api/orders/{self.order.id}/checkout/')
+        self.assertEqual(response.status_code, 200)
+        cookie = response.cookies[settings.DATABASE_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.DATABASE_PIN_SECONDS)
+        self.assertEqual(self.order_ids(), [self.order.id])
+
+        # Окно закрепления истекло.
+        del self.client.cookies[settings.DATABASE_PIN_COOKIE]
+        self.assertEqual(self.order_ids(), [])
+
+    def test_router(self):
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Order), 'replica')
+        self.assertEqual(router.db_for_write(Order), 'default')
+        with transaction.atomic():
+            self.assertEqual(router.db_for_read(Order), 'default')
+        with use_primary():
+            self.assertEqual(router.db_for_read(Order), 'default')
+            self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(router.db_for_read(OrderItem, instance=self.order), 'default')
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertIsNone(router.db_for_read(Order))
+
+    def test_cachalot_shares_table_keys_with_primary(self):
+        self.assertEqual(table_cache_key('replica', 'retail_orders_order'),
+                         get_table_cache_key('default', 'retail_orders_order'))
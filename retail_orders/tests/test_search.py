@@ -0,0 +1,71 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from retail_orders.backends.importers import ProductImporter
+from retail_orders.backends.models import Product, Store
+from retail_orders.backends.search import search_products
+
+
+class ProductSearchTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.store = Store.objects.create(name='Test Store')
+        self.other_store = Store.objects.create(name='Other Store')
+        self.in_description = Product.objects.create(
+            name='Кефир', description='Лучше, чем молоко', price=5, stock=1, store=self.store)
+        self.in_name = Product.objects.create(
+            name='Молоко пастеризованное', description='Свежее', price=7, stock=1, store=self.store)
+        self.other = Product.objects.create(
+            name='Молочный коктейль', description='Шоколад', price=9, stock=1, store=self.other_store)
+
+    def search(self, query, **params):
+        response = self.client.get('/api/products/search/', {'q': query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [product['id'] for product in response.data['results']]
+
+    def test_ranking_and_prefix_matching(self):
+        self.assertEqual(self.search('молоко'), [self.in_name.id, self.in_description.id])
+        self.assertEqual(self.search('МОЛ'), [self.other.id, self.in_name.id, self.in_description.id])
+        self.assertEqual(self.search('мол паст'), [self.in_name.id])
+        self.assertEqual(self.search('мол', store=self.other_store.id), [self.other.id])
+        self.assertEqual(self.search('"мол)*(:'), [self.other.id, self.in_name.id, self.in_description.id])
+
+    def test_response_matches_product_list(self):
+        response = self.client.get('/api/products/search/', {'q': 'кефир'})
+        listed = self.client.get('/api/products/', {'store': self.store.id})
+        self.assertEqual(response.data['count'], 1)
+        self.assertIn(response.data['results'][0], listed.data['results'])
+
+    def test_empty_query(self):
+        response = self.client.get('/api/products/search/', {'q': ' ,. '})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_index_follows_saves_deletes_and_import(self):
+        self.in_name.name = 'Сметана'
+        self.in_name.save()
+        self.other.delete()
+        self.assertEqual(self.search('сметана'), [self.in_name.id])
+        self.assertEqual(self.search('молоко'), [self.in_description.id])
+
+        ProductImporter().run(enumerate([
+            {'name': 'Сметана домашняя', 'price': 3, 'store': 'Test Store'},
+            {'name': 'Кефир', 'description': 'Обновленное описание', 'price': 6, 'store': 'Test Store'},
+        ], start=1))
+        self.assertEqual(len(self.search('сметана')), 2)
+        self.assertEqual(self.search('обновлен'), [self.in_description.id])
+
+
+class SearchQueryPlanTest(TestCase):
+    def test_search_uses_full_text_index(self):
+        store = Store.objects.create(name='Test Store')
+        Product.objects.create(name='Молоко', description='', price=1, stock=1, store=store)
+        plan = search_products(Product.objects.select_related('store', 'category'), 'молоко').explain()
+        if connection.vendor == 'postgresql':
+            self.assertIn('product_search_idx', plan)
+        else:
+            self.assertIn('VIRTUAL TABLE INDEX', plan)
+        self.assertNotIn('SCAN retail_orders_product ', plan + ' ')
@@ -1,11 +1,20 @@
+import time
+from unittest import mock
+
+from django_redis import get_redis_connection
 from rest_framework.test import APITestCase
 from rest_framework import status
+from django.core.cache import cache
 from django.urls import reverse
 from django.contrib.auth.models import User
-from retail_orders.backends.models import Product, Store, OrderItem
+from retail_orders.backends.models import Order, Product, Store
+from retail_orders.backends.throttling import RedisRateThrottle, UserRedisRateThrottle
 
 class ThrottlingTestCase(APITestCase):
     def setUp(self):
+        # Лимиты хранятся в Redis, а id пользователей в разных тестах совпадают.
+        cache.clear()
+        self.addCleanup(cache.clear)
         self.store = Store.objects.create(name='Test Store')
         self.add_to_cart_url = reverse('order-add-to-cart')
         self.user = User.objects.create_user(username='testuser', password='testpass')
@@ -30,3 +39,45 @@ class ThrottlingTestCase(APITestCase):
         response = self.client.post(self.add_to_cart_url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
 
+    def test_window_state_is_constant_size(self):
+        """Тест: состояние лимита - один хэш из четырех полей, ответ 429 с Retry-After."""
+        data = {'product_id': self.product.id, 'quantity': 1}
+        for _ in range(12):
+            response = self.client.post(self.add_to_cart_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # Конец окна плюс время, за которое уходит доля запросов этого окна (6 секунд из 60).
+        self.assertIn(int(response['Retry-After']), range(1, 67))
+
+        client = get_redis_connection('default')
+        [key] = client.keys('throttle:anon:*')
+        state = client.hgetall(key)
+        self.assertEqual(set(state), {b'start', b'window', b'current', b'previous'})
+        self.assertEqual(state[b'current'], b'10')
+        self.assertLessEqual(client.pttl(key), 2 * 60 * 1000)
+
+    def test_burst_across_window_boundary(self):
+        """Тест: серия в начале окна после полной серии в конце предыдущего не проходит."""
+        limit, period = 10, 1000
+        script = UserRedisRateThrottle().script
+        key = 'throttle:test:boundary'
+        started = time.monotonic()
+        self.assertEqual([script(keys=[key], args=[limit, period])[0] for _ in range(limit + 1)], [1] * limit + [0])
+
+        time.sleep(max(0, 1.05 - (time.monotonic() - started)))
+        results = [script(keys=[key], args=[limit, period]) for _ in range(limit)]
+        # Фиксированное окно пропустило бы здесь еще limit запросов.
+        self.assertLessEqual(sum(allowed for allowed, wait in results), 1)
+        self.assertTrue(all(0 < wait <= period for allowed, wait in results if not allowed))
+
+    def test_action_rate(self):
+        """Тест: отдельный лимит checkout не расходует общий лимит пользователя."""
+        rates = {'anon': '10/minute', 'user': '100/minute', 'user.checkout': '2/minute'}
+        self.client.force_authenticate(user=self.user)
+        order = Order.objects.create(user=self.user, status='completed')
+        checkout_url = reverse('order-checkout', args=[order.id])
+        with mock.patch.object(RedisRateThrottle, 'THROTTLE_RATES', rates):
+            for _ in range(2):
+                self.assertEqual(self.client.post(checkout_url).status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(self.client.post(checkout_url).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            response = self.client.post(self.add_to_cart_url, {'product_id': self.product.id}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
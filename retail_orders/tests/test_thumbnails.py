@@ -0,0 +1,111 @@
+import io
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+from retail_orders.backends.models import Product, ProductThumbnail, Store
+from retail_orders.backends.tasks import generate_thumbnails
+from retail_orders.backends.thumbnails import ThumbnailGenerator, render_thumbnails
+
+
+def image_bytes(size=(800, 600), color='red', image_format='JPEG'):
+    output = io.BytesIO()
+    Image.new('RGB', size, color).save(output, image_format)
+    return output.getvalue()
+
+
+class RenderThumbnailsTest(TestCase):
+    def test_all_aliases_from_one_decode(self):
+        rendered = render_thumbnails(image_bytes(), {
+            'small.jpg': {'size': (100, 100), 'crop': True},
+            'medium.jpg': {'size': (300, 300), 'crop': False},
+        })
+        sizes = {name: Image.open(io.BytesIO(data)).size for name, (data, width, height) in rendered.items()}
+        self.assertEqual(sizes, {'small.jpg': (100, 100), 'medium.jpg': (300, 225)})
+        self.assertEqual(rendered['medium.jpg'][1:], (300, 225))
+
+
+class ThumbnailGeneratorTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.store = Store.objects.create(name='Test Store')
+
+    def product(self, content, name='photo.jpg'):
+        product = Product.objects.create(name=name, price=1, stock=1, store=self.store)
+        product.image.save(name, ContentFile(content))
+        return product
+
+    def test_dedup_and_skip_unchanged(self):
+        first = self.product(image_bytes())
+        second = self.product(image_bytes())
+        stats = ThumbnailGenerator().run(Product.objects.all())
+        self.assertEqual((stats['processed'], stats['rendered'], stats['skipped']), (2, 1, 0))
+        self.assertEqual(ProductThumbnail.objects.count(), 2)
+        thumbnail = first.productthumbnail_set.get(alias='product_medium')
+        self.assertEqual(thumbnail.name, second.productthumbnail_set.get(alias='product_medium').name)
+        self.assertTrue(default_storage.exists(thumbnail.name))
+
+        stats = generate_thumbnails([first.id, second.id], ['product_medium'])
+        self.assertEqual((stats['rendered'], stats['skipped']), (0, 2))
+
+        # Повторная загрузка того же файла сбрасывает thumbnails (perform_update), миниатюры публикуются снова.
+        published = Product.objects.get(pk=first.pk).thumbnails
+        self.assertIn('product_medium', published)
+        Product.objects.filter(pk=first.pk).update(thumbnails={})
+        stats = ThumbnailGenerator().run(Product.objects.filter(pk=first.pk))
+        self.assertEqual((stats['rendered'], stats['skipped']), (0, 1))
+        self.assertEqual(Product.objects.get(pk=first.pk).thumbnails, published)
+
+        second.image.save('other.png', ContentFile(image_bytes(color='blue', image_format='PNG')))
+        stats = ThumbnailGenerator(workers=2, batch_size=1).run(Product.objects.all())
+        self.assertEqual((stats['rendered'], stats['skipped']), (1, 1))
+        self.assertNotEqual(second.productthumbnail_set.get(alias='product_medium').name, thumbnail.name)
+
+    def test_broken_images_are_reported(self):
+        broken = self.product(b'not an image')
+        stats = ThumbnailGenerator().run(Product.objects.all())
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['errors'][0]['product_id'], broken.id)
+        self.assertFalse(ProductThumbnail.objects.exists())
+
+    def test_command(self):
+        self.product(image_bytes())
+        output = io.StringIO()
+        call_command('generate_thumbnails', workers=1, aliases=['avatar_small'], stdout=output)
+        self.assertIn('миниатюр создано: 1', output.getvalue())
+        self.assertEqual(list(ProductThumbnail.objects.values_list('alias', flat=True)), ['avatar_small'])
+
+    def test_payload_placeholder_then_urls(self):
+        product = self.product(image_bytes())
+        Product.objects.create(name='Без изображения', price=1, stock=1, store=self.store)
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create(username='testuser'))
+        # Счетчики throttling хранятся в кэше и не должны зависеть от других тестов.
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        def thumbnails():
+            listed = client.get('/api/products/').json()['results']
+            detail = client.get(f'/api/products/{product.id}/').json()
+            self.assertEqual(listed[1]['thumbnails'], detail['thumbnails'])
+            self.assertIsNone(listed[0]['thumbnails'])
+            return detail['thumbnails']['product_medium']
+
+        self.assertEqual(thumbnails(), {'url': 'http://testserver/static/retail_orders/thumbnail-placeholder.svg',
+                                        'width': 300, 'height': 300, 'pending': True})
+        with self.captureOnCommitCallbacks(execute=True):
+            ThumbnailGenerator().run(Product.objects.all())
+        thumbnail = thumbnails()
+        self.assertEqual((thumbnail['width'], thumbnail['height'], thumbnail['pending']), (300, 225, False))
+        self.assertEqual(thumbnail['url'], 'http://testserver/' + product.productthumbnail_set.get().name)